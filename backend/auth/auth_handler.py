@@ -1,14 +1,19 @@
 import jwt
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from fastapi import Depends, HTTPException, status, APIRouter
 from fastapi.security import OAuth2PasswordBearer
 from jwt import InvalidTokenError
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, object_session
 
 from db.database import get_db
-from schemas.auth import TokenData
-from models.tables import User
+from schemas.auth import TokenData, TokenClaims
+from models.tables import SubscriptionTier, User
+from auth.revocation import is_revoked
+from services.reference_data import reference_data
 
 from dotenv import load_dotenv
 import os
@@ -23,11 +28,17 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Read-only endpoints trust the signed role / uid claims of the token instead of loading the user.
+# Set to false to check every request against the database again.
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "true").lower() == "true"
+
 MAIL_FROM = os.getenv("MAIL_FROM")                  # verified sender (e.g. fypddbot@gmail.com)
 SENDGRID_API_KEY = os.getenv("MAIL_PASSWORD")       # your SendGrid API key
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+# For endpoints that are public but treat signed in users differently
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
 router = APIRouter()
 
@@ -38,6 +49,12 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt releases the GIL while hashing, so a batch of passwords is spread over the cores
+_hash_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="password-hash")
+
+def get_password_hashes(passwords: List[str]) -> List[str]:
+    return list(_hash_pool.map(pwd_context.hash, passwords))
+
 def get_user(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
@@ -53,31 +70,60 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def family_claims(user: User) -> dict:
+    # Parents and their children share the parent's plan, fam / tier let quota checks skip the database
+    role = reference_data.role_name(user.role_id)
+    if role == "PARENT":
+        tier = user.tier
+    elif role == "CHILD" and user.primary_parent_id is not None:
+        tier = object_session(user).query(User.tier).filter(User.id == user.primary_parent_id).scalar()
+    else:
+        return {}
+    family_id = user.id if role == "PARENT" else user.primary_parent_id
+    return {"fam": family_id, "tier": (tier or SubscriptionTier.FREE).value}
+
+def issue_access_token(user: User) -> str:
+    # uid / iat let read-only endpoints authorize from the token alone and let revocations apply to it
+    return create_access_token(
+        data={"sub": user.username, "role": reference_data.role_name(user.role_id), "uid": user.id, "iat": time.time(), **family_claims(user)},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
 # ------------------------------- DEPENDENCIES ------------------------------- #
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"}
     )
+
+def decode_access_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except InvalidTokenError:
-        raise credentials_exception
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    
+    # Tokens of deleted users or issued before a password change
+    user_id, issued_at = payload.get("uid"), payload.get("iat")
+    if user_id is not None and issued_at is not None and is_revoked(user_id, issued_at):
+        raise credentials_exception()
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    username: str = decode_access_token(token)["sub"]
     
     user = db.query(User).filter(User.username == username).first()
     if not user:
-        raise credentials_exception
+        raise credentials_exception()
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 async def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
-    if current_user.role.name.value != "ADMIN":
+    if reference_data.role_name(current_user.role_id) != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The user does not have privileges to access this resource."
@@ -85,13 +131,45 @@ async def get_current_admin_user(current_user: User = Depends(get_current_active
     return current_user
 
 async def get_current_librarian_user(current_user: User = Depends(get_current_active_user)):
-    if not current_user.role or current_user.role.name.value != "LIBRARIAN":
+    if reference_data.role_name(current_user.role_id) != "LIBRARIAN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The user does not have privileges to perform this action."
         )
     return current_user
 
+# Stateless version of the role checks for read-only endpoints, no identity queries when TRUST_TOKEN_CLAIMS is on
+def require_role(role_name: str):
+    async def check_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> TokenClaims:
+        payload = decode_access_token(token)
+        if payload.get("uid") is None or payload.get("iat") is None or payload.get("role") is None:
+            # token from before uid / iat claims were added
+            raise credentials_exception()
+        
+        claims = TokenClaims(
+            username=payload["sub"],
+            role=payload["role"],
+            user_id=payload["uid"],
+            issued_at=payload["iat"]
+        )
+        
+        if not TRUST_TOKEN_CLAIMS:
+            user = db.query(User).filter(User.id == claims.user_id).first()
+            if not user:
+                raise credentials_exception()
+            claims.role = reference_data.role_name(user.role_id)
+        
+        if claims.role != role_name:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="The user does not have privileges to access this resource."
+            )
+        return claims
+    return check_role
+
+get_admin_claims = require_role("ADMIN")
+get_child_claims = require_role("CHILD")
+
 # ------------------------------- EMAIL VERIFICATION TOKEN ------------------------------- #
 def create_verification_token(data: dict, expires_delta: timedelta = timedelta(minutes=15)):
     to_encode = data.copy()
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models.tables import TokenRevocation
+
+# How often each worker re-reads token_revocation to pick up revocations made by other workers
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", 30))
+
+# Revocations only matter until the tokens they cover expire, older rows are purged
+REVOCATION_RETENTION = timedelta(days=1)
+
+_lock = threading.Lock()
+_revoked_before = {}  # user_id -> epoch ms, tokens issued before this are rejected
+_last_id = 0
+_last_refresh = 0.0
+
+
+def _remember(user_id: int, revoked_before_ms: int):
+    if revoked_before_ms > _revoked_before.get(user_id, 0):
+        _revoked_before[user_id] = revoked_before_ms
+
+
+def revoke_user_tokens(db: Session, user_id: int, reason: str):
+    """
+    Reject every token issued to user_id up to now. The row is committed with the caller's
+    transaction, this worker sees the revocation straight away, the others on their next refresh.
+    """
+    now_ms = int(time.time() * 1000)
+    db.add(TokenRevocation(user_id=user_id, revoked_before_ms=now_ms, reason=reason))
+    with _lock:
+        _remember(user_id, now_ms)
+
+
+def refresh_revocations(force: bool = False):
+    global _last_id, _last_refresh
+    if not force and time.monotonic() - _last_refresh < REVOCATION_REFRESH_SECONDS:
+        return
+
+    db = SessionLocal()
+    try:
+        # Only rows we haven't seen yet, the table is small and append only
+        rows = (
+            db.query(TokenRevocation.id, TokenRevocation.user_id, TokenRevocation.revoked_before_ms)
+            .filter(TokenRevocation.id > _last_id)
+            .order_by(TokenRevocation.id)
+            .all()
+        )
+        with _lock:
+            for row in rows:
+                _remember(row.user_id, row.revoked_before_ms)
+            if rows:
+                _last_id = rows[-1].id
+            _last_refresh = time.monotonic()
+    finally:
+        db.close()
+
+
+def is_revoked(user_id: int, issued_at: float) -> bool:
+    refresh_revocations()
+    revoked_before_ms = _revoked_before.get(user_id)
+    return revoked_before_ms is not None and issued_at * 1000 < revoked_before_ms
+
+
+def purge_old_revocations():
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - REVOCATION_RETENTION
+        db.query(TokenRevocation).filter(TokenRevocation.created_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,83 @@
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session, joinedload
+
+from db.database import SessionLocal
+from models.tables import User, UserSession
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    # Keyed hash instead of bcrypt: refresh tokens are long random strings, so a fast
+    # lookup by hash is safe and /auth/refresh stays cheap
+    return hmac.new(SECRET_KEY.encode(), refresh_token.encode(), hashlib.sha256).hexdigest()
+
+
+def create_session(db: Session, user_id: int, device: str | None) -> str:
+    """Adds a session row for the user and returns the refresh token, the caller commits."""
+    refresh_token = secrets.token_urlsafe(48)
+    db.add(UserSession(
+        user_id=user_id,
+        token_hash=hash_refresh_token(refresh_token),
+        device=(device or "")[:255] or None,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return refresh_token
+
+
+def revoke_all_sessions(db: Session, user_id: int):
+    db.query(UserSession).filter(
+        UserSession.user_id == user_id,
+        UserSession.revoked_at.is_(None)
+    ).update({UserSession.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def rotate_session(db: Session, refresh_token: str):
+    """
+    Swap a refresh token for a new one. Returns (user, new refresh token).
+    Presenting an already rotated token means it was copied, so every session of that user is revoked.
+    """
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+    session = (
+        db.query(UserSession)
+        .options(joinedload(UserSession.user).joinedload(User.role))
+        .filter(UserSession.token_hash == hash_refresh_token(refresh_token))
+        .first()
+    )
+    if not session:
+        raise invalid_token
+
+    now = datetime.utcnow()
+    if session.revoked_at is not None:
+        revoke_all_sessions(db, session.user_id)
+        db.commit()
+        raise invalid_token
+    if session.expires_at < now:
+        raise invalid_token
+
+    session.revoked_at = now
+    session.last_used_at = now
+    new_refresh_token = create_session(db, session.user_id, session.device)
+    db.commit()
+    return session.user, new_refresh_token
+
+
+def purge_expired_sessions():
+    db = SessionLocal()
+    try:
+        db.query(UserSession).filter(UserSession.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,16 @@
+from db.database import SessionLocal
+from models.tables import Book, Video
+from services.age_range import add_age_range_columns, backfill_age_ranges
+
+# One off job: adds min_age / max_age to existing databases and fills them from age_group.
+# Safe to run again, rows that already have a min_age are skipped.
+
+db = SessionLocal()
+try:
+    add_age_range_columns(db)
+    books_updated = backfill_age_ranges(db, Book)
+    videos_updated = backfill_age_ranges(db, Video)
+finally:
+    db.close()
+
+print(f" {books_updated} books and {videos_updated} videos given an age range.")
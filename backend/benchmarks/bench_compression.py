@@ -0,0 +1,97 @@
+"""
+Compression benchmark for the main API payloads.
+
+Builds the JSON each endpoint returns from books_data.csv (no database needed) and
+prints raw vs compressed size and compression time per encoding / level.
+
+Run from the backend folder:  python -m benchmarks.bench_compression
+"""
+import csv
+import json
+import os
+import sys
+import time
+
+from middleware.compression import GzipCompressor, BrotliCompressor, brotli, default_levels
+from services.catalog import BOOK_LIST_FIELDS
+from services.export import EXPORT_BATCH_SIZE
+
+csv.field_size_limit(sys.maxsize)
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "books_data.csv")
+REPEATS = 20
+
+
+def load_books():
+    books = []
+    with open(CSV_FILE, newline='', encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f), start=1):
+            books.append({
+                "id": i,
+                "title": row.get("Name", ""),
+                "author": row.get("Author", ""),
+                "link": row.get("Link", ""),
+                "age_group": row.get("Age", "")[:50],
+                "category": "Children",
+                "description": row.get("Description", "") or row.get("Product_Details", ""),
+                "rating": 0.0,
+                "source": "Kaggle",
+            })
+    return books
+
+
+def build_payloads(books):
+    list_items = [{k: b[k] for k in BOOK_LIST_FIELDS} for b in books]
+    users = [
+        {"id": i, "username": f"user{i}", "first_name": "First", "last_name": "Last",
+         "email": f"user{i}@example.com", "role": {"name": "PARENT" if i % 3 else "CHILD"},
+         "is_verified": True, "tier": "FREE", "primary_parent_id": None}
+        for i in range(1, 2001)
+    ]
+    return {
+        "GET /librarian/view-all-books (page of 10)": [json.dumps({"total": len(books), "items": list_items[:10]}).encode()],
+        "GET /librarian/view-all-books?fields=...,description": [json.dumps({"total": len(books), "items": books[:10]}).encode()],
+        "GET /librarian/view-all-books?size=100": [json.dumps({"total": len(books), "items": list_items[:100]}).encode()],
+        "GET /admin/view-all-users (2000 users)": [json.dumps({"parent_and_kid_users": users}).encode()],
+        # streamed in chunks of EXPORT_BATCH_SIZE rows like /admin/export/books
+        "GET /admin/export/books (streamed NDJSON)": [
+            "".join(json.dumps(b) + "\n" for b in books[i:i + EXPORT_BATCH_SIZE]).encode()
+            for i in range(0, len(books), EXPORT_BATCH_SIZE)
+        ],
+    }
+
+
+def run(make_compressor, chunks):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        compressor = make_compressor()
+        size = 0
+        for chunk in chunks:
+            size += len(compressor.compress(chunk))
+        size += len(compressor.finish())
+    elapsed_ms = (time.perf_counter() - start) * 1000 / REPEATS
+    return size, elapsed_ms
+
+
+def main():
+    books = load_books()
+    gzip_default, brotli_default = default_levels()
+    encodings = [(f"gzip-{level}", lambda level=level: GzipCompressor(level)) for level in (1, gzip_default, 9)]
+    if brotli is not None:
+        encodings += [(f"br-{quality}", lambda quality=quality: BrotliCompressor(quality)) for quality in (1, brotli_default, 9)]
+    else:
+        print("brotli not installed, only benchmarking gzip")
+
+    print(f"cpu_count={os.cpu_count()} default gzip level={gzip_default} default brotli quality={brotli_default}\n")
+    for endpoint, chunks in build_payloads(books).items():
+        raw = sum(len(chunk) for chunk in chunks)
+        print(endpoint)
+        print(f"  {'identity':<10} {raw:>12,} bytes")
+        for name, make_compressor in encodings:
+            size, elapsed_ms = run(make_compressor, chunks)
+            print(f"  {name:<10} {size:>12,} bytes  {raw / size:6.1f}x  {elapsed_ms:8.2f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
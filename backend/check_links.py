@@ -0,0 +1,16 @@
+import asyncio
+
+from db.database import SessionLocal
+from services.link_check import add_link_check_columns, check_catalog_links
+
+# Checks the book and video links now instead of waiting for the scheduled link-check job,
+# adding the link checker columns to older databases first. Safe to run again.
+
+db = SessionLocal()
+try:
+    add_link_check_columns(db)
+finally:
+    db.close()
+
+counts = asyncio.run(check_catalog_links())
+print(f" {sum(counts.values())} links checked: {counts.get('ok', 0)} ok, {counts.get('gone', 0)} gone, {counts.get('error', 0)} errors.")
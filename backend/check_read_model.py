@@ -0,0 +1,48 @@
+import itertools
+import sys
+
+from db.database import SessionLocal
+from services.facets import AGE_BANDS, RATING_LEVELS
+from services.read_model import MODELS, build_columns, sql_listing
+
+# Checks that the read model answers the listings exactly like the SQL used until it is built:
+# builds it from the database and compares total and page ids for combinations of the listing filters.
+# Exits with status 1 on any difference. Usage: python check_read_model.py
+
+PAGE_SIZE = 50
+
+
+def filter_combinations(model, db):
+    sources = [None, ""] + [source for (source,) in db.query(model.source).distinct().limit(3)]
+    categories = [None, ""] + [category for (category,) in db.query(model.category).distinct().limit(2) if category]
+    searches = [None, "", "a", "the"]
+    for include_dead, search, age, source, category, age_band, min_rating in itertools.product(
+        (False, True), searches, (None, 4), sources, categories, (None, *AGE_BANDS)[:3], (None, *RATING_LEVELS)[:2]
+    ):
+        filters = dict(include_dead=include_dead, search=search, age=age, source=source, category=category, age_band=age_band, min_rating=min_rating)
+        if model.__tablename__ == "video":
+            yield dict(filters, max_duration=None)
+            yield dict(filters, max_duration=600)
+        else:
+            yield filters
+
+
+differences = 0
+checked = 0
+db = SessionLocal()
+try:
+    for tag, model in MODELS.items():
+        store = build_columns(model)
+        for filters in filter_combinations(model, db):
+            for page in (0, 1):
+                expected = sql_listing(db, model, page * PAGE_SIZE, PAGE_SIZE, **filters)
+                actual = store.listing(page * PAGE_SIZE, PAGE_SIZE, **filters)
+                checked += 1
+                if expected != actual:
+                    differences += 1
+                    print(f"[{tag}] {filters} page {page}: SQL total {expected[0]}, read model total {actual[0]}")
+finally:
+    db.close()
+
+print(f" {checked} listings compared, {differences} differences.")
+sys.exit(1 if differences else 0)
@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
 from passlib.context import CryptContext
 from datetime import date
+from db.routing import RoutingSession, replica_router
+from services import metrics
 
 import os
 load_dotenv()
@@ -15,16 +18,22 @@ if not DATABASE_URL:
 
 engine = create_engine(DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bound to the primary. Request sessions from get_db may read from a replica instead (db/routing.py).
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
 
 Base = declarative_base()
 
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    db.use_replica = replica_router.should_use_replica(request)
+    if replica_router.enabled:
+        metrics.inc("db_sessions_total", target="replica" if db.use_replica else "primary")
     try:
         yield db
     finally:
-        db.close()    
+        db.close()
+        if request.method not in ("GET", "HEAD"):
+            replica_router.note_write(request)
 
 def insert_default_roles():
     print("Inserting Default Roles...")
@@ -104,6 +113,7 @@ def insert_default_interests():
 def insert_default_admin():
     print("Inserting default admin...")
     from models.tables import User
+    from services.reference_data import reference_data
     
     DEFAULT_ADMIN_PASSWORD = os.getenv("DEFAULT_ADMIN_PASSWORD")
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -114,7 +124,7 @@ def insert_default_admin():
         hashed_password=password_hashed,
         first_name="Administrator",
         last_name="01",
-        role_id = 1, # admin role id
+        role_id = reference_data.role_id("ADMIN"),
         is_verified = True
     )
     
@@ -150,6 +160,7 @@ def insert_default_librarians():
     2. A librarian who is email-verified but pending admin approval.
     """
     print("Inserting default librarian accounts...")
+    from services.reference_data import reference_data
     
     librarian_configs = [
         {
@@ -207,7 +218,7 @@ def insert_default_librarians():
                 gender=config["gender"],
                 birthday=config["birthday"],
                 race=config["race"],
-                role_id=4, # Assuming 4 is the LIBRARIAN role ID
+                role_id=reference_data.role_id("LIBRARIAN"),
                 is_verified=config["is_verified"],
                 librarian_verified=config["librarian_verified"]
             )
@@ -225,6 +236,7 @@ def insert_default_librarians():
 
 def insert_default_parent():
     print("Inserting default parent account...")
+    from services.reference_data import reference_data
     
     DEFAULT_PARENT_PASSWORD = os.getenv("DEFAULT_ADMIN_PASSWORD")
     
@@ -247,7 +259,7 @@ def insert_default_parent():
         gender="Male",
         birthday=date(1985, 10, 15),
         race="Chinese",
-        role_id=2,  # Assuming 2 is the PARENT role ID
+        role_id=reference_data.role_id("PARENT"),
         is_verified=True,
         tier="FREE"
     )
@@ -342,13 +354,27 @@ def create_tables():
     
     print("Creating/Checkings tables")
     Base.metadata.create_all(bind=engine)
+    add_flagged_media_item_column()
     print("Tables created/checked successfully")
+
+
+def add_flagged_media_item_column():
+    # create_all doesn't alter existing tables, flagged_media.item_id came after the table
+    columns = {column["name"] for column in inspect(engine).get_columns("flagged_media")}
+    if "item_id" not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE flagged_media ADD COLUMN item_id INTEGER NULL"))
+            connection.execute(text("CREATE INDEX ix_flagged_media_item_id ON flagged_media (item_id)"))
+        print("Added item_id to flagged_media")
     
     
 def create_tables_and_seed_it():
     create_tables()
     insert_default_roles()
     insert_default_interests()
+    
+    from services.reference_data import reference_data
+    reference_data.load()
     insert_default_admin()
     insert_default_librarians()
     insert_default_parent()
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from services import metrics
+
+try:
+    import redis
+except ImportError:  # only needed for the shared store
+    redis = None
+
+# Comma separated list of read replica URLs. Without it every session goes to the primary.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_INTERVAL_SECONDS = int(os.getenv("REPLICA_HEALTH_INTERVAL_SECONDS", 5))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 10))
+
+# A client that wrote within this window keeps reading from the primary (read your writes)
+REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", 5))
+
+# Where recent writes are remembered. memory:// only sees writes handled by the same worker, so with
+# several workers a read served by another one can still hit a lagging replica.
+# redis://host:6379/0 shares them between workers.
+REPLICA_WRITES_STORAGE_URL = os.getenv("REPLICA_WRITES_STORAGE_URL", "memory://")
+
+# GET routes under these prefixes always read the primary, e.g. sessions right after login
+PRIMARY_ONLY_PREFIXES = ("/auth",)
+
+READ_METHODS = ("GET", "HEAD")
+
+metrics.describe("db_replica_healthy", "1 if the replica passed its last health check")
+metrics.describe("db_replica_lag_seconds", "Age of the heartbeat row as seen on the replica")
+metrics.describe("db_sessions_total", "Request sessions by the database they read from")
+metrics.describe("db_writes_store_errors_total", "Shared recent writes store failures, those clients were tracked by the worker only")
+
+
+class Replica:
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+
+class MemoryWrites:
+    """Recent writers in this process only, fine for a single worker."""
+
+    def __init__(self, max_keys: int = 10_000):
+        self._writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def note(self, key: str, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self._writes[key] = now
+            if len(self._writes) > self._max_keys:
+                cutoff = now - seconds
+                self._writes = {client: at for client, at in self._writes.items() if at >= cutoff}
+
+    def recent(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            wrote_at = self._writes.get(key)
+        return wrote_at is not None and time.monotonic() - wrote_at <= seconds
+
+
+class RedisWrites:
+    """
+    Recent writers in Redis so every worker sends them to the primary. While Redis can't be reached
+    the worker falls back to the writes it handled itself.
+    """
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("The redis package is required for REPLICA_WRITES_STORAGE_URL=redis://...")
+        self._client = redis.Redis.from_url(url)
+        self._fallback = MemoryWrites()
+
+    def note(self, key: str, seconds: float):
+        self._fallback.note(key, seconds)
+        try:
+            self._client.set(f"wrote:{key}", 1, px=max(1, int(seconds * 1000)))
+        except redis.RedisError as e:
+            print(f"Recent writes store failed, using this worker's writes: {e}")
+            metrics.inc("db_writes_store_errors_total")
+
+    def recent(self, key: str, seconds: float) -> bool:
+        try:
+            return bool(self._client.exists(f"wrote:{key}"))
+        except redis.RedisError as e:
+            print(f"Recent writes store failed, using this worker's writes: {e}")
+            metrics.inc("db_writes_store_errors_total")
+            return self._fallback.recent(key, seconds)
+
+
+def make_writes_store(url: str):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisWrites(url)
+    return MemoryWrites()
+
+
+class ReplicaRouter:
+    """
+    Picks the engine a request session reads from.
+    Healthy replicas are handed out round-robin; a replica is healthy when it answers and its
+    copy of the heartbeat row written to the primary is at most REPLICA_MAX_LAG_SECONDS old.
+    Writes always go to the primary, see RoutingSession.
+    """
+
+    def __init__(self, urls: List[str], writes_url: str = REPLICA_WRITES_STORAGE_URL):
+        self.replicas = [Replica(str(index), create_engine(url, pool_pre_ping=True)) for index, url in enumerate(urls)]
+        self._cycle = itertools.count()
+        self._writes = make_writes_store(writes_url) if self.replicas else MemoryWrites()
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[Engine]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._cycle) % len(healthy)].engine
+
+    @staticmethod
+    def _client_key(request) -> str:
+        # Writes are tracked per bearer token, falling back to the client address
+        credentials = request.headers.get("authorization") or (request.client.host if request.client else "")
+        return hashlib.sha256(credentials.encode()).hexdigest()
+
+    def note_write(self, request):
+        if self.enabled:
+            self._writes.note(self._client_key(request), REPLICA_READ_YOUR_WRITES_SECONDS)
+
+    def should_use_replica(self, request) -> bool:
+        if not self.enabled or request.method not in READ_METHODS:
+            return False
+        if request.url.path.startswith(PRIMARY_ONLY_PREFIXES):
+            return False
+        return not self._writes.recent(self._client_key(request), REPLICA_READ_YOUR_WRITES_SECONDS)
+
+    def check(self, primary: Engine):
+        """Writes the heartbeat on the primary, then measures every replica against it."""
+        now = time.time()
+        try:
+            with primary.begin() as connection:
+                updated = connection.execute(text("UPDATE replica_heartbeat SET beat_ms = :now WHERE id = 1"), {"now": int(now * 1000)})
+                if updated.rowcount == 0:
+                    connection.execute(text("INSERT INTO replica_heartbeat (id, beat_ms) VALUES (1, :now)"), {"now": int(now * 1000)})
+        except Exception as e:
+            print(f"An error occurred while writing the replica heartbeat: {e}")
+
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    beat_ms = connection.execute(text("SELECT beat_ms FROM replica_heartbeat WHERE id = 1")).scalar()
+                replica.lag = max(0.0, now - beat_ms / 1000) if beat_ms else None
+                replica.healthy = replica.lag is not None and replica.lag <= REPLICA_MAX_LAG_SECONDS
+            except Exception as e:
+                if replica.healthy:
+                    print(f"Replica {replica.name} failed its health check: {e}")
+                replica.healthy = False
+                replica.lag = None
+            metrics.set_gauge("db_replica_healthy", int(replica.healthy), replica=replica.name)
+            if replica.lag is not None:
+                metrics.set_gauge("db_replica_lag_seconds", round(replica.lag, 3), replica=replica.name)
+
+    def start(self, primary: Engine):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run(primary))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, primary: Engine):
+        while True:
+            await asyncio.to_thread(self.check, primary)
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL_SECONDS)
+
+
+replica_router = ReplicaRouter(REPLICA_DATABASE_URLS)
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica when use_replica is set (GET requests, see get_db).
+    The replica is chosen once and kept for the whole session so a request sees one consistent copy;
+    flushes, and sessions without use_replica, go to the primary bind.
+    """
+
+    use_replica = False
+    _replica: Optional[Engine] = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.use_replica and not self._flushing:
+            if self._replica is None:
+                self._replica = replica_router.pick()
+            if self._replica is not None:
+                return self._replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+def on_primary(db: Session, loader: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Wraps a cache loader so its reads go to the primary. A cached value outlives the request,
+    and one loaded from a lagging replica after the invalidation would bring back the old rows.
+    """
+
+    def load():
+        use_replica = getattr(db, "use_replica", False)
+        db.use_replica = False
+        try:
+            return loader()
+        finally:
+            db.use_replica = use_replica
+
+    return load
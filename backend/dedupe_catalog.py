@@ -0,0 +1,47 @@
+import argparse
+
+from db.database import SessionLocal
+from models.tables import Book, Video, ReviewType
+from services.dedup import build_index
+from services.reviews import merge_item_reviews
+
+# Finds clusters of near duplicate books / videos (MinHash + LSH over title, author / creator and description).
+# Dry run by default, with --merge the oldest item of each cluster is kept, reviews of the
+# others are moved onto it (one per user) and the others are deleted.
+# Usage: python dedupe_catalog.py [--merge]
+
+parser = argparse.ArgumentParser(description="Find and merge near duplicate catalog entries")
+parser.add_argument("--merge", action="store_true", help="merge the clusters instead of only listing them")
+args = parser.parse_args()
+
+
+def dedupe(db, model, creator_column, review_type):
+    rows = db.query(model.id, model.title, creator_column, model.description).yield_per(1000)
+    clusters = build_index(rows).clusters()
+    titles = dict(db.query(model.id, model.title).filter(model.id.in_([i for c in clusters for i in c])).all()) if clusters else {}
+
+    removed = 0
+    for cluster in clusters:
+        keep_id, duplicate_ids = cluster[0], cluster[1:]
+        print(f"[{model.__tablename__}] keep #{keep_id} '{titles[keep_id]}', duplicates: "
+              + ", ".join(f"#{item_id} '{titles[item_id]}'" for item_id in duplicate_ids))
+
+        if args.merge:
+            merge_item_reviews(db, review_type, keep_id, duplicate_ids)
+            db.query(model).filter(model.id.in_(duplicate_ids)).delete(synchronize_session=False)
+            db.commit()
+            removed += len(duplicate_ids)
+
+    return len(clusters), removed
+
+
+db = SessionLocal()
+try:
+    book_clusters, books_removed = dedupe(db, Book, Book.author, ReviewType.BOOK)
+    video_clusters, videos_removed = dedupe(db, Video, Video.creator, ReviewType.VIDEO)
+finally:
+    db.close()
+
+print(f" {book_clusters} book and {video_clusters} video duplicate clusters found.")
+if args.merge:
+    print(f" {books_removed} books and {videos_removed} videos merged away.")
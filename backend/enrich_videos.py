@@ -0,0 +1,17 @@
+from db.database import SessionLocal
+from services.youtube import YouTubeClient, add_enrichment_columns, enrich_videos
+
+# Fills duration, view / like counts, thumbnail and publish date of the videos now instead of
+# waiting for the scheduled video-enrichment job, adding the columns to older databases first.
+# Only videos never enriched or enriched more than VIDEO_ENRICH_STALE_DAYS ago are looked up.
+
+client = YouTubeClient()
+db = SessionLocal()
+try:
+    add_enrichment_columns(db)
+    counts = enrich_videos(db, client)
+finally:
+    db.close()
+    client.close()
+
+print(f" {counts['enriched']} videos enriched, {counts['not_found']} no longer on YouTube, {counts['not_youtube']} not YouTube links.")
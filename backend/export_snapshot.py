@@ -0,0 +1,14 @@
+import argparse
+
+from services.snapshot import SNAPSHOT_DIR, SNAPSHOT_FORMATS, write_snapshot
+
+# Writes a consistent columnar snapshot of book, video, review and user for offline analytics.
+# Usage: python export_snapshot.py --out snapshots --format parquet --compression zstd
+
+parser = argparse.ArgumentParser(description="Export a columnar snapshot of the catalog and users")
+parser.add_argument("--out", default=SNAPSHOT_DIR, help="folder the snapshot is written to")
+parser.add_argument("--format", default="parquet", choices=SNAPSHOT_FORMATS)
+parser.add_argument("--compression", default="zstd", help="zstd, lz4, snappy (parquet only) or none")
+args = parser.parse_args()
+
+write_snapshot(args.out, args.format, args.compression)
@@ -1,36 +1,23 @@
-import csv
-import mysql.connector
+import argparse
 
-conn = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="dd_bot"
-)
-cursor = conn.cursor()
+from db.database import SessionLocal
+from services.book_ingest import INGEST_WORKERS, ingest_books
 
-csv_file = "books_data.csv"
+# Loads the Kaggle books CSV into the catalog. .csv.gz and .zst files are read as they are.
+# Usage: python fetch_books.py books_data.csv.zst --workers 8
+# (The guard keeps the parser processes from running the script again when they start)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv_file", nargs="?", default="books_data.csv")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="parser processes, 1 parses in this process")
+    args = parser.parse_args()
 
-with open(csv_file, newline='', encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    books_added = 0
+    db = SessionLocal()
+    try:
+        counts = ingest_books(db, args.csv_file, workers=args.workers)
+    finally:
+        db.close()
 
-    for row in reader:
-        title = row.get("Name", "Unknown Title")
-        author = row.get("Author", "Unknown")
-        age_group = row.get("Age", "Unknown")[:255]
-        description = row.get("Description", "") or row.get("Product_Details", "")
-        link = row.get("Link", "")
-        rating = 0
-
-        cursor.execute("SELECT COUNT(*) FROM book WHERE title=%s AND link=%s", (title, link))
-        if cursor.fetchone()[0] == 0:
-            cursor.execute("""
-                INSERT INTO book (title, author, age_group, category, description, link, rating, source)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (title, author, age_group, "Children", description, link, rating, "Kaggle"))
-            books_added += 1
-
-conn.commit()
-conn.close()
-print(f" {books_added} child-safe books inserted into DB successfully!")
+    print(f" {counts['added']} child-safe books inserted into DB successfully!")
+    print(f" {counts['flagged']} books sent to the screening queue for review.")
+    print(f" {counts['known']} books already in the catalog.")
@@ -1,64 +1,29 @@
-import requests
-import mysql.connector
-import os
-from dotenv import load_dotenv
-load_dotenv()
+import argparse
 
-conn = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="dd_bot"
-)
-cursor = conn.cursor()
+from db.database import SessionLocal, engine
+from models.tables import HarvestWatermark
+from services.youtube import YouTubeClient, add_enrichment_columns, harvest_videos
 
-API_KEY = os.getenv("API_KEY")
+# Adds the YouTube search results for SEARCH_QUERY that aren't in the catalog yet. Only videos
+# published after the query's watermark are asked for, with a full pass every
+# YOUTUBE_FULL_SYNC_DAYS or when run with --full. The youtube-refresh job does the same daily.
 SEARCH_QUERY = "educational kids videos"
 
-url = "https://www.googleapis.com/youtube/v3/search"
-params = {
-    "part": "snippet",
-    "q": SEARCH_QUERY,
-    "type": "video",
-    "maxResults": 50,
-    "key": API_KEY
-}
-
-videos_added = 0
-next_page_token = None
-
-while True:
-    if next_page_token:
-        params["pageToken"] = next_page_token
-
-    response = requests.get(url, params=params).json()
-    items = response.get("items", [])
-    next_page_token = response.get("nextPageToken")
-
-    if not items:
-        break
-
-    for item in items:
-        snippet = item["snippet"]
-        title = snippet["title"]
-        creator = snippet["channelTitle"]
-        age_group = "5-12"
-        category = "Educational"
-        description = snippet.get("description", "")
-        link = f"https://www.youtube.com/watch?v={item['id']['videoId']}"
-        rating = 0
-
-        cursor.execute("SELECT COUNT(*) FROM video WHERE title=%s AND link=%s", (title, link))
-        if cursor.fetchone()[0] == 0:
-            cursor.execute("""
-                INSERT INTO video (title, creator, age_group, category, description, link, rating, source)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (title, creator, age_group, category, description, link, rating, "YouTube"))
-            videos_added += 1
-
-    if not next_page_token:
-        break
-
-conn.commit()
-conn.close()
-print(f" {videos_added} child-safe videos inserted into DB successfully!")
\ No newline at end of file
+parser = argparse.ArgumentParser()
+parser.add_argument("--query", default=SEARCH_QUERY)
+parser.add_argument("--full", action="store_true", help="walk every page of the results instead of only the new videos")
+args = parser.parse_args()
+
+HarvestWatermark.__table__.create(engine, checkfirst=True)
+client = YouTubeClient()
+db = SessionLocal()
+try:
+    add_enrichment_columns(db)
+    counts = harvest_videos(db, client, args.query, full=args.full or None)
+finally:
+    db.close()
+    client.close()
+
+print(f" {counts['added']} child-safe videos inserted into DB successfully!")
+print(f" {counts['flagged']} videos sent to the screening queue for review.")
+print(f" {counts['known']} videos already known, {counts['pages']} pages fetched.")
@@ -1,18 +1,46 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from db.database import create_tables_and_seed_it
+from db.database import create_tables_and_seed_it, engine
+from db.routing import replica_router
 from contextlib import asynccontextmanager
+from middleware.compression import CompressionMiddleware
+from auth.revocation import purge_old_revocations, refresh_revocations
+from auth.sessions import purge_expired_sessions
 
-from routers import auth, users, parent, admin, librarian, review
+from routers import auth, users, parent, admin, librarian, review, events
+from services.events import event_buffer
+from services.jobs import register_jobs
+from services.dedup import duplicate_indexes
+from services.read_model import read_model
+from services.scheduler import scheduler
 
 
 @asynccontextmanager
 async def lifespan_context(app: FastAPI):
     try:
         create_tables_and_seed_it()
+        purge_old_revocations()
+        refresh_revocations(force=True)
+        purge_expired_sessions()
     except Exception as e:
         print(f"Error during startup: {e}")
+    
+    replica_router.start(engine)
+    event_buffer.start()
+    # Columnar copy of the catalog for the listings, built in the background
+    read_model.start()
+    # Near duplicate indexes for the add endpoints, built in the background
+    duplicate_indexes.start()
+    # Maintenance jobs, run by whichever worker holds the scheduler lock
+    register_jobs(scheduler)
+    scheduler.start(engine)
     yield
+    await scheduler.stop()
+    await read_model.stop()
+    await duplicate_indexes.stop()
+    await replica_router.stop()
+    # Write out any buffered activity events before the worker exits
+    await event_buffer.stop()
     
 
 app = FastAPI(
@@ -46,6 +74,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for catalog pages, user lists and exports
+app.add_middleware(CompressionMiddleware)
+
 # --- Routers ---
 app.include_router(auth.router, prefix="/auth")
 app.include_router(users.router)
@@ -53,5 +84,6 @@ app.include_router(parent.router)
 app.include_router(admin.router)
 app.include_router(librarian.router)
 app.include_router(review.router)
+app.include_router(events.router)
 
 
@@ -0,0 +1,191 @@
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, fall back to gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/javascript",
+)
+
+
+def default_levels():
+    # Fewer cores means less CPU to spare per request, so compress a bit faster/lighter.
+    # Returns (gzip level, brotli quality)
+    cpus = os.cpu_count() or 1
+    if cpus >= 4:
+        return 6, 5
+    if cpus >= 2:
+        return 5, 4
+    return 4, 3
+
+
+def choose_encoding(accept_encoding: str):
+    # Parse "br;q=1.0, gzip;q=0.8, *;q=0.1" and pick the best encoding we support
+    weights = {}
+    for part in accept_encoding.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for name in supported:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(headers: Headers) -> bool:
+    return "content-encoding" not in headers and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+
+def vary_on_encoding(start_message):
+    # Any response that could have been compressed varies by Accept-Encoding, even when this one
+    # wasn't (too small, or the client doesn't accept it), so shared caches keep the variants apart
+    headers = MutableHeaders(raw=start_message["headers"])
+    if is_compressible(headers):
+        headers.add_vary_header("Accept-Encoding")
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush so each streamed chunk can be decoded by the client straight away
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip / brotli compression.
+    - Responses smaller than minimum_size are sent as is.
+    - Streaming responses are compressed chunk by chunk, the body is never buffered.
+    """
+
+    def __init__(self, app, minimum_size: int | None = None, gzip_level: int | None = None, brotli_quality: int | None = None):
+        self.app = app
+        default_gzip, default_brotli = default_levels()
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv("GZIP_LEVEL", default_gzip))
+        self.brotli_quality = brotli_quality if brotli_quality is not None else int(os.getenv("BROTLI_QUALITY", default_brotli))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            async def send_uncompressed(message):
+                if message["type"] == "http.response.start":
+                    vary_on_encoding(message)
+                await send(message)
+
+            await self.app(scope, receive, send_uncompressed)
+            return
+
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def make_compressor(self, encoding: str):
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Hold on to the headers until we've seen the first chunk of the body
+            self.start_message = message
+            return
+
+        if message_type != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = Headers(raw=self.start_message["headers"])
+            skip = (
+                not is_compressible(headers)
+                or (not more_body and len(body) < self.middleware.minimum_size)
+            )
+            if skip:
+                self.passthrough = True
+                vary_on_encoding(self.start_message)
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.compressor = self.middleware.make_compressor(self.encoding)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                # Whole body is here, compress it in one go and send a real Content-Length
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming response, the final size is unknown
+            del headers["Content-Length"]
+            await self._send(self.start_message)
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,15 @@
+from db.database import SessionLocal
+from services.reviews import add_review_indexes, rebuild_review_stats
+
+# One off job for databases created before item reviews: enforces one review per user per item
+# (older duplicates are removed) and fills review_stats. Safe to run again.
+
+db = SessionLocal()
+try:
+    add_review_indexes(db)
+    items = rebuild_review_stats(db)
+    db.commit()
+finally:
+    db.close()
+
+print(f" Star histograms rebuilt for {items} reviewed items.")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, TEXT, CheckConstraint, FLOAT, Enum, and_, DATE
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, TEXT, CheckConstraint, FLOAT, Enum, and_, DATE, Index, BigInteger, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from db.database import Base
@@ -33,6 +33,30 @@ class ReviewType(enum.Enum):
     BOOK = "BOOK"
     VIDEO = "VIDEO"
     APP = "APP"
+    
+class MediaType(enum.Enum):
+    BOOK = "BOOK"
+    VIDEO = "VIDEO"
+    
+class ActivityEventType(enum.Enum):
+    VIEW = "VIEW"
+    PLAY = "PLAY"
+    COMPLETE = "COMPLETE"
+    
+class ScreeningStatus(enum.Enum):
+    PENDING = "PENDING"
+    APPROVED = "APPROVED"
+    REJECTED = "REJECTED"
+    
+class LinkStatus(enum.Enum):
+    UNCHECKED = "UNCHECKED"
+    OK = "OK"
+    FAILING = "FAILING" # errors or timeouts (403, 429, 5xx), still listed however often it fails
+    DEAD = "DEAD" # 404 / 410, hidden from listings
+    
+class JobRunStatus(enum.Enum):
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
 
 # --- Models ---
 
@@ -49,6 +73,22 @@ class Book(Base):
     rating = Column(FLOAT, default=0)
     source = Column(String(length=100), nullable=False, default="Kaggle")
     
+    # Parsed from age_group (see services/age_range.py), "and up" is stored as max_age 99
+    min_age = Column(Integer, nullable=True)
+    max_age = Column(Integer, nullable=True)
+    
+    # Kept up by the link checker (services/link_check.py), etag / last_modified make its next check conditional
+    link_status = Column(Enum(LinkStatus, native_enum=False, length=20), nullable=False, default=LinkStatus.UNCHECKED, server_default=LinkStatus.UNCHECKED.value)
+    link_checked_at = Column(DateTime, nullable=True)
+    link_failures = Column(Integer, nullable=False, default=0, server_default="0")
+    link_etag = Column(String(length=255), nullable=True)
+    link_last_modified = Column(String(length=64), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_book_age_range", "min_age", "max_age"),
+        Index("ix_book_link_status", "link_status"),
+    )
+    
     # Relationship to get all reviews for this book
     reviews = relationship(
         "Review",
@@ -69,6 +109,31 @@ class Video(Base):
     link = Column(String(length=500), nullable=False, unique=True)
     rating = Column(FLOAT, default=0)
     source = Column(String(length=100), nullable=False, default="Youtube")
+    
+    # Parsed from age_group (see services/age_range.py), "and up" is stored as max_age 99
+    min_age = Column(Integer, nullable=True)
+    max_age = Column(Integer, nullable=True)
+    
+    # Kept up by the link checker (services/link_check.py), etag / last_modified make its next check conditional
+    link_status = Column(Enum(LinkStatus, native_enum=False, length=20), nullable=False, default=LinkStatus.UNCHECKED, server_default=LinkStatus.UNCHECKED.value)
+    link_checked_at = Column(DateTime, nullable=True)
+    link_failures = Column(Integer, nullable=False, default=0, server_default="0")
+    link_etag = Column(String(length=255), nullable=True)
+    link_last_modified = Column(String(length=64), nullable=True)
+    
+    # From the YouTube video details (services/youtube.py), refreshed once enriched_at is stale
+    duration_seconds = Column(Integer, nullable=True)
+    view_count = Column(BigInteger, nullable=True)
+    like_count = Column(BigInteger, nullable=True)
+    thumbnail_url = Column(String(length=500), nullable=True)
+    published_at = Column(DateTime, nullable=True)
+    enriched_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_video_age_range", "min_age", "max_age"),
+        Index("ix_video_link_status", "link_status"),
+        Index("ix_video_duration", "duration_seconds"),
+    )
 
     # Relationship to get all reviews for this video
     reviews = relationship(
@@ -97,6 +162,27 @@ class Review(Base):
     created_at = Column(DateTime, server_default=func.now())
     
     user = relationship("User", back_populates="reviews")
+    
+    __table_args__ = (
+        # One review per user per item (the app is item 0), writes go through services/reviews.py
+        UniqueConstraint("review_type", "reviewable_id", "user_id", name="uq_review_user_item"),
+        # Keyset pagination of an item's reviews, newest first
+        Index("ix_review_item_created", "review_type", "reviewable_id", "created_at", "id"),
+    )
+
+class ReviewStats(Base):
+    __tablename__ = "review_stats"
+    
+    # Star histogram per reviewed item, kept in step with review in the same transaction
+    review_type = Column(Enum(ReviewType, native_enum=False, length=50), primary_key=True)
+    reviewable_id = Column(Integer, primary_key=True, autoincrement=False)
+    review_count = Column(Integer, nullable=False, default=0)
+    stars_total = Column(Integer, nullable=False, default=0)
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
 
 class Interest(Base):
     __tablename__ = "interest"
@@ -143,6 +229,7 @@ class User(Base):
     
     interests = relationship("Interest", secondary="childinterest", back_populates="children")
     reviews = relationship("Review", back_populates="user", cascade="all, delete-orphan")
+    sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan")
 
 class LandingPage(Base):
     __tablename__ = "landingpage"
@@ -159,4 +246,144 @@ class LandingPage(Base):
     display_text = Column(TEXT, nullable=False)
     
     # Key to group items,'FREE_PLAN' or 'PRO_PLAN'
-    grouping_key = Column(String(length=50), nullable=True)
\ No newline at end of file
+    grouping_key = Column(String(length=50), nullable=True)
+
+class FlaggedMedia(Base):
+    __tablename__ = "flagged_media"
+    
+    # Books / videos held back by the content screening, waiting for an admin to approve or reject
+    id = Column(Integer, primary_key=True, autoincrement="auto")
+    media_type = Column(Enum(MediaType, native_enum=False, length=20), nullable=False)
+    title = Column(String(length=255), nullable=False)
+    link = Column(String(length=500), nullable=False, index=True)
+    
+    # Comma separated blocklist terms that were found
+    matched_terms = Column(String(length=500), nullable=False)
+    
+    # JSON of the Book / Video columns, inserted into the catalog when approved
+    payload = Column(TEXT, nullable=False)
+    
+    # Set for an edit of a catalog item: payload then only holds the changed columns, applied to
+    # that item when approved. The item stays as it was until then, and after a rejection
+    item_id = Column(Integer, nullable=True, index=True)
+    
+    status = Column(
+        Enum(ScreeningStatus, native_enum=False, length=20),
+        nullable=False,
+        default=ScreeningStatus.PENDING,
+        index=True
+    )
+    created_at = Column(DateTime, server_default=func.now())
+    reviewed_by = Column(String(length=50), nullable=True)
+
+class TokenRevocation(Base):
+    __tablename__ = "token_revocation"
+    
+    # Access tokens of user_id issued before revoked_before_ms (epoch milliseconds) are rejected.
+    # Written when a user is deleted or changes password, loaded into memory by auth/revocation.py
+    id = Column(Integer, primary_key=True, autoincrement="auto")
+    user_id = Column(Integer, nullable=False, index=True)
+    revoked_before_ms = Column(BigInteger, nullable=False)
+    reason = Column(String(length=50), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), index=True)
+
+class UserSession(Base):
+    __tablename__ = "user_session"
+    
+    # One row per refresh token, rotated on every /auth/refresh
+    id = Column(Integer, primary_key=True, autoincrement="auto")
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    # HMAC-SHA256 of the refresh token, the token itself is never stored
+    token_hash = Column(String(length=64), nullable=False, unique=True, index=True)
+    device = Column(String(length=255), nullable=True)
+    
+    created_at = Column(DateTime, server_default=func.now())
+    last_used_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)
+    
+    user = relationship("User", back_populates="sessions")
+
+class ActivityEvent(Base):
+    __tablename__ = "activity_event"
+    
+    # Append only log of what children open, read and watch, written in batches by services/events.py
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement="auto")
+    child_id = Column(Integer, nullable=False)
+    media_type = Column(Enum(MediaType, native_enum=False, length=20), nullable=False)
+    media_id = Column(Integer, nullable=False)
+    event_type = Column(Enum(ActivityEventType, native_enum=False, length=20), nullable=False)
+    
+    # Seconds read / watched since the previous event for this item, sent by the client
+    duration_seconds = Column(Integer, nullable=True)
+    occurred_at = Column(DateTime, nullable=False)
+    received_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_activity_event_child_time", "child_id", "occurred_at"),
+    )
+
+class ChildActivityDaily(Base):
+    __tablename__ = "child_activity_daily"
+    
+    # Rollup of activity_event per child, day and media category, maintained by services/rollups.py
+    id = Column(Integer, primary_key=True, autoincrement="auto")
+    child_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    day = Column(DATE, nullable=False)
+    category = Column(String(length=100), nullable=False)
+    
+    events = Column(Integer, nullable=False, default=0)
+    books_opened = Column(Integer, nullable=False, default=0)
+    videos_played = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    seconds_reading = Column(Integer, nullable=False, default=0)
+    seconds_watching = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("child_id", "day", "category", name="uq_child_activity_daily"),
+    )
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermark"
+    
+    # Highest activity_event id already folded into a rollup, one row per rollup
+    name = Column(String(length=50), primary_key=True)
+    last_event_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class HarvestWatermark(Base):
+    __tablename__ = "harvest_watermark"
+    
+    # Per YouTube search query: newest publishedAt seen, later runs only ask for newer videos (services/youtube.py)
+    query = Column(String(length=255), primary_key=True)
+    newest_published_at = Column(DateTime, nullable=True)
+    last_full_sync_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class ReplicaHeartbeat(Base):
+    __tablename__ = "replica_heartbeat"
+    
+    # Single row the primary stamps every few seconds, replicas report their lag from it (db/routing.py)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    beat_ms = Column(BigInteger, nullable=False)
+
+class JobRun(Base):
+    __tablename__ = "job_run"
+    
+    # One row per run of a scheduled maintenance job (services/scheduler.py)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement="auto")
+    job_name = Column(String(length=100), nullable=False)
+    status = Column(Enum(JobRunStatus, native_enum=False, length=20), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Integer, nullable=False)
+    error = Column(TEXT, nullable=True)
+    
+    # host:pid of the worker that was leader at the time
+    worker = Column(String(length=100), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_job_run_name_started", "job_name", "started_at"),
+    )
@@ -0,0 +1,20 @@
+import argparse
+from datetime import date
+
+from db.database import SessionLocal
+from services.rollups import rebuild_rollups
+
+# Recomputes child_activity_daily from activity_event, e.g. after changing how events are counted.
+# Rebuilt days are replaced, so it is safe to run again or alongside the running aggregator.
+
+parser = argparse.ArgumentParser(description="Rebuild the per child activity rollups from the raw events.")
+parser.add_argument("--since", type=date.fromisoformat, default=None, help="only rebuild days on or after this date (YYYY-MM-DD)")
+args = parser.parse_args()
+
+db = SessionLocal()
+try:
+    rows = rebuild_rollups(db, args.since)
+finally:
+    db.close()
+
+print(f" {rows} rollup rows rebuilt" + (f" from {args.since}." if args.since else "."))
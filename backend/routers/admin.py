@@ -1,17 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status, BackgroundTasks
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 
-from auth.auth_handler import get_current_admin_user, get_db, verify_password, get_password_hash
-from schemas.auth import StatusMessage
-from schemas.admin import ViewAllUserResponse
+from auth.auth_handler import get_current_admin_user, get_admin_claims, get_db, verify_password, get_password_hash
+from auth.revocation import revoke_user_tokens
+from schemas.auth import StatusMessage, TokenClaims
+from schemas.admin import ViewAllUserResponse, JobResponse, JobRunResponse
 from schemas.librarian import LibrarianResponse
-from schemas.media import PaginatedBookResponse, PaginatedVideoResponse
-from models.tables import User, LandingPage, Book, Video
+from schemas.media import PaginatedBookResponse, PaginatedVideoResponse, BookListItem, VideoListItem
+from models.tables import User, LandingPage, Book, Video, FlaggedMedia, MediaType, ScreeningStatus, ReviewType, JobRun
 from schemas.landing_page import LandingPageResponse, LandingPageUpdate, LandingPageCreate
+from schemas.screening import FlaggedMediaResponse, PaginatedFlaggedMediaResponse
+from services.catalog import BOOK_FIELDS, BOOK_LIST_FIELDS, VIDEO_FIELDS, VIDEO_LIST_FIELDS, parse_fields, with_fields, to_sparse
+from services.export import EXPORT_FORMATS, stream_export
+from services.snapshot import SNAPSHOT_DIR, write_snapshot
+from services.cache import cache
+from services.landing_page import landing_page_content
+from services.link_check import link_reset_fields
+from services.reference_data import reference_data
+from services.reviews import delete_user_reviews, delete_item_reviews
+from services.quota import forget_parent, release_child_slots
+from services.scheduler import scheduler
+from services import metrics
 
-from typing import List
+from typing import List, Optional, Literal
 
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -25,20 +40,20 @@ router = APIRouter(
 @router.get("/view-all-users", response_model=ViewAllUserResponse)
 def view_all_users(
     db: Session = Depends(get_db), 
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenClaims = Depends(get_admin_claims)
 ):
     # Fetch all users (parents and kids)
     parents_and_kids_query = (
         db.query(User)
         .options(joinedload(User.role))
-        .filter(User.role_id.in_([2, 3]))
+        .filter(User.role_id.in_([reference_data.role_id("PARENT"), reference_data.role_id("CHILD")]))
         .all()
     )
     
     # Calculate the counts
     total_users = len(parents_and_kids_query)
-    total_parents = sum(1 for user in parents_and_kids_query if user.role_id == 2)
-    total_kids = sum(1 for user in parents_and_kids_query if user.role_id == 3)
+    total_parents = sum(1 for user in parents_and_kids_query if user.role_id == reference_data.role_id("PARENT"))
+    total_kids = sum(1 for user in parents_and_kids_query if user.role_id == reference_data.role_id("CHILD"))
     
     # Build and return the final response object
     return ViewAllUserResponse(
@@ -65,17 +80,27 @@ def delete_user(
     if not user_to_delete:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    is_parent = user_to_delete.role.name.value == "PARENT"
+    is_parent = reference_data.role_name(user_to_delete.role_id) == "PARENT"
     username = user_to_delete.username # Store username before deletion
+    family_id = user_to_delete.id if is_parent else user_to_delete.primary_parent_id
 
     if is_parent:
+        forget_parent(db, user_to_delete.id)
         children_to_delete = db.query(User).filter(User.primary_parent_id == user_to_delete.id).all()
+        delete_user_reviews(db, [child.id for child in children_to_delete])
         for child in children_to_delete:
+            revoke_user_tokens(db, child.id, "USER_DELETED")
             db.delete(child)
+    elif family_id is not None:
+        release_child_slots(db, family_id)
     
+    delete_user_reviews(db, [user_to_delete.id])
+    revoke_user_tokens(db, user_to_delete.id, "USER_DELETED")
     db.delete(user_to_delete)
     
     db.commit()
+    if family_id is not None:
+        cache.invalidate(f"children:{family_id}")
 
     # --- Conditional Message Logic ---
     if is_parent:
@@ -91,10 +116,9 @@ def delete_user(
 @router.get("/landing-page-content", response_model=List[LandingPageResponse])
 def get_admin_landing_page_content(
     db: Session = Depends(get_db), 
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenClaims = Depends(get_admin_claims)
 ):
-    content = db.query(LandingPage).all()
-    return content
+    return landing_page_content(db)
 
 @router.put("/landing-page-content/{item_id}", response_model=LandingPageResponse)
 def update_landing_page_content(
@@ -117,6 +141,7 @@ def update_landing_page_content(
         
     db.commit()
     db.refresh(db_item)
+    cache.invalidate("landing_page")
     return db_item
 
 @router.post("/landing-page-content", response_model=LandingPageResponse, status_code=status.HTTP_201_CREATED)
@@ -129,14 +154,15 @@ def create_landing_page_content(
     db.add(new_item)
     db.commit()
     db.refresh(new_item)
+    cache.invalidate("landing_page")
     return new_item
 
 @router.get("/view-all-librarians", response_model=List[LibrarianResponse])
 def view_all_librarians(
     db: Session = Depends(get_db),
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenClaims = Depends(get_admin_claims)
 ):
-    librarians = db.query(User).filter(User.role_id == 4).all() # 4 is LIBRARIAN role_id
+    librarians = db.query(User).filter(User.role_id == reference_data.role_id("LIBRARIAN")).all()
     return librarians
     
 @router.delete("/delete-librarian/{librarian_id}", response_model=StatusMessage)
@@ -145,58 +171,71 @@ def delete_librarian_and_media(
     db: Session = Depends(get_db),
     current_admin: User = Depends(get_current_admin_user)
 ):
-    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == 4).first()
+    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == reference_data.role_id("LIBRARIAN")).first()
     if not librarian:
         raise HTTPException(status_code=404, detail="Librarian not found")
         
     librarian_username = librarian.username
 
-    # Delete all media sourced by this librarian
+    # Delete all media sourced by this librarian, with their reviews
+    delete_item_reviews(db, ReviewType.BOOK, [book_id for (book_id,) in db.query(Book.id).filter(Book.source == librarian_username)])
+    delete_item_reviews(db, ReviewType.VIDEO, [video_id for (video_id,) in db.query(Video.id).filter(Video.source == librarian_username)])
     db.query(Book).filter(Book.source == librarian_username).delete(synchronize_session=False)
     db.query(Video).filter(Video.source == librarian_username).delete(synchronize_session=False)
     
     # Delete the librarian user
+    delete_user_reviews(db, [librarian.id])
+    revoke_user_tokens(db, librarian.id, "USER_DELETED")
     db.delete(librarian)
     
     db.commit()
+    cache.invalidate("books", "videos")
     
     return StatusMessage(status="success", message=f"Librarian '{librarian_username}' and all their contributions have been deleted.")
 
 # Endpoint to get a paginated list of books by a specific librarian
-@router.get("/librarian/{librarian_id}/books", response_model=PaginatedBookResponse)
+@router.get("/librarian/{librarian_id}/books", response_model=PaginatedBookResponse, response_model_exclude_unset=True)
 def get_librarian_books(
     librarian_id: int,
     db: Session = Depends(get_db),
+    fields: Optional[str] = None,
     page: int = 1,
     size: int = 5  # Show 5 items per page
 ):
-    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == 4).first()
+    selected = parse_fields(fields, BOOK_FIELDS, BOOK_LIST_FIELDS)
+    
+    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == reference_data.role_id("LIBRARIAN")).first()
     if not librarian:
         raise HTTPException(status_code=404, detail="Librarian not found")
 
     query = db.query(Book).filter(Book.source == librarian.username).order_by(Book.id.desc())
     total = query.count()
-    books = query.offset((page - 1) * size).limit(size).all()
+    books = with_fields(query, Book, selected).offset((page - 1) * size).limit(size).all()
+    items = [BookListItem(**to_sparse(book, selected)) for book in books]
     
-    return PaginatedBookResponse(total=total, items=books)
+    return PaginatedBookResponse(total=total, items=items)
 
 # Endpoint to get a paginated list of videos by a specific librarian
-@router.get("/librarian/{librarian_id}/videos", response_model=PaginatedVideoResponse)
+@router.get("/librarian/{librarian_id}/videos", response_model=PaginatedVideoResponse, response_model_exclude_unset=True)
 def get_librarian_videos(
     librarian_id: int,
     db: Session = Depends(get_db),
+    fields: Optional[str] = None,
     page: int = 1,
     size: int = 5
 ):
-    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == 4).first()
+    selected = parse_fields(fields, VIDEO_FIELDS, VIDEO_LIST_FIELDS)
+    
+    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == reference_data.role_id("LIBRARIAN")).first()
     if not librarian:
         raise HTTPException(status_code=404, detail="Librarian not found")
 
     query = db.query(Video).filter(Video.source == librarian.username).order_by(Video.id.desc())
     total = query.count()
-    videos = query.offset((page - 1) * size).limit(size).all()
+    videos = with_fields(query, Video, selected).offset((page - 1) * size).limit(size).all()
+    items = [VideoListItem(**to_sparse(video, selected)) for video in videos]
     
-    return PaginatedVideoResponse(total=total, items=videos)
+    return PaginatedVideoResponse(total=total, items=items)
 
 # approve a librarian by an admin
 @router.patch("/approve-librarian/{librarian_id}", response_model=LibrarianResponse)
@@ -205,7 +244,7 @@ def approve_librarian(
     db: Session = Depends(get_db),
     current_admin: User = Depends(get_current_admin_user)
 ):
-    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == 4).first()
+    librarian = db.query(User).filter(User.id == librarian_id, User.role_id == reference_data.role_id("LIBRARIAN")).first()
     if not librarian:
         raise HTTPException(status_code=404, detail="Librarian not found")
     
@@ -216,4 +255,129 @@ def approve_librarian(
     db.commit()
     db.refresh(librarian)
     
-    return librarian
\ No newline at end of file
+    return librarian
+
+# Stream a whole table as NDJSON or CSV, rows are sent as they come off the cursor
+@router.get("/export/{table}")
+def export_table(
+    table: Literal["books", "videos", "reviews", "users"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_admin: TokenClaims = Depends(get_admin_claims)
+):
+    return StreamingResponse(
+        stream_export(table, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
+
+# Kick off a columnar (Parquet / Arrow) snapshot of the catalog and users for analytics
+@router.post("/snapshots", response_model=StatusMessage, status_code=status.HTTP_202_ACCEPTED)
+def create_snapshot(
+    background_tasks: BackgroundTasks,
+    format: Literal["parquet", "arrow"] = "parquet",
+    current_admin: User = Depends(get_current_admin_user)
+):
+    background_tasks.add_task(write_snapshot, SNAPSHOT_DIR, format)
+    return StatusMessage(status="success", message=f"Snapshot export started, files will be written to '{SNAPSHOT_DIR}'.")
+
+# Items held back by content screening, oldest first
+@router.get("/screening-queue", response_model=PaginatedFlaggedMediaResponse)
+def view_screening_queue(
+    db: Session = Depends(get_db),
+    current_admin: TokenClaims = Depends(get_admin_claims),
+    page: int = 1,
+    size: int = 10
+):
+    query = (
+        db.query(FlaggedMedia)
+        .filter(FlaggedMedia.status == ScreeningStatus.PENDING)
+        .order_by(FlaggedMedia.id)
+    )
+    total = query.count()
+    items = query.offset((page - 1) * size).limit(size).all()
+    return PaginatedFlaggedMediaResponse(total=total, items=items)
+
+def get_pending_flagged_item(flagged_id: int, db: Session):
+    flagged = db.query(FlaggedMedia).filter(FlaggedMedia.id == flagged_id).first()
+    if not flagged:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flagged item not found")
+    if flagged.status != ScreeningStatus.PENDING:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="This item has already been reviewed.")
+    return flagged
+
+# approve a flagged item, it is added to the catalog as it was submitted,
+# or for an edit (item_id set) the changes are applied to that item
+@router.post("/screening-queue/{flagged_id}/approve", response_model=FlaggedMediaResponse)
+def approve_flagged_media(
+    flagged_id: int,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    flagged = get_pending_flagged_item(flagged_id, db)
+    
+    model = Book if flagged.media_type == MediaType.BOOK else Video
+    link_owner = db.query(model).filter(model.link == flagged.link).first()
+    if link_owner and link_owner.id != flagged.item_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="An item with this link is already in the catalog.")
+    
+    payload = json.loads(flagged.payload)
+    if flagged.item_id is None:
+        item = model(**payload)
+        db.add(item)
+    else:
+        item = db.query(model).filter(model.id == flagged.item_id).first()
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The item these changes were for has been deleted.")
+        if payload.get("link", item.link) != item.link:
+            payload.update(link_reset_fields())
+        for column, value in payload.items():
+            setattr(item, column, value)
+    flagged.status = ScreeningStatus.APPROVED
+    flagged.reviewed_by = current_admin.username
+    db.commit()
+    db.refresh(flagged)
+    tag = "books" if model is Book else "videos"
+    cache.invalidate(tag, f"{tag}:{item.id}")
+    return flagged
+
+@router.post("/screening-queue/{flagged_id}/reject", response_model=FlaggedMediaResponse)
+def reject_flagged_media(
+    flagged_id: int,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    flagged = get_pending_flagged_item(flagged_id, db)
+    flagged.status = ScreeningStatus.REJECTED
+    flagged.reviewed_by = current_admin.username
+    db.commit()
+    db.refresh(flagged)
+    return flagged
+
+# Prometheus text format counters / gauges (rate limiter, ...)
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(current_admin: TokenClaims = Depends(get_admin_claims)):
+    return metrics.render()
+
+# Scheduled maintenance jobs with their last run, from the job_run history of the whole cluster
+@router.get("/jobs", response_model=List[JobResponse])
+def get_scheduled_jobs(db: Session = Depends(get_db), current_admin: TokenClaims = Depends(get_admin_claims)):
+    latest = db.query(func.max(JobRun.id)).group_by(JobRun.job_name)
+    last_runs = {run.job_name: run for run in db.query(JobRun).filter(JobRun.id.in_(latest))}
+    return [
+        JobResponse(
+            name=job.name,
+            schedule=job.schedule.expression,
+            next_run=job.next_run,
+            last_run=JobRunResponse.model_validate(last_runs[job.name]) if job.name in last_runs else None
+        )
+        for job in scheduler.jobs.values()
+    ]
+
+@router.get("/jobs/{job_name}/runs", response_model=List[JobRunResponse])
+def get_job_runs(
+    job_name: str,
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_admin: TokenClaims = Depends(get_admin_claims)
+):
+    return db.query(JobRun).filter(JobRun.job_name == job_name).order_by(JobRun.started_at.desc()).limit(limit).all()
@@ -1,24 +1,29 @@
-from datetime import timedelta
-
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import Depends, HTTPException, status, APIRouter, BackgroundTasks
+from fastapi import Depends, HTTPException, status, APIRouter, BackgroundTasks, Request
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 import os
 from dotenv import load_dotenv
 
-from auth.auth_handler import authenticate_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_user, get_password_hash, create_verification_token, send_verification_email
+from auth.auth_handler import authenticate_user, issue_access_token, get_current_active_user, get_user, get_password_hash, create_verification_token, send_verification_email
 from db.database import get_db
-from schemas.auth import Token
+from schemas.auth import Token, RefreshRequest, SessionResponse, StatusMessage
+from auth.sessions import create_session, rotate_session, hash_refresh_token
+from datetime import datetime
+from typing import List
 from schemas.librarian import LibrarianRegistrationRequest
 from schemas.users import ParentRegistrationRequest, ParentRegistrationResponse
-from models.tables import User, SubscriptionTier
+from models.tables import User, SubscriptionTier, UserSession
+from services.rate_limit import check_rate_limit
+from services.reference_data import reference_data
 
 load_dotenv()
 router = APIRouter()
 
 @router.post("/register")
-def register_user(user: ParentRegistrationRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def register_user(user: ParentRegistrationRequest, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+    check_rate_limit("register", request, user.username)
+    
     db_user = get_user(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered.")
@@ -39,7 +44,7 @@ def register_user(user: ParentRegistrationRequest, background_tasks: BackgroundT
         birthday=user.birthday,
         race=user.race,
         tier=SubscriptionTier.FREE,
-        role_id=2,
+        role_id=reference_data.role_id("PARENT"),
         is_verified=False
     )
     db.add(db_user)
@@ -56,8 +61,11 @@ def register_user(user: ParentRegistrationRequest, background_tasks: BackgroundT
 async def register_librarian(
     user: LibrarianRegistrationRequest, 
     background_tasks: BackgroundTasks, 
+    request: Request,
     db: Session = Depends(get_db)
 ):
+    check_rate_limit("register-librarian", request, user.username)
+    
     # Check if username or email already exists
     if db.query(User).filter(User.username == user.username).first():
         raise HTTPException(status_code=400, detail="Username already registered.")
@@ -76,7 +84,7 @@ async def register_librarian(
         gender=user.gender,
         birthday=user.birthday,
         race=user.race,
-        role_id=4,  # Assuming LIBRARIAN role ID is 4
+        role_id=reference_data.role_id("LIBRARIAN"),
         is_verified=False
     )
     
@@ -116,7 +124,9 @@ def verify_email(token: str, db: Session = Depends(get_db)):
 
 # login with authentication & receive access token
 @router.post("/token")
-async def login_for_access_token( form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Token:
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Token:
+    check_rate_limit("login", request, form_data.username)
+    
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -129,7 +139,7 @@ async def login_for_access_token( form_data: OAuth2PasswordRequestForm = Depends
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please verify your email before logging in.")
         
     # Get role information
-    user_role_name = user.role.name.value
+    user_role_name = reference_data.role_name(user.role_id)
     
     # Additional check ONLY for librarians to see if an admin has approved them
     if user_role_name == "LIBRARIAN" and not user.librarian_verified:
@@ -138,13 +148,59 @@ async def login_for_access_token( form_data: OAuth2PasswordRequestForm = Depends
             detail="Your librarian account is awaiting admin approval. Please check back later."
         )
         
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username, "role": user_role_name}, 
-        expires_delta=access_token_expires
-    )
+    access_token = issue_access_token(user)
+    
+    # Refresh token so the client can renew the access token without the password
+    refresh_token = create_session(db, user.id, request.headers.get("user-agent"))
+    db.commit()
+    
     return Token(
         access_token=access_token, 
         token_type="bearer",
-        user_role=user_role_name
+        user_role=user_role_name,
+        refresh_token=refresh_token
+    )
+
+# new access token for a refresh token, the refresh token is rotated
+@router.post("/refresh")
+def refresh_access_token(refresh_data: RefreshRequest, db: Session = Depends(get_db)) -> Token:
+    user, new_refresh_token = rotate_session(db, refresh_data.refresh_token)
+    return Token(
+        access_token=issue_access_token(user),
+        token_type="bearer",
+        user_role=reference_data.role_name(user.role_id),
+        refresh_token=new_refresh_token
+    )
+
+@router.post("/logout", response_model=StatusMessage)
+def logout(refresh_data: RefreshRequest, db: Session = Depends(get_db)):
+    db.query(UserSession).filter(
+        UserSession.token_hash == hash_refresh_token(refresh_data.refresh_token),
+        UserSession.revoked_at.is_(None)
+    ).update({UserSession.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return StatusMessage(status="success", message="Logged out successfully.")
+
+# signed in devices of the current user
+@router.get("/sessions", response_model=List[SessionResponse])
+def list_sessions(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    return (
+        db.query(UserSession)
+        .filter(
+            UserSession.user_id == current_user.id,
+            UserSession.revoked_at.is_(None),
+            UserSession.expires_at > datetime.utcnow()
+        )
+        .order_by(UserSession.id.desc())
+        .all()
     )
+
+@router.delete("/sessions/{session_id}", response_model=StatusMessage)
+def revoke_session(session_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    
+    session.revoked_at = datetime.utcnow()
+    db.commit()
+    return StatusMessage(status="success", message="Session signed out successfully.")
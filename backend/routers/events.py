@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from auth.auth_handler import get_child_claims
+from models.tables import MediaType, ActivityEventType
+from schemas.auth import TokenClaims
+from schemas.events import ActivityEventBatch, ActivityEventBatchResponse
+from services.events import event_buffer, BufferFull
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Activity Events"]
+)
+
+# Timestamps are stored as naive UTC, client times with an offset are converted first
+def to_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+# Children's clients report what they view, play and complete. Events are buffered and
+# written in batches, so this never touches the database itself.
+@router.post("", response_model=ActivityEventBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def record_activity_events(
+    batch: ActivityEventBatch,
+    current_child: TokenClaims = Depends(get_child_claims)
+):
+    received_at = datetime.utcnow()
+    rows = [
+        {
+            "child_id": current_child.user_id,
+            "media_type": MediaType(event.media_type),
+            "media_id": event.media_id,
+            "event_type": ActivityEventType(event.event_type),
+            "duration_seconds": event.duration_seconds,
+            "occurred_at": min(to_utc(event.occurred_at), received_at) if event.occurred_at else received_at,
+        }
+        for event in batch.events
+    ]
+    
+    try:
+        event_buffer.add(rows)
+    except BufferFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many events right now, please retry shortly.",
+            headers={"Retry-After": "1"}
+        )
+    return ActivityEventBatchResponse(accepted=len(rows))
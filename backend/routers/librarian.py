@@ -1,13 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import distinct
-from typing import List, Optional
+from typing import List, Literal, Optional
+import json
 
 from db.database import get_db
+from db.routing import on_primary
 from models import tables
 from schemas.auth import StatusMessage
-from schemas.media import BookCreate, BookResponse, BookUpdate, VideoCreate, VideoResponse, VideoUpdate, PaginatedBookResponse, PaginatedVideoResponse
+from schemas.media import CatalogFacets, BookCreate, BookResponse, BookUpdate, VideoCreate, VideoResponse, VideoUpdate, PaginatedBookResponse, PaginatedVideoResponse, BookListItem, VideoListItem
 from auth.auth_handler import get_current_librarian_user
+from services.age_range import age_range_fields
+from services.screening import screen_media
+from services.dedup import duplicate_indexes
+from services.catalog import BOOK_FIELDS, BOOK_LIST_FIELDS, VIDEO_FIELDS, VIDEO_LIST_FIELDS, load_by_ids, parse_fields, to_sparse
+from services.cache import cache, cache_key
+from services.reviews import delete_item_reviews
+from services.quota import media_view_quota
+from services.link_check import link_reset_fields
+from services.read_model import read_model, sql_listing
+from services.facets import AGE_BANDS, RATING_LEVELS
+from services import metrics
+
+# Catalog pages are shared by every user, cached briefly and dropped on any catalog write
+CATALOG_CACHE_TTL = 30
 
 router = APIRouter(
     prefix="/librarian",
@@ -30,85 +47,236 @@ def check_link_exists(link: str, db: Session):
             detail=f"This link is already in use by the video titled: '{video_exists.title}'"
         )
 
+# used to stop near duplicates of an existing book / video (same item under a different link),
+# skipped for the few seconds after startup before the worker's index is built
+def check_near_duplicate(db: Session, model, title: str, creator: str, description: Optional[str]):
+    index = duplicate_indexes.get(model)
+    if index is None:
+        metrics.inc("dedup_checks_skipped_total", table=model.__tablename__ + "s")
+        return
+    for item_id, score in index.find(title, creator, description):
+        existing = db.query(model).filter(model.id == item_id).first()
+        if not existing:
+            # deleted since the index was built
+            index.remove(item_id)
+            continue
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"This looks like a duplicate of the {model.__tablename__} titled: '{existing.title}' (id {existing.id}, {score:.0%} similar). Resubmit with force=true to add it anyway."
+        )
+
+# Put an item that failed content screening in the admin review queue instead of the catalog
+def hold_for_screening(db: Session, media_type: tables.MediaType, media_data: dict, matched_terms: List[str]):
+    flagged = tables.FlaggedMedia(
+        media_type=media_type,
+        title=media_data["title"],
+        link=media_data["link"],
+        matched_terms=", ".join(matched_terms)[:500],
+        payload=json.dumps(media_data)
+    )
+    db.add(flagged)
+    db.commit()
+    
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=StatusMessage(
+            status="pending",
+            message="This item has been sent for review by an admin before it is added to the catalog."
+        ).model_dump()
+    )
+
+# An edit whose new title / description fails content screening is held for an admin, the item
+# stays in the catalog as it was and the changes are applied to it if they are approved
+def hold_edit_for_screening(db: Session, media_type: tables.MediaType, db_item, update_dict: dict, matched_terms: List[str]):
+    flagged = tables.FlaggedMedia(
+        media_type=media_type,
+        item_id=db_item.id,
+        title=update_dict.get("title", db_item.title),
+        link=update_dict.get("link", db_item.link),
+        matched_terms=", ".join(matched_terms)[:500],
+        payload=json.dumps(update_dict)
+    )
+    db.add(flagged)
+    db.commit()
+    
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=StatusMessage(
+            status="pending",
+            message="These changes have been sent for review by an admin, the item stays as it was until they are approved."
+        ).model_dump()
+    )
+
+# Only edits that change the title or description are screened again
+def screen_edit(db_item, update_dict: dict) -> List[str]:
+    title = update_dict.get("title", db_item.title)
+    description = update_dict.get("description", db_item.description)
+    if title == db_item.title and description == db_item.description:
+        return []
+    return screen_media(title, description)
+
 @router.get("/media-sources", response_model=List[str])
 def get_media_sources(db: Session = Depends(get_db)):
-    book_sources = db.query(distinct(tables.Book.source)).all()
-    video_sources = db.query(distinct(tables.Video.source)).all()
-    
-    # Combine sources from both tables into a set to get unique values
-    all_sources = {source[0] for source in book_sources + video_sources if source[0]}
+    def load():
+        book_sources = db.query(distinct(tables.Book.source)).all()
+        video_sources = db.query(distinct(tables.Video.source)).all()
+        
+        # Combine sources from both tables into a set to get unique values
+        all_sources = {source[0] for source in book_sources + video_sources if source[0]}
+        return sorted(list(all_sources))
     
-    return sorted(list(all_sources))
+    return cache.get_or_set("media_sources", "all", on_primary(db, load), ttl=CATALOG_CACHE_TTL, tags=["books", "videos"])
 
 
 # --- GET Routes Public ---
-@router.get("/view-all-books", response_model=PaginatedBookResponse)
+# fields= is a comma separated list of columns to return, description is left out unless requested
+@router.get("/view-all-books", response_model=PaginatedBookResponse, response_model_exclude_unset=True)
 def view_all_books(
     db: Session = Depends(get_db),
     search: Optional[str] = None,
     source: Optional[str] = None, 
+    fields: Optional[str] = None,
+    age: Optional[int] = Query(None, ge=0, description="Only items suitable for a child of this age"),
+    include_dead: bool = Query(False, description="Also list items whose link the link checker found dead"),
+    category: Optional[str] = None,
+    age_band: Optional[Literal[tuple(AGE_BANDS)]] = None,
+    min_rating: Optional[Literal[tuple(RATING_LEVELS)]] = None,
+    facets: bool = Query(False, description="Also return the item count per source, category, age band and rating"),
     page: int = 1,
     size: int = 10
 ):
-    query = db.query(tables.Book).order_by(tables.Book.id.desc())
-    if search:
-        query = query.filter(tables.Book.title.contains(search))
-    if source:
-        query = query.filter(tables.Book.source == source)
-
-    total = query.count()
-    books = query.offset((page - 1) * size).limit(size).all()
-    return PaginatedBookResponse(total=total, items=books)
+    selected = parse_fields(fields, BOOK_FIELDS, BOOK_LIST_FIELDS)
+    
+    def load():
+        # From the read model once it is built, SQL until then (no facet counts there)
+        store = read_model.get(tables.Book)
+        filters = dict(include_dead=include_dead, search=search, age=age, source=source, category=category, age_band=age_band, min_rating=min_rating)
+        if store is not None:
+            total, ids = store.listing((page - 1) * size, size, **filters)
+        else:
+            total, ids = sql_listing(db, tables.Book, (page - 1) * size, size, **filters)
+        items = [BookListItem(**to_sparse(book, selected)) for book in load_by_ids(db, tables.Book, selected, ids)]
+        response = PaginatedBookResponse(total=total, items=items)
+        if facets and store is not None:
+            response.facets = CatalogFacets(**store.facet_counts(**filters))
+        return response
+    
+    key = cache_key("page", search, source, ",".join(sorted(selected)), age, include_dead, category, age_band, min_rating, facets, page, size)
+    return cache.get_or_set("books", key, on_primary(db, load), ttl=CATALOG_CACHE_TTL)
 
-@router.get("/view-all-videos", response_model=PaginatedVideoResponse)
+@router.get("/view-all-videos", response_model=PaginatedVideoResponse, response_model_exclude_unset=True)
 def view_all_videos(
     db: Session = Depends(get_db),
     search: Optional[str] = None,
     source: Optional[str] = None, # New filter parameter
+    fields: Optional[str] = None,
+    age: Optional[int] = Query(None, ge=0, description="Only items suitable for a child of this age"),
+    include_dead: bool = Query(False, description="Also list items whose link the link checker found dead"),
+    max_minutes: Optional[int] = Query(None, ge=1, description="Only videos at most this long, videos not enriched yet are left out"),
+    category: Optional[str] = None,
+    age_band: Optional[Literal[tuple(AGE_BANDS)]] = None,
+    min_rating: Optional[Literal[tuple(RATING_LEVELS)]] = None,
+    facets: bool = Query(False, description="Also return the item count per source, category, age band and rating"),
     page: int = 1,
     size: int = 10
 ):
-    query = db.query(tables.Video).order_by(tables.Video.id.desc())
-    if search:
-        query = query.filter(tables.Video.title.contains(search))
-    if source:
-        query = query.filter(tables.Video.source == source)
+    selected = parse_fields(fields, VIDEO_FIELDS, VIDEO_LIST_FIELDS)
+    
+    def load():
+        # From the read model once it is built, SQL until then (no facet counts there)
+        store = read_model.get(tables.Video)
+        filters = dict(
+            include_dead=include_dead, search=search, age=age, max_duration=max_minutes * 60 if max_minutes is not None else None,
+            source=source, category=category, age_band=age_band, min_rating=min_rating
+        )
+        if store is not None:
+            total, ids = store.listing((page - 1) * size, size, **filters)
+        else:
+            total, ids = sql_listing(db, tables.Video, (page - 1) * size, size, **filters)
+        items = [VideoListItem(**to_sparse(video, selected)) for video in load_by_ids(db, tables.Video, selected, ids)]
+        response = PaginatedVideoResponse(total=total, items=items)
+        if facets and store is not None:
+            response.facets = CatalogFacets(**store.facet_counts(**filters))
+        return response
+    
+    key = cache_key("page", search, source, ",".join(sorted(selected)), age, include_dead, max_minutes, category, age_band, min_rating, facets, page, size)
+    return cache.get_or_set("videos", key, on_primary(db, load), ttl=CATALOG_CACHE_TTL)
 
-    total = query.count()
-    videos = query.offset((page - 1) * size).limit(size).all()
-    return PaginatedVideoResponse(total=total, items=videos)
+# Full record for a single item, used by the view / edit modals, signed in users only.
+# Opening one counts against the daily media quota of parents and children on the FREE plan
+@router.get("/books/{book_id}", response_model=BookResponse)
+def get_book(book_id: int, db: Session = Depends(get_db), _quota: None = Depends(media_view_quota)):
+    def load():
+        db_book = db.query(tables.Book).filter(tables.Book.id == book_id).first()
+        if not db_book:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+        return BookResponse.model_validate(db_book)
+    
+    return cache.get_or_set("books", cache_key("item", book_id), on_primary(db, load), ttl=CATALOG_CACHE_TTL)
+
+@router.get("/videos/{video_id}", response_model=VideoResponse)
+def get_video(video_id: int, db: Session = Depends(get_db), _quota: None = Depends(media_view_quota)):
+    def load():
+        db_video = db.query(tables.Video).filter(tables.Video.id == video_id).first()
+        if not db_video:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Video not found")
+        return VideoResponse.model_validate(db_video)
+    
+    return cache.get_or_set("videos", cache_key("item", video_id), on_primary(db, load), ttl=CATALOG_CACHE_TTL)
 
 # --- POST (Create) Routes - Librarian Only ---
-@router.post("/add-book", response_model=BookResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/add-book", response_model=BookResponse, status_code=status.HTTP_201_CREATED, responses={202: {"model": StatusMessage}, 409: {"description": "Looks like a duplicate, force=true adds it anyway"}})
 def add_book(
     book: BookCreate, 
+    force: bool = False,
     db: Session = Depends(get_db), 
     current_librarian: tables.User = Depends(get_current_librarian_user)
 ):
     check_link_exists(book.link, db)
+    if not force:
+        check_near_duplicate(db, tables.Book, book.title, book.author, book.description)
+
+    book_data = book.model_dump()
+    book_data.update(age_range_fields(book_data["age_group"]))
 
-    new_book = tables.Book(**book.model_dump(), source=current_librarian.username)
+    matched_terms = screen_media(book_data["title"], book_data["description"])
+    if matched_terms:
+        return hold_for_screening(db, tables.MediaType.BOOK, {**book_data, "source": current_librarian.username}, matched_terms)
+
+    new_book = tables.Book(**book_data, source=current_librarian.username)
     db.add(new_book)
     db.commit()
     db.refresh(new_book)
+    cache.invalidate("books", f"books:{new_book.id}")
     return new_book
 
-@router.post("/add-video", response_model=VideoResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/add-video", response_model=VideoResponse, status_code=status.HTTP_201_CREATED, responses={202: {"model": StatusMessage}, 409: {"description": "Looks like a duplicate, force=true adds it anyway"}})
 def add_video(
     video: VideoCreate, 
+    force: bool = False,
     db: Session = Depends(get_db), 
     current_librarian: tables.User = Depends(get_current_librarian_user)
 ):
     check_link_exists(video.link, db)
+    if not force:
+        check_near_duplicate(db, tables.Video, video.title, video.creator, video.description)
+
+    video_data = video.model_dump()
+    video_data.update(age_range_fields(video_data["age_group"]))
 
-    new_video = tables.Video(**video.model_dump(), source=current_librarian.username)
+    matched_terms = screen_media(video_data["title"], video_data["description"])
+    if matched_terms:
+        return hold_for_screening(db, tables.MediaType.VIDEO, {**video_data, "source": current_librarian.username}, matched_terms)
+
+    new_video = tables.Video(**video_data, source=current_librarian.username)
     db.add(new_video)
     db.commit()
     db.refresh(new_video)
+    cache.invalidate("videos", f"videos:{new_video.id}")
     return new_video
 
 # --- PATCH (Update) Routes - Librarian Only ---
-@router.patch("/edit-book/{book_id}", response_model=BookResponse)
+@router.patch("/edit-book/{book_id}", response_model=BookResponse, responses={202: {"model": StatusMessage}})
 def edit_book(
     book_id: int, 
     update_data: BookUpdate, 
@@ -122,13 +290,23 @@ def edit_book(
     
     # Get the update data, excluding fields that were not sent
     update_dict = update_data.model_dump(exclude_unset=True)
+    if "age_group" in update_dict:
+        update_dict.update(age_range_fields(update_dict["age_group"]))
+    
+    matched_terms = screen_edit(db_book, update_dict)
+    if matched_terms:
+        return hold_edit_for_screening(db, tables.MediaType.BOOK, db_book, update_dict, matched_terms)
+    
+    if update_dict.get("link", db_book.link) != db_book.link:
+        update_dict.update(link_reset_fields())
     book_query.update(update_dict)
     
     db.commit()
     db.refresh(db_book)
+    cache.invalidate("books", f"books:{book_id}")
     return db_book
 
-@router.patch("/edit-video/{video_id}", response_model=VideoResponse)
+@router.patch("/edit-video/{video_id}", response_model=VideoResponse, responses={202: {"model": StatusMessage}})
 def edit_video(
     video_id: int, 
     update_data: VideoUpdate, 
@@ -141,10 +319,20 @@ def edit_video(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Video not found")
     
     update_dict = update_data.model_dump(exclude_unset=True)
+    if "age_group" in update_dict:
+        update_dict.update(age_range_fields(update_dict["age_group"]))
+    
+    matched_terms = screen_edit(db_video, update_dict)
+    if matched_terms:
+        return hold_edit_for_screening(db, tables.MediaType.VIDEO, db_video, update_dict, matched_terms)
+    
+    if update_dict.get("link", db_video.link) != db_video.link:
+        update_dict.update(link_reset_fields())
     video_query.update(update_dict)
     
     db.commit()
     db.refresh(db_video)
+    cache.invalidate("videos", f"videos:{video_id}")
     return db_video
 
 # --- DELETE (Delete) Routes - Librarian Only ---
@@ -158,8 +346,10 @@ def delete_book(
     if not db_book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
     
+    delete_item_reviews(db, tables.ReviewType.BOOK, [book_id])
     db.delete(db_book)
     db.commit()
+    cache.invalidate("books", f"books:{book_id}")
     return StatusMessage(status="success", message="Book deleted successfully.")
 
 @router.delete("/delete-video/{video_id}", response_model=StatusMessage)
@@ -172,6 +362,8 @@ def delete_video(
     if not db_video:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Video not found")
         
+    delete_item_reviews(db, tables.ReviewType.VIDEO, [video_id])
     db.delete(db_video)
     db.commit()
+    cache.invalidate("videos", f"videos:{video_id}")
     return StatusMessage(status="success", message="Video deleted successfully.")
\ No newline at end of file
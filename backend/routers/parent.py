@@ -1,26 +1,41 @@
-from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import distinct, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from auth.auth_handler import get_current_active_user, get_password_hash, get_user, verify_password
+from auth.auth_handler import get_current_active_user, get_password_hash, get_password_hashes, get_user, verify_password
 from db.database import get_db
-from schemas.parent import ChildRegistrationRequest, ChildRegistrationResponse, ParentViewChildAccountsResponse, ChildProfileUpdate
+from db.routing import on_primary
+from auth.revocation import revoke_user_tokens
+from auth.sessions import revoke_all_sessions
+from schemas.parent import ChildRegistrationRequest, ChildRegistrationResponse, ParentViewChildAccountsResponse, ChildProfileUpdate, ParentInsightsResponse, BulkChildRegistrationRequest, BulkChildRegistrationResponse, BulkChildResult, QuotaUsageResponse, ChildRecommendationsResponse
 from schemas.users import ChangePassword
 from schemas.interest import InterestResponse
 from schemas.auth import StatusMessage
 from models import tables
-from typing import List
+from services.rollups import summarize_activity
+from services.cache import cache
+from services.catalog import BOOK_LIST_FIELDS, VIDEO_LIST_FIELDS, load_by_ids, to_sparse
+from services.read_model import candidate_ids
+from services.reference_data import reference_data
+from services.reviews import delete_user_reviews
+from services.quota import TIER_QUOTAS, child_limit_exception, children_count, media_views_today, release_child_slots, reserve_child_slots, tier_of
+from typing import List, Literal
 
 router = APIRouter(
     prefix="/parent",
     tags=["Parent Actions"]
 )
 
-# Get all interests in database for dropdown list
-@router.get("/interests", response_model=List[InterestResponse])
-def get_all_interests(db: Session = Depends(get_db)):
-    interests = db.query(tables.Interest).all()
-    return interests
+# Get all interests for dropdown list, served from the reference data loaded at startup
+@router.get("/interests", response_model=List[InterestResponse], responses={304: {"description": "Not modified"}})
+def get_all_interests(request: Request, response: Response):
+    headers = {"Cache-Control": "public, max-age=3600", "ETag": reference_data.interests_etag}
+    if request.headers.get("if-none-match") == reference_data.interests_etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return reference_data.interests
 
 # Create child account
 @router.post("/create-child", status_code=status.HTTP_201_CREATED, response_model=ChildRegistrationResponse)
@@ -33,10 +48,12 @@ async def create_child_account(
     if get_user(db, child_data.username):
         raise HTTPException(status_code=400, detail="Username already registered.")
     
-    interests_from_db = db.query(tables.Interest).filter(tables.Interest.name.in_(child_data.interests)).all()
-    
     hashed_password = get_password_hash(child_data.password)
     
+    # Taken from the quota counter, handed back if this request doesn't commit
+    if not reserve_child_slots(db, current_parent_user, 1):
+        raise child_limit_exception(current_parent_user)
+    
     new_child = tables.User(
         username=child_data.username,
         email=None,
@@ -47,27 +64,202 @@ async def create_child_account(
         gender=child_data.gender,
         birthday=child_data.birthday,
         race=child_data.race,
-        role_id=3, # Child role PK
+        role_id=reference_data.role_id("CHILD"),
         primary_parent_id=current_parent_user.id, # link parent to child via parents id
         is_verified=1
     )
-    new_child.interests = interests_from_db
-    
     db.add(new_child)
+    db.flush()
+    
+    # Link interests by id, the names were resolved from the reference data
+    db.add_all([
+        tables.ChildInterest(child_id=new_child.id, interest_id=interest_id)
+        for interest_id in reference_data.interest_ids(child_data.interests)
+    ])
     db.commit()
     db.refresh(new_child)
+    cache.invalidate(f"children:{current_parent_user.id}")
     return new_child
 
+# Create many child accounts in one request (classrooms, large families), every row succeeds or fails on its own
+@router.post("/create-children", response_model=BulkChildRegistrationResponse)
+def create_child_accounts(
+    batch: BulkChildRegistrationRequest,
+    db: Session = Depends(get_db),
+    current_parent_user: tables.User = Depends(get_current_active_user)
+):
+    rows = batch.children
+    errors = {}
+    interest_ids = {}
+    seen = set()
+    for index, child in enumerate(rows):
+        if child.password != child.confirm_password:
+            errors[index] = "Passwords do not match."
+        elif child.username in seen:
+            errors[index] = "Username appears more than once in this request."
+        else:
+            interest_ids[index] = reference_data.interest_ids(child.interests)
+            if len(interest_ids[index]) != len(set(child.interests)):
+                errors[index] = "One or more selected interests are invalid."
+        seen.add(child.username)
+    
+    # One IN query for all usernames instead of a lookup per child
+    taken = {username for (username,) in db.query(tables.User.username).filter(tables.User.username.in_(seen))}
+    for index, child in enumerate(rows):
+        if index not in errors and child.username in taken:
+            errors[index] = "Username already registered."
+    valid = [index for index in range(len(rows)) if index not in errors]
+    
+    # Reserve the slots first so only the children that fit under the tier are hashed, in parallel
+    slots = reserve_child_slots(db, current_parent_user, len(valid))
+    accepted = valid[:slots]
+    for index in valid[slots:]:
+        errors[index] = child_limit_exception(current_parent_user).detail
+    hashes = dict(zip(accepted, get_password_hashes([rows[index].password for index in accepted])))
+    
+    ids = {}
+    if accepted:
+        try:
+            # Multi-row INSERTs for the users and their interest links
+            db.execute(insert(tables.User), [
+                {
+                    "username": rows[index].username,
+                    "email": None,
+                    "hashed_password": hashes[index],
+                    "first_name": rows[index].first_name,
+                    "last_name": rows[index].last_name,
+                    "country": rows[index].country,
+                    "gender": rows[index].gender,
+                    "birthday": rows[index].birthday,
+                    "race": rows[index].race,
+                    "role_id": reference_data.role_id("CHILD"),
+                    "primary_parent_id": current_parent_user.id,
+                    "is_verified": True,
+                }
+                for index in accepted
+            ])
+            ids = dict(db.query(tables.User.username, tables.User.id).filter(
+                tables.User.username.in_([rows[index].username for index in accepted])
+            ).all())
+            links = [
+                {"child_id": ids[rows[index].username], "interest_id": interest_id}
+                for index in accepted
+                for interest_id in interest_ids[index]
+            ]
+            if links:
+                db.execute(insert(tables.ChildInterest), links)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A username in this request was registered at the same time, please try again."
+            )
+        cache.invalidate(f"children:{current_parent_user.id}")
+    
+    results = [
+        BulkChildResult(index=index, username=child.username, status="error", detail=errors[index]) if index in errors
+        else BulkChildResult(index=index, username=child.username, status="created", id=ids[child.username])
+        for index, child in enumerate(rows)
+    ]
+    return BulkChildRegistrationResponse(created=len(accepted), failed=len(rows) - len(accepted), results=results)
+
 # View all children accounts
 @router.get("/my-children", response_model=List[ParentViewChildAccountsResponse])
 def get_children_for_current_parent(
     db: Session = Depends(get_db),
     current_parent: tables.User = Depends(get_current_active_user)
 ):
-    managed_parent = db.merge(current_parent)
-    children_list = db.query(tables.User).filter(managed_parent.id == tables.User.primary_parent_id).all()
+    def load():
+        children_list = db.query(tables.User).filter(current_parent.id == tables.User.primary_parent_id).all()
+        return [ParentViewChildAccountsResponse.model_validate(child) for child in children_list]
     
-    return children_list
+    return cache.get_or_set("children", str(current_parent.id), on_primary(db, load), tags=[f"children:{current_parent.id}"])
+
+# Daily / weekly activity summary for all of the parent's children, read from the rollups only
+@router.get("/insights", response_model=ParentInsightsResponse)
+def get_children_insights(
+    days: int = Query(7, ge=1, le=90),
+    granularity: Literal["day", "week"] = "day",
+    db: Session = Depends(get_db),
+    current_parent: tables.User = Depends(get_current_active_user)
+):
+    # Rollup days are UTC dates (services/rollups.py)
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    
+    children = db.query(tables.User.id, tables.User.username, tables.User.first_name).filter(
+        tables.User.primary_parent_id == current_parent.id
+    ).order_by(tables.User.id).all()
+    
+    rollups = []
+    if children:
+        rollups = db.query(tables.ChildActivityDaily).filter(
+            tables.ChildActivityDaily.child_id.in_([child.id for child in children]),
+            tables.ChildActivityDaily.day >= start
+        ).all()
+    summary = summarize_activity(rollups, granularity)
+    
+    return ParentInsightsResponse(
+        granularity=granularity,
+        start=start,
+        end=end,
+        children=[
+            {
+                "child_id": child.id,
+                "username": child.username,
+                "first_name": child.first_name,
+                **summary.get(child.id, {"totals": {}, "periods": []})
+            }
+            for child in children
+        ]
+    )
+
+# What the parent's plan allows and how much of it is used, read from the quota counters
+@router.get("/quota", response_model=QuotaUsageResponse)
+def get_quota_usage(
+    db: Session = Depends(get_db),
+    current_parent: tables.User = Depends(get_current_active_user)
+):
+    tier = tier_of(current_parent)
+    return QuotaUsageResponse(
+        tier=tier.value,
+        children=children_count(db, current_parent.id),
+        children_limit=TIER_QUOTAS[tier]["children"],
+        media_views_today=media_views_today(current_parent.id),
+        media_views_limit=TIER_QUOTAS[tier]["media_views"]
+    )
+
+# Best rated books and videos for the child's age that the child hasn't opened yet
+@router.get("/children/{child_id}/recommendations", response_model=ChildRecommendationsResponse, response_model_exclude_unset=True)
+def get_child_recommendations(
+    child_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_parent: tables.User = Depends(get_current_active_user)
+):
+    child = db.query(tables.User).filter(tables.User.id == child_id).first()
+    if not child or child.primary_parent_id != current_parent.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Child not found")
+    
+    age = None
+    if child.birthday:
+        today = date.today()
+        age = today.year - child.birthday.year - ((today.month, today.day) < (child.birthday.month, child.birthday.day))
+    
+    recommendations = {}
+    for key, media_type, model, fields in (
+        ("books", tables.MediaType.BOOK, tables.Book, BOOK_LIST_FIELDS),
+        ("videos", tables.MediaType.VIDEO, tables.Video, VIDEO_LIST_FIELDS),
+    ):
+        opened = db.query(distinct(tables.ActivityEvent.media_id)).filter(
+            tables.ActivityEvent.child_id == child.id,
+            tables.ActivityEvent.media_type == media_type
+        )
+        ids = candidate_ids(db, model, limit, age=age, exclude_ids=[media_id for (media_id,) in opened])
+        recommendations[key] = [to_sparse(item, fields) for item in load_by_ids(db, model, fields, ids)]
+    
+    return ChildRecommendationsResponse(child_id=child.id, age=age, **recommendations)
 
 # Update child account  
 @router.patch("/update-child/{child_id}", response_model=ParentViewChildAccountsResponse)
@@ -97,20 +289,19 @@ def update_child_profile(
         # Get the list of names and REMOVE it from the dictionary
         interest_names = update_dict.pop("interests")
         
-        # Query the database to get the actual Interest objects
-        interests_from_db = db.query(tables.Interest).filter(
-            tables.Interest.name.in_(interest_names)
-        ).all()
+        # Resolve the names from the reference data instead of querying Interest
+        interest_ids = reference_data.interest_ids(interest_names)
         
         # Validate that all interests were found
-        if len(interests_from_db) != len(set(interest_names)):
+        if len(interest_ids) != len(set(interest_names)):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="One or more selected interests are invalid."
             )
         
-        # Assign the list of interests to the relationship
-        child_to_update.interests = interests_from_db
+        # Replace the child's interest rows
+        db.query(tables.ChildInterest).filter(tables.ChildInterest.child_id == child_to_update.id).delete(synchronize_session=False)
+        db.add_all([tables.ChildInterest(child_id=child_to_update.id, interest_id=interest_id) for interest_id in interest_ids])
 
     # Loop through the rest off the fields and update them
     for key, value in update_dict.items():
@@ -119,6 +310,7 @@ def update_child_profile(
     # Commit all changes to the database
     db.commit()
     db.refresh(child_to_update)
+    cache.invalidate(f"children:{current_parent.id}")
     return child_to_update
 
 
@@ -138,8 +330,12 @@ def delete_child_account(child_id: int, db: Session = Depends(get_db), current_p
             detail="You are not authorized to delete this child account."
     )
         
+    delete_user_reviews(db, [child_to_delete.id])
+    revoke_user_tokens(db, child_to_delete.id, "USER_DELETED")
+    release_child_slots(db, current_parent.id)
     db.delete(child_to_delete)
     db.commit()
+    cache.invalidate(f"children:{current_parent.id}")
     
     status_message = StatusMessage(
         status="success",
@@ -171,6 +367,8 @@ def edit_child_password(child_id: int, child_data: ChangePassword, db: Session =
         )
         
     child_to_edit.hashed_password = get_password_hash(child_data.new_password)
+    revoke_user_tokens(db, child_to_edit.id, "PASSWORD_CHANGED")
+    revoke_all_sessions(db, child_to_edit.id)
     db.add(child_to_edit)
     db.commit()
     db.refresh(child_to_edit)
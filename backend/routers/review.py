@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 
 from db.database import get_db
 from models.tables import User, Review, ReviewType
-from schemas.review import ReviewCreate, ReviewResponse
+from schemas.review import ReviewCreate, ReviewResponse, ItemReviewResponse, ItemReviewPage, ReviewSummaryResponse
+from services.reviews import REVIEWABLE, upsert_review, delete_review as delete_review_and_stats, review_page, review_summary
 from schemas.auth import StatusMessage
 from auth.auth_handler import get_current_active_user
 
@@ -20,15 +21,8 @@ def create_app_review(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    new_review = Review(
-        user_id=current_user.id,
-        review=review_data.review,
-        stars=review_data.stars,
-        review_type=ReviewType.APP,
-        reviewable_id=0 # Using a placeholder ID like 0 for general app reviews
-    )
-    db.add(new_review)
-    db.commit()
+    # Using a placeholder ID like 0 for general app reviews, a second review replaces the first
+    upsert_review(db, current_user.id, ReviewType.APP, 0, review_data.review, review_data.stars)
     return StatusMessage(status="success", message="Your review has been submitted successfully.")
 
 # Endpoint to get all reviews for the currently logged-in user
@@ -56,7 +50,67 @@ def delete_review(
     if review_to_delete.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized to delete this review.")
         
-    db.delete(review_to_delete)
+    delete_review_and_stats(db, review_to_delete)
     db.commit()
     
-    return StatusMessage(status="success", message="Review deleted successfully.")
\ No newline at end of file
+    return StatusMessage(status="success", message="Review deleted successfully.")
+
+
+# --- Book / video reviews ---
+def get_reviewable(media: str, item_id: int, db: Session):
+    review_type, model = REVIEWABLE[media]
+    if db.query(model.id).filter(model.id == item_id).first() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{model.__name__} not found")
+    return review_type
+
+# Create or replace the current user's review of a book or video (one per user per item)
+@router.put("/{media}/{item_id}", response_model=ItemReviewResponse, responses={201: {"model": ItemReviewResponse}})
+def upsert_item_review(
+    media: Literal["books", "videos"],
+    item_id: int,
+    review_data: ReviewCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    review_type = get_reviewable(media, item_id, db)
+    review, created = upsert_review(db, current_user.id, review_type, item_id, review_data.review, review_data.stars)
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return ItemReviewResponse(
+        id=review.id,
+        username=current_user.username,
+        review=review.review,
+        stars=review.stars,
+        created_at=review.created_at
+    )
+
+# Newest first, page with the next_cursor of the previous response
+@router.get("/{media}/{item_id}", response_model=ItemReviewPage)
+def list_item_reviews(
+    media: Literal["books", "videos"],
+    item_id: int,
+    cursor: Optional[str] = None,
+    size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    review_type, _ = REVIEWABLE[media]
+    rows, next_cursor = review_page(db, review_type, item_id, cursor, size)
+    return ItemReviewPage(
+        items=[
+            ItemReviewResponse(id=review.id, username=username, review=review.review, stars=review.stars, created_at=review.created_at)
+            for review, username in rows
+        ],
+        next_cursor=next_cursor
+    )
+
+# Review count, average and 1-5 star histogram, read from review_stats
+@router.get("/{media}/{item_id}/summary", response_model=ReviewSummaryResponse)
+def get_item_review_summary(
+    media: Literal["books", "videos"],
+    item_id: int,
+    db: Session = Depends(get_db)
+):
+    review_type, _ = REVIEWABLE[media]
+    return review_summary(db, review_type, item_id)
+
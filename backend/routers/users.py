@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from typing import List
 
 from sqlalchemy.orm import Session
 
-from auth.auth_handler import get_current_active_user, get_db, verify_password, get_password_hash
+from auth.auth_handler import get_current_active_user, get_db, verify_password, get_password_hash, issue_access_token
+from auth.revocation import revoke_user_tokens
+from auth.sessions import create_session, revoke_all_sessions
 from schemas.auth import StatusMessage
-from schemas.users import ParentRegistrationResponse, ChangePassword
+from schemas.users import ParentRegistrationResponse, ChangePassword, PasswordChangedResponse
 from schemas.landing_page import LandingPageResponse
 from schemas.parent import ParentProfileUpdate
-from models.tables import User, LandingPage
+from models.tables import User
+from services.landing_page import landing_page_content
 
 router = APIRouter(
     tags=["Users"]
@@ -44,10 +47,11 @@ async def update_users_me(
     
     return current_user
 
-@router.patch("/users/change-password/{user_id}", response_model=StatusMessage)
+@router.patch("/users/change-password/{user_id}", response_model=PasswordChangedResponse)
 def change_password(
     user_id: int, 
     password_data: ChangePassword, 
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -75,15 +79,21 @@ def change_password(
     
     user_change_pw.hashed_password = new_hashed_password
     
+    # Log out every other session, the caller gets fresh tokens back
+    revoke_user_tokens(db, user_change_pw.id, "PASSWORD_CHANGED")
+    revoke_all_sessions(db, user_change_pw.id)
+    refresh_token = create_session(db, user_change_pw.id, request.headers.get("user-agent"))
+    
     db.add(user_change_pw)
     db.commit()
     db.refresh(user_change_pw)
     
-    status_message = StatusMessage(
+    return PasswordChangedResponse(
         status="success",
-        message="Password updated successfully"
+        message="Password updated successfully",
+        access_token=issue_access_token(user_change_pw),
+        refresh_token=refresh_token
     )
-    return status_message
 
 @router.get("/landing-page-content", response_model=List[LandingPageResponse])
 def get_public_landing_page_content(
@@ -95,7 +105,6 @@ def get_public_landing_page_content(
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
 
-    content = db.query(LandingPage).all()
-    return content
+    return landing_page_content(db)
 
     
\ No newline at end of file
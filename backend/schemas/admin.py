@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import date
+from datetime import date, datetime
 from typing import Optional, List
 
 class RoleResponse(BaseModel):
@@ -28,4 +28,22 @@ class ViewAllUserResponse(BaseModel):
     total_parents: int
     total_kids: int
     
-    
\ No newline at end of file
+    
+
+class JobRunResponse(BaseModel):
+    id: int
+    job_name: str
+    status: str
+    started_at: datetime
+    finished_at: datetime
+    duration_ms: int
+    error: Optional[str] = None
+    worker: str
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class JobResponse(BaseModel):
+    name: str
+    schedule: str
+    next_run: datetime # as seen by the worker answering
+    last_run: Optional[JobRunResponse] = None
@@ -1,14 +1,35 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
+from datetime import datetime
 
 class Token(BaseModel):
     access_token: str
     token_type: str
     user_role: Optional[str] = None
+    refresh_token: Optional[str] = None
+    
+class RefreshRequest(BaseModel):
+    refresh_token: str
+    
+class SessionResponse(BaseModel):
+    id: int
+    device: Optional[str] = None
+    created_at: Optional[datetime] = None
+    last_used_at: Optional[datetime] = None
+    expires_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
     
 class TokenData(BaseModel):
     username: str | None = None
     
+# Signed claims from an access token, used by read-only endpoints instead of loading the user
+class TokenClaims(BaseModel):
+    username: str
+    role: str
+    user_id: int
+    issued_at: float
+    
 class StatusMessage(BaseModel):
     status: str
     message: str
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+
+class ActivityEventCreate(BaseModel):
+    media_type: Literal["BOOK", "VIDEO"]
+    media_id: int
+    event_type: Literal["VIEW", "PLAY", "COMPLETE"]
+    duration_seconds: Optional[int] = Field(None, ge=0, le=86400)
+    occurred_at: Optional[datetime] = None # defaults to the time the server received it
+
+class ActivityEventBatch(BaseModel):
+    events: List[ActivityEventCreate] = Field(..., min_length=1, max_length=500)
+
+class ActivityEventBatchResponse(BaseModel):
+    accepted: int
@@ -1,6 +1,7 @@
 # In schemas/media.py
 from pydantic import BaseModel, ConfigDict
-from typing import Optional, List
+from datetime import datetime
+from typing import Dict, Optional, List
 
 # --- Book Schemas ---
 class BookBase(BaseModel):
@@ -27,11 +28,39 @@ class BookResponse(BookBase):
     id: int
     rating: float
     source: str 
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    link_status: Optional[str] = None
+    link_checked_at: Optional[datetime] = None
     model_config = ConfigDict(from_attributes=True)
     
+# Sparse list item, only the fields selected with fields= are set
+class BookListItem(BaseModel):
+    id: int
+    title: Optional[str] = None
+    author: Optional[str] = None
+    link: Optional[str] = None
+    age_group: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    rating: Optional[float] = None
+    source: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    link_status: Optional[str] = None
+    link_checked_at: Optional[datetime] = None
+    
+# Items per facet value under the current filters, see services/facets.py
+class CatalogFacets(BaseModel):
+    source: Dict[str, int]
+    category: Dict[str, int]
+    age_band: Dict[str, int]
+    rating: Dict[str, int]
+
 class PaginatedBookResponse(BaseModel):
     total: int
-    items: List[BookResponse]
+    items: List[BookListItem]
+    facets: Optional[CatalogFacets] = None
 
 # --- Video Schemas ---
 class VideoBase(BaseModel):
@@ -58,8 +87,39 @@ class VideoResponse(VideoBase):
     id: int
     rating: float
     source: str
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    link_status: Optional[str] = None
+    link_checked_at: Optional[datetime] = None
+    duration_seconds: Optional[int] = None
+    view_count: Optional[int] = None
+    like_count: Optional[int] = None
+    thumbnail_url: Optional[str] = None
+    published_at: Optional[datetime] = None
     model_config = ConfigDict(from_attributes=True)
     
+# Sparse list item, only the fields selected with fields= are set
+class VideoListItem(BaseModel):
+    id: int
+    title: Optional[str] = None
+    creator: Optional[str] = None
+    link: Optional[str] = None
+    age_group: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    rating: Optional[float] = None
+    source: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    link_status: Optional[str] = None
+    link_checked_at: Optional[datetime] = None
+    duration_seconds: Optional[int] = None
+    view_count: Optional[int] = None
+    like_count: Optional[int] = None
+    thumbnail_url: Optional[str] = None
+    published_at: Optional[datetime] = None
+    
 class PaginatedVideoResponse(BaseModel):
     total: int
-    items: List[VideoResponse]
\ No newline at end of file
+    items: List[VideoListItem]
+    facets: Optional[CatalogFacets] = None
\ No newline at end of file
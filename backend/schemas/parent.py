@@ -1,7 +1,8 @@
-from pydantic import BaseModel, field_validator, ConfigDict
+from pydantic import BaseModel, field_validator, ConfigDict, Field
 from datetime import date
-from typing import Optional, List
+from typing import Optional, List, Literal
 from schemas.interest import InterestResponse
+from schemas.media import BookListItem, VideoListItem
 
 class ChildRegistrationRequest(BaseModel):
     username: str
@@ -77,4 +78,61 @@ class ParentViewChildAccountsResponse(BaseModel):
     birthday: Optional[date] = None
     race: Optional[str] = None
     interests: List[InterestResponse] = []
-    
\ No newline at end of file
+    
+class ActivityTotals(BaseModel):
+    events: int = 0
+    books_opened: int = 0
+    videos_played: int = 0
+    completed: int = 0
+    minutes_reading: float = 0
+    minutes_watching: float = 0
+
+class CategoryActivity(BaseModel):
+    category: str
+    minutes: float
+
+class ActivityPeriod(BaseModel):
+    start: date
+    totals: ActivityTotals
+    categories: List[CategoryActivity] = []
+
+class ChildInsights(BaseModel):
+    child_id: int
+    username: str
+    first_name: str
+    totals: ActivityTotals
+    periods: List[ActivityPeriod] = []
+
+class ParentInsightsResponse(BaseModel):
+    granularity: Literal["day", "week"]
+    start: date
+    end: date
+    children: List[ChildInsights] = []
+
+class BulkChildRegistrationRequest(BaseModel):
+    children: List[ChildRegistrationRequest] = Field(..., min_length=1, max_length=100)
+
+class BulkChildResult(BaseModel):
+    index: int # position in the request
+    username: str
+    status: Literal["created", "error"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkChildRegistrationResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkChildResult]
+
+class QuotaUsageResponse(BaseModel):
+    tier: str
+    children: int
+    children_limit: int
+    media_views_today: int
+    media_views_limit: Optional[int] = None # None for unlimited
+
+class ChildRecommendationsResponse(BaseModel):
+    child_id: int
+    age: Optional[int] = None
+    books: List[BookListItem]
+    videos: List[VideoListItem]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # Schema for creating a new review
@@ -15,4 +15,21 @@ class ReviewResponse(BaseModel):
     review_type: str
     created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Review of a book or video, with who wrote it
+class ItemReviewResponse(BaseModel):
+    id: int
+    username: str
+    review: str
+    stars: int
+    created_at: datetime
+
+class ItemReviewPage(BaseModel):
+    items: List[ItemReviewResponse]
+    next_cursor: Optional[str] = None # pass back as ?cursor= for the next page, None on the last page
+
+class ReviewSummaryResponse(BaseModel):
+    review_count: int
+    average_stars: Optional[float] = None
+    histogram: Dict[int, int] # stars (1-5) -> number of reviews
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, List
+from datetime import datetime
+
+class FlaggedMediaResponse(BaseModel):
+    id: int
+    media_type: str
+    item_id: Optional[int] = None
+    title: str
+    link: str
+    matched_terms: str
+    status: str
+    created_at: Optional[datetime] = None
+    reviewed_by: Optional[str] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+    
+class PaginatedFlaggedMediaResponse(BaseModel):
+    total: int
+    items: List[FlaggedMediaResponse]
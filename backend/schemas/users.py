@@ -29,4 +29,11 @@ class UserInDB(ParentRegistrationResponse):
     
 class ChangePassword(BaseModel):
     current_password: str
-    new_password: str
\ No newline at end of file
+    new_password: str
+    
+class PasswordChangedResponse(BaseModel):
+    status: str
+    message: str
+    # Old tokens and sessions are revoked on a password change, these replace the caller's
+    access_token: str
+    refresh_token: str
@@ -0,0 +1,147 @@
+import re
+from typing import Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+# "and up" ranges are stored with this max_age so every range has both ends set.
+# That keeps the age filter a plain min_age <= age AND max_age >= age range scan.
+AGE_OPEN_MAX = 99
+
+_RANGE = re.compile(r"(?<!\d)(\d{1,2})\s*(?:-|–|to)\s*(\d{1,2})(?!\d)")
+_AND_UP = re.compile(r"(?<!\d)(\d{1,2})\s*(?:\+|(?:years?\s*)?(?:and|&)\s*(?:up|older|over))")
+_SINGLE = re.compile(r"(?<!\d)(\d{1,2})(?!\d)")
+_MONTHS_RANGE = re.compile(r"(?<!\d)(\d{1,3})\s*(?:-|–|to)\s*(\d{1,3})[\s-]*(?:months?|mos?)\b")
+_MONTHS = re.compile(r"(?<!\d)(\d{1,3})[\s-]*(?:months?|mos?)\b")
+# US school grades, kindergarten counting as grade 0: "Grade 3", "grades 3-5", "3rd grade", "K-2"
+_GRADES = re.compile(r"\b(?:grades?|gr\.)\s*(k|\d{1,2})(?:\s*(?:-|–|to)\s*(\d{1,2}))?")
+_GRADE_ORDINAL = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\s*grade")
+_KINDERGARTEN = re.compile(r"\b(?:kindergarten|k)\s*(?:-|–|to)\s*(\d{1,2})\b|\bkindergarten\b")
+# A child in grade g is about g + 5 to g + 6 years old
+GRADE_AGE_OFFSET = 5
+_WORDS = [
+    ("young adult", (12, 18)),
+    ("teen", (13, 17)),
+    ("preschool", (3, 5)),
+    ("toddler", (1, 3)),
+    ("baby", (0, 2)),
+]
+
+
+def _months_to_years(value: str) -> str:
+    # Ages given in months become whole years (under 12 months is 0), so the rules only see years:
+    # "0-24 months" -> "0-2", "12 months - 3 years" -> "1 - 3 years", "18 months and up" -> "1 and up"
+    value = _MONTHS_RANGE.sub(lambda match: f"{int(match.group(1)) // 12}-{int(match.group(2)) // 12}", value)
+    return _MONTHS.sub(lambda match: str(int(match.group(1)) // 12), value)
+
+
+def _cut_grades(value: str) -> Tuple[str, Optional[Tuple[int, int]]]:
+    # Grade phrases taken out of value so their numbers aren't read as ages, and the grades they name
+    grades = []
+
+    def cut(match):
+        if match.group(0).startswith(("k", "kindergarten")):
+            grades.append(0)
+        grades.extend(0 if grade == "k" else int(grade) for grade in match.groups() if grade)
+        return " "
+
+    for pattern in (_GRADES, _GRADE_ORDINAL, _KINDERGARTEN):
+        value = pattern.sub(cut, value)
+    return value, (min(grades), max(grades)) if grades else None
+
+
+def parse_age_range(age_group: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Turn free text like "Ages: 8 - 12 years", "5-12", "12 years and up", "3+", "0-24 months"
+    or "Grades 3-5" into (min_age, max_age). Returns (None, None) when nothing sensible is found.
+    """
+    if not age_group:
+        return None, None
+    value, grades = _cut_grades(_months_to_years(age_group.lower()))
+
+    match = _RANGE.search(value)
+    if match:
+        low, high = sorted((int(match.group(1)), int(match.group(2))))
+        return low, high
+
+    match = _AND_UP.search(value)
+    if match:
+        return int(match.group(1)), AGE_OPEN_MAX
+
+    if grades:
+        return grades[0] + GRADE_AGE_OFFSET, grades[1] + GRADE_AGE_OFFSET + 1
+
+    for word, age_range in _WORDS:
+        if word in value:
+            return age_range
+
+    match = _SINGLE.search(value)
+    if match:
+        age = int(match.group(1))
+        return age, age
+
+    return None, None
+
+
+def format_age_range(min_age: Optional[int], max_age: Optional[int]) -> Optional[str]:
+    if min_age is None:
+        return None
+    if max_age == AGE_OPEN_MAX:
+        return f"{min_age}+"
+    if min_age == max_age:
+        return str(min_age)
+    return f"{min_age}-{max_age}"
+
+
+def age_range_fields(age_group: Optional[str]) -> dict:
+    # Values to store for an age_group typed by a librarian or read from an ingest source
+    min_age, max_age = parse_age_range(age_group)
+    label = format_age_range(min_age, max_age)
+    if label is None and age_group:
+        label = age_group.strip()[:50] or None
+    return {"age_group": label, "min_age": min_age, "max_age": max_age}
+
+
+def age_filter(model, age: int):
+    return [model.min_age <= age, model.max_age >= age]
+
+
+def add_age_range_columns(db: Session):
+    # create_all doesn't alter existing tables, so add the columns and index on older databases
+    inspector = inspect(db.get_bind())
+    for table in ("book", "video"):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "min_age" not in columns:
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN min_age INTEGER NULL"))
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN max_age INTEGER NULL"))
+            db.execute(text(f"CREATE INDEX ix_{table}_age_range ON {table} (min_age, max_age)"))
+            print(f"Added min_age / max_age to {table}")
+    db.commit()
+
+
+def backfill_age_ranges(db: Session, model, batch_size: int = 1000) -> int:
+    """Parse age_group for every row of model that has no min_age yet. Returns the number of rows updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(model.id, model.age_group)
+            .filter(model.id > last_id, model.min_age.is_(None), model.age_group.isnot(None))
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        mappings = []
+        for row in rows:
+            fields = age_range_fields(row.age_group)
+            if fields["min_age"] is not None:
+                mappings.append({"id": row.id, **fields})
+        if mappings:
+            db.bulk_update_mappings(model, mappings)
+            db.commit()
+            updated += len(mappings)
+    return updated
@@ -0,0 +1,244 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from models.tables import Book, FlaggedMedia, MediaType
+from services import metrics
+from services.age_range import age_range_fields
+from services.cache import cache
+from services.dedup import get_index, minhash, shingles
+from services.screening import screen_media
+
+try:
+    import zstandard
+except ImportError:  # only needed for .zst input
+    zstandard = None
+
+csv.field_size_limit(sys.maxsize)
+
+# Bytes of CSV per chunk handed to a parser process, always cut at the end of a record
+INGEST_CHUNK_BYTES = int(os.getenv("INGEST_CHUNK_BYTES", 4 * 1024 * 1024))
+
+# Parser processes, defaults to one per core
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 0)) or os.cpu_count() or 1
+
+# Parsed books written per batch by the single writer
+INGEST_WRITE_BATCH_SIZE = 1000
+
+READ_BLOCK_BYTES = 1024 * 1024
+
+metrics.describe("book_ingest_rows_total", "Rows read by the books ingest, by outcome")
+
+# A chunk is either a byte range of an uncompressed file, read by the parser itself,
+# or the decompressed bytes of the chunk
+Chunk = Union[Tuple[str, int, int], bytes]
+
+
+def open_input(path: str) -> BinaryIO:
+    # .gz and .zst files are decompressed while they are read
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read .zst files")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def _record_end(data: bytes) -> int:
+    """
+    Offset just past the last newline of data that ends a record, -1 if there is none. data
+    starts on a record and escaped quotes ("") come in pairs, so a newline is outside quotes
+    whenever the number of quotes before it is even.
+    """
+    end = len(data)
+    quotes_after = 0
+    total = data.count(b'"')
+    while True:
+        newline = data.rfind(b"\n", 0, end)
+        if newline < 0:
+            return -1
+        quotes_after += data.count(b'"', newline, end)
+        if (total - quotes_after) % 2 == 0:
+            return newline + 1
+        end = newline
+
+def _split_records(stream: BinaryIO, chunk_bytes: int) -> Iterator[bytes]:
+    # Blocks of about chunk_bytes each ending on a record boundary
+    pending = b""
+    while True:
+        block = stream.read(max(chunk_bytes - len(pending), READ_BLOCK_BYTES))
+        if not block:
+            if pending:
+                yield pending
+            return
+        pending += block
+        if len(pending) < chunk_bytes:
+            continue
+        cut = _record_end(pending)
+        if cut > 0:
+            yield pending[:cut]
+            pending = pending[cut:]
+
+def read_header(path: str) -> Tuple[List[str], int]:
+    # Column names and the offset of the first row in the decompressed data
+    with open_input(path) as stream:
+        data = stream.read(READ_BLOCK_BYTES)
+    newline = data.find(b"\n")
+    while newline >= 0 and data.count(b'"', 0, newline) % 2:
+        newline = data.find(b"\n", newline + 1)
+    cut = newline + 1 if newline >= 0 else len(data)
+    return next(csv.reader(io.StringIO(data[:cut].decode("utf-8-sig")))), cut
+
+def iter_chunks(path: str, start: int, chunk_bytes: int = INGEST_CHUNK_BYTES) -> Iterator[Chunk]:
+    """
+    Chunks of the rows from start on. An uncompressed file is only scanned for record boundaries
+    here and each parser reads its own byte range, compressed input can't be read from an offset
+    so it is decompressed here once and the chunks handed over as bytes.
+    """
+    compressed = path.endswith((".gz", ".zst"))
+    with open_input(path) as stream:
+        if not compressed:
+            stream.seek(start)
+        else:
+            stream.read(start)
+        offset = start
+        for data in _split_records(stream, chunk_bytes):
+            yield data if compressed else (path, offset, offset + len(data))
+            offset += len(data)
+
+
+def normalize_book(row: Dict[str, str]) -> dict:
+    book = {
+        "title": row.get("Name") or "Unknown Title",
+        "author": row.get("Author") or "Unknown",
+        **age_range_fields(row.get("Age", "")),
+        "category": "Children",
+        "description": row.get("Description", "") or row.get("Product_Details", ""),
+        "link": row.get("Link", ""),
+        "rating": 0,
+        "source": "Kaggle",
+    }
+    # The blocklist scan and the MinHash signature are the CPU heavy part, done here in the parser
+    return {
+        "book": book,
+        "matched_terms": screen_media(book["title"], book["description"]),
+        "signature": minhash(shingles(book["title"], book["author"], book["description"])),
+    }
+
+def parse_chunk(chunk: Chunk, fieldnames: List[str]) -> List[dict]:
+    """Runs in a parser process: the chunk's rows as books, with their blocklist terms and signature."""
+    if isinstance(chunk, tuple):
+        path, start, end = chunk
+        with open(path, "rb") as f:
+            f.seek(start)
+            chunk = f.read(end - start)
+    reader = csv.DictReader(io.StringIO(chunk.decode("utf-8"), newline=""), fieldnames=fieldnames)
+    return [normalize_book(row) for row in reader if any(row.values())]
+
+
+class BookWriter:
+    """
+    The one database writer of the ingest. Parsed books are written INGEST_WRITE_BATCH_SIZE at a
+    time: one query finds the links already in the catalog or the screening queue, the duplicate
+    check runs against the in-process index and the batch is committed together.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.index = get_index(Book)
+        self.pending: List[dict] = []
+        self.counts = {"added": 0, "flagged": 0, "known": 0}
+
+    def add(self, parsed: List[dict]):
+        self.pending.extend(parsed)
+        while len(self.pending) >= INGEST_WRITE_BATCH_SIZE:
+            self._write(self.pending[:INGEST_WRITE_BATCH_SIZE])
+            del self.pending[:INGEST_WRITE_BATCH_SIZE]
+
+    def finish(self) -> Dict[str, int]:
+        if self.pending:
+            self._write(self.pending)
+            self.pending = []
+        if self.counts["added"]:
+            cache.invalidate("books")
+        return self.counts
+
+    def _known(self, links: List[str]) -> Tuple[set, set]:
+        db = self.db
+        catalog = {tuple(row) for row in db.query(Book.title, Book.link).filter(Book.link.in_(links))}
+        queued = {link for (link,) in db.query(FlaggedMedia.link).filter(FlaggedMedia.link.in_(links))}
+        return catalog, queued
+
+    def _write(self, batch: List[dict]):
+        catalog, queued = self._known(list({item["book"]["link"] for item in batch}))
+        for item in batch:
+            book = item["book"]
+            if (book["title"], book["link"]) in catalog:
+                outcome = "known"
+            else:
+                catalog.add((book["title"], book["link"]))
+                outcome = self._add(book, item["matched_terms"], item["signature"], queued)
+            if outcome:
+                self.counts[outcome] += 1
+                metrics.inc("book_ingest_rows_total", outcome=outcome)
+        self.db.commit()
+
+    def _add(self, book: dict, matched_terms: List[str], signature: tuple, queued: set) -> Optional[str]:
+        # Anything matching the blocklist or looking like a book we already have waits for an admin
+        if not matched_terms:
+            matched_terms = [
+                f"possible duplicate of book #{book_id}"
+                for book_id, score in self.index.find(None, None, None, signature=signature)[:3]
+            ]
+        if matched_terms:
+            if book["link"] in queued:
+                return None
+            queued.add(book["link"])
+            self.db.add(FlaggedMedia(
+                media_type=MediaType.BOOK,
+                title=book["title"],
+                link=book["link"],
+                matched_terms=", ".join(matched_terms)[:500],
+                payload=json.dumps(book)
+            ))
+            return "flagged"
+
+        new_book = Book(**book)
+        self.db.add(new_book)
+        # Flushed for its id, the following rows are checked against it
+        self.db.flush()
+        self.index.add(new_book.id, None, None, None, signature=signature)
+        return "added"
+
+
+def ingest_books(db: Session, path: str, workers: int = INGEST_WORKERS, chunk_bytes: int = INGEST_CHUNK_BYTES) -> Dict[str, int]:
+    """
+    Loads a books CSV (plain, .gz or .zst) into the catalog. Record aligned chunks are parsed,
+    normalized and screened by a pool of processes, and the results fed in file order to one
+    BookWriter holding the only database connection. Returns the number of rows per outcome.
+    """
+    fieldnames, start = read_header(path)
+    writer = BookWriter(db)
+    chunks = iter_chunks(path, start, chunk_bytes)
+    if workers <= 1:
+        for chunk in chunks:
+            writer.add(parse_chunk(chunk, fieldnames))
+        return writer.finish()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A few chunks in flight per process keeps them busy without reading the whole file ahead
+        in_flight = []
+        for chunk in chunks:
+            in_flight.append(pool.submit(parse_chunk, chunk, fieldnames))
+            if len(in_flight) >= workers * 2:
+                writer.add(in_flight.pop(0).result())
+        for future in in_flight:
+            writer.add(future.result())
+    return writer.finish()
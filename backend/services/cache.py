@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Iterable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from services import metrics
+
+try:
+    import redis
+except ImportError:  # only needed for the shared tier
+    redis = None
+
+# Every worker keeps a small LRU / TTL cache. With CACHE_REDIS_URL set (eg. redis://localhost:6379/1)
+# values are also shared through Redis and invalidations are broadcast to the other workers.
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10_000))
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 60))
+CACHE_DISABLED = os.getenv("CACHE_DISABLED", "false").lower() == "true"
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+metrics.describe("cache_hits_total", "Cache lookups answered from the local or shared tier")
+metrics.describe("cache_misses_total", "Cache lookups that had to load the value")
+metrics.describe("cache_evictions_total", "Entries dropped from the local tier to stay under CACHE_MAX_ENTRIES")
+metrics.describe("cache_invalidations_total", "Tag invalidations, by tag prefix")
+
+
+def cache_key(*parts) -> str:
+    # Request parameters -> short stable key, long search strings are hashed
+    key = ":".join("" if part is None else str(part) for part in parts)
+    return key if len(key) <= 100 else hashlib.sha1(key.encode()).hexdigest()
+
+def _tag_kind(tag: str) -> str:
+    # "children:12" -> "children", keeps the metric labels bounded
+    return tag.split(":", 1)[0]
+
+
+class LocalTier:
+    """LRU with a TTL per entry and a tag -> keys index, for this process only."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, namespace: str, key: str, value, ttl: float, tags: Iterable[str]):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                metrics.inc("cache_evictions_total", namespace=oldest.split(":", 2)[1])
+
+    def invalidate(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.pop(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SharedTier:
+    """
+    Values as JSON in Redis with a set of keys per tag. Invalidations delete the tagged keys and
+    are published so every worker drops its local copies too.
+    """
+
+    def __init__(self, url: str, local: LocalTier):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.local = local
+        self.origin = uuid.uuid4().hex
+        self.on_invalidate: Optional[Callable[[List[str]], None]] = None
+        threading.Thread(target=self._listen, args=(url,), daemon=True, name="cache-invalidations").start()
+
+    def get(self, key: str):
+        raw = self.client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value, ttl: float, tags: Iterable[str]):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(key, json.dumps(value), px=int(ttl * 1000))
+        for tag in tags:
+            pipe.sadd(f"cache:tag:{tag}", key)
+            pipe.expire(f"cache:tag:{tag}", int(ttl) + 60)
+        pipe.execute()
+
+    def invalidate(self, tags: Iterable[str]):
+        tags = list(tags)
+        pipe = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.smembers(f"cache:tag:{tag}")
+        tagged = set().union(*pipe.execute()) if tags else set()
+        pipe = self.client.pipeline(transaction=False)
+        if tagged:
+            pipe.delete(*tagged)
+        pipe.delete(*[f"cache:tag:{tag}" for tag in tags])
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({"origin": self.origin, "tags": tags}))
+        pipe.execute()
+
+    def _listen(self, url: str):
+        # Applies invalidations published by other workers. After a dropped connection the local
+        # tier is cleared, since messages sent while disconnected are lost.
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    data = json.loads(message["data"])
+                    if data["origin"] != self.origin:
+                        self.local.invalidate(data["tags"])
+                        if self.on_invalidate:
+                            self.on_invalidate(data["tags"])
+            except Exception as e:
+                print(f"Cache invalidation listener disconnected: {e}")
+            self.local.clear()
+            time.sleep(1)
+
+
+class Cache:
+    """
+    Read-through cache for endpoint results, organised in namespaces (used as the metric label)
+    and tagged so writes can drop everything derived from what they changed.
+    Values are stored JSON encoded, so loaders should return schemas / dicts rather than ORM objects.
+    A failing shared tier is skipped rather than failing the request.
+    """
+
+    def __init__(self, redis_url: str = CACHE_REDIS_URL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.local = LocalTier(max_entries)
+        self.shared = None
+        # Bumped on every invalidation, a value loaded across one is not stored
+        self._generation = 0
+        self._listeners: List[Callable[[Iterable[str]], None]] = []
+        if redis_url and redis is not None:
+            self.shared = SharedTier(redis_url, self.local)
+            self.shared.on_invalidate = self._remote_invalidate
+        elif redis_url:
+            print("CACHE_REDIS_URL is set but the redis package is not installed, using the local cache only.")
+
+    def _bump(self):
+        self._generation += 1
+
+    def add_listener(self, callback: Callable[[Iterable[str]], None]):
+        # Called with the tags of every invalidation, from this worker or broadcast by another one
+        self._listeners.append(callback)
+
+    def _notify(self, tags: Iterable[str]):
+        for callback in self._listeners:
+            try:
+                callback(tags)
+            except Exception as e:
+                print(f"Cache invalidation listener failed: {e}")
+
+    def _remote_invalidate(self, tags: List[str]):
+        self._bump()
+        self._notify(tags)
+
+    def get_or_set(self, namespace: str, key: str, loader: Callable[[], Any], ttl: Optional[float] = None, tags: Iterable[str] = ()) -> Any:
+        if CACHE_DISABLED:
+            return jsonable_encoder(loader(), exclude_unset=True)
+
+        full_key = f"cache:{namespace}:{key}"
+        entry = self.local.get(full_key)
+        if entry is not None:
+            metrics.inc("cache_hits_total", namespace=namespace, tier="local")
+            return entry[1]
+
+        ttl = ttl or CACHE_DEFAULT_TTL
+        tags = (namespace, *tags)
+        if self.shared is not None:
+            try:
+                value = self.shared.get(full_key)
+                if value is not None:
+                    metrics.inc("cache_hits_total", namespace=namespace, tier="shared")
+                    self.local.set(namespace, full_key, value, ttl, tags)
+                    return value
+            except Exception as e:
+                print(f"Shared cache read failed: {e}")
+
+        metrics.inc("cache_misses_total", namespace=namespace)
+        return self._load(namespace, full_key, loader, ttl, tags)
+
+    def warm(self, namespace: str, key: str, loader: Callable[[], Any], ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        # Loads and stores the value even when it is cached, so readers don't wait for the reload (scheduled warmers)
+        if not CACHE_DISABLED:
+            self._load(namespace, f"cache:{namespace}:{key}", loader, ttl or CACHE_DEFAULT_TTL, (namespace, *tags))
+
+    def _load(self, namespace: str, full_key: str, loader: Callable[[], Any], ttl: float, tags: Iterable[str]) -> Any:
+        generation = self._generation
+        value = jsonable_encoder(loader(), exclude_unset=True)
+        if generation == self._generation:
+            self.local.set(namespace, full_key, value, ttl, tags)
+            if self.shared is not None:
+                try:
+                    self.shared.set(full_key, value, ttl, tags)
+                except Exception as e:
+                    print(f"Shared cache write failed: {e}")
+        return value
+
+    def invalidate(self, *tags: str):
+        # Call after the write has been committed
+        self._bump()
+        self.local.invalidate(tags)
+        for tag in tags:
+            metrics.inc("cache_invalidations_total", tag=_tag_kind(tag))
+        if self.shared is not None:
+            try:
+                self.shared.invalidate(tags)
+            except Exception as e:
+                print(f"Shared cache invalidation failed: {e}")
+        self._notify(tags)
+
+
+cache = Cache()
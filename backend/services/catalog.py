@@ -0,0 +1,54 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import load_only
+from typing import List, Optional
+
+# Columns returned by list endpoints when no fields= parameter is given.
+# description is an unbounded TEXT column so it is only loaded when asked for.
+BOOK_LIST_FIELDS = ["id", "title", "author", "link", "age_group", "category", "rating", "source"]
+BOOK_FIELDS = BOOK_LIST_FIELDS + ["description", "min_age", "max_age", "link_status", "link_checked_at"]
+
+VIDEO_LIST_FIELDS = ["id", "title", "creator", "link", "age_group", "category", "rating", "source"]
+VIDEO_FIELDS = VIDEO_LIST_FIELDS + ["description", "min_age", "max_age", "link_status", "link_checked_at",
+                                   "duration_seconds", "view_count", "like_count", "thumbnail_url", "published_at"]
+
+
+def parse_fields(fields: Optional[str], allowed: List[str], default: List[str]) -> List[str]:
+    # fields is a comma separated list, eg. "title,author,description"
+    if not fields:
+        return list(default)
+
+    requested = []
+    for name in fields.split(","):
+        name = name.strip()
+        if name and name not in requested:
+            requested.append(name)
+
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed fields: {', '.join(allowed)}"
+        )
+
+    # id is always returned so the frontend can open the full record
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return requested
+
+
+def with_fields(query, model, selected: List[str]):
+    # Only SELECT the requested columns, anything else raises instead of lazy loading per row
+    columns = [getattr(model, name) for name in selected]
+    return query.options(load_only(*columns, raiseload=True))
+
+
+def load_by_ids(db, model, selected: List[str], ids: List[int]) -> list:
+    # One page picked by the read model (services/read_model.py), returned in the order of ids
+    if not ids:
+        return []
+    rows = {row.id: row for row in with_fields(db.query(model), model, selected).filter(model.id.in_(ids))}
+    return [rows[item_id] for item_id in ids if item_id in rows]
+
+
+def to_sparse(obj, selected: List[str]) -> dict:
+    return {name: getattr(obj, name) for name in selected}
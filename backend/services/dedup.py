@@ -0,0 +1,316 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from db.database import SessionLocal
+from models.tables import Book, Video
+from services import metrics
+from services.cache import cache
+
+# 128 hashes split in 32 bands of 4 rows: items with a Jaccard similarity
+# around 0.45 or more usually share a band and become candidates,
+# candidates are then checked against SIMILARITY_THRESHOLD.
+NUM_HASHES = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_HASHES // BANDS
+SIMILARITY_THRESHOLD = 0.8
+
+# Only the start of a description is used, re-uploads and new editions share the opening
+DESCRIPTION_WORDS = 80
+
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Fixed seed so signatures are the same in every process and every run
+_rng = random.Random(2024)
+_PERMUTATIONS = [(_rng.randrange(1, 1 << 64) | 1, _rng.randrange(0, 1 << 64)) for _ in range(NUM_HASHES)]
+_A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+_B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+
+# How often the refresher looks for indexes to rebuild after bulk writes (jobs, ingest scripts, other workers)
+DEDUP_INDEX_REFRESH_SECONDS = float(os.getenv("DEDUP_INDEX_REFRESH_SECONDS", 2))
+
+# Indexes are rebuilt at least this often, which also picks up writes nobody announced
+DEDUP_INDEX_MAX_AGE_SECONDS = int(os.getenv("DEDUP_INDEX_MAX_AGE_SECONDS", 3600))
+
+# Cache tag of each table, as in services/read_model.py
+MODELS = {"books": Book, "videos": Video}
+
+metrics.describe("dedup_index_build_seconds", "Duration of the last near duplicate index build, by table")
+metrics.describe("dedup_checks_skipped_total", "Near duplicate checks skipped because the index was still being built, by table")
+
+
+def _words(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return _NON_WORD.sub(" ", text.lower()).split()
+
+
+def shingles(title: Optional[str], creator: Optional[str], description: Optional[str]) -> set:
+    """Word shingles: every title word, title+creator word pairs and description 3-word runs."""
+    title_words = _words(title)
+    creator_words = _words(creator)
+    description_words = _words(description)[:DESCRIPTION_WORDS]
+
+    result = {"t:" + word for word in title_words}
+    result.update("t:" + " ".join(title_words[i:i + 2]) for i in range(len(title_words) - 1))
+    result.update("c:" + word for word in creator_words)
+    result.update("d:" + " ".join(description_words[i:i + 3]) for i in range(len(description_words) - 2))
+    return result
+
+
+def minhash(shingle_set: Iterable[str]) -> Tuple[int, ...]:
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set), dtype=np.uint64)
+    if not hashes.size:
+        return tuple([_MAX_HASH] * NUM_HASHES)
+    # (a * h + b) mod 2^64, top 32 bits kept: a cheap universal hash, no big modulo per shingle.
+    # computed as one (hashes x shingles) array, uint64 arithmetic wraps mod 2^64 by itself
+    return tuple((np.min(_A * hashes + _B, axis=1) >> np.uint64(32)).tolist())
+
+
+def similarity(signature_a: Tuple[int, ...], signature_b: Tuple[int, ...]) -> float:
+    # Fraction of equal hashes estimates the Jaccard similarity of the shingle sets
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_HASHES
+
+
+class DuplicateIndex:
+    """
+    In memory MinHash / LSH index. find() only compares against items that share
+    an LSH band bucket, so lookups don't scan the whole catalog.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: Dict[int, Tuple[int, ...]] = {}
+        self._buckets = [defaultdict(set) for _ in range(BANDS)]
+
+    def _bands(self, signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+
+    def add(self, item_id: int, title, creator, description, signature=None):
+        signature = signature or minhash(shingles(title, creator, description))
+        self.remove(item_id)
+        self.signatures[item_id] = signature
+        for band, key in self._bands(signature):
+            self._buckets[band][key].add(item_id)
+        return signature
+
+    def remove(self, item_id: int):
+        signature = self.signatures.pop(item_id, None)
+        if signature is None:
+            return
+        for band, key in self._bands(signature):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def candidates(self, signature) -> set:
+        found = set()
+        for band, key in self._bands(signature):
+            found |= self._buckets[band].get(key, set())
+        return found
+
+    def find(self, title, creator, description, signature=None, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Returns [(item_id, similarity)] of near duplicates, most similar first."""
+        signature = signature or minhash(shingles(title, creator, description))
+        matches = []
+        for item_id in self.candidates(signature):
+            if item_id == exclude_id:
+                continue
+            score = similarity(signature, self.signatures[item_id])
+            if score >= self.threshold:
+                matches.append((item_id, score))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def clusters(self) -> List[List[int]]:
+        """Groups of near duplicate ids (union-find over all candidate pairs), singletons left out."""
+        parent = {item_id: item_id for item_id in self.signatures}
+
+        def root(item_id):
+            while parent[item_id] != item_id:
+                parent[item_id] = parent[parent[item_id]]
+                item_id = parent[item_id]
+            return item_id
+
+        for item_id, signature in self.signatures.items():
+            for other_id in self.candidates(signature):
+                if other_id <= item_id:
+                    continue
+                if similarity(signature, self.signatures[other_id]) >= self.threshold:
+                    parent[root(other_id)] = root(item_id)
+
+        groups = defaultdict(list)
+        for item_id in self.signatures:
+            groups[root(item_id)].append(item_id)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def build_index(rows: Iterable) -> DuplicateIndex:
+    # rows of (id, title, author / creator, description)
+    index = DuplicateIndex()
+    for item_id, title, creator, description in rows:
+        index.add(item_id, title, creator, description)
+    return index
+
+
+def _rows(db, model, item_ids: Optional[List[int]] = None):
+    creator = model.author if model is Book else model.creator
+    query = db.query(model.id, model.title, creator, model.description)
+    if item_ids is not None:
+        query = query.filter(model.id.in_(item_ids))
+    return query.yield_per(1000)
+
+
+class DuplicateIndexes:
+    """
+    Per worker indexes for the near duplicate checks. Built in the background at startup, until
+    then get() returns None and the librarian endpoints skip the check. Kept current from the catalog
+    cache invalidations, local or broadcast by other workers, like the read model: "books:<id>"
+    tags re-index that one item, a bare "books" (ingest, harvest, other processes) has the refresher
+    rebuild the index and swap it in.
+    """
+
+    def __init__(self):
+        self.indexes: Dict[str, DuplicateIndex] = {}
+        self.built_at: Dict[str, float] = {}
+        self._stale = set(MODELS)
+        # Items changed while their index was being built, re-indexed once it is swapped in
+        self._changed_during_build: Dict[str, set] = {tag: set() for tag in MODELS}
+        self._building = set()
+        self._lock = threading.Lock()
+        self._task = None
+        self._wake = None
+        self._loop = None
+
+    def get(self, model) -> Optional[DuplicateIndex]:
+        return self.indexes.get(model.__tablename__ + "s")
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            for tag in MODELS:
+                if tag in self._stale or now - self.built_at.get(tag, 0) > DEDUP_INDEX_MAX_AGE_SECONDS:
+                    try:
+                        await asyncio.to_thread(self.rebuild, tag)
+                    except Exception as e:
+                        print(f"An error occurred while building the {tag} duplicate index: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=DEDUP_INDEX_REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def rebuild(self, tag: str) -> DuplicateIndex:
+        with self._lock:
+            self._stale.discard(tag)
+            self._building.add(tag)
+            self._changed_during_build[tag].clear()
+        started = time.monotonic()
+        db = SessionLocal()
+        try:
+            index = build_index(_rows(db, MODELS[tag]))
+        except Exception:
+            with self._lock:
+                self._building.discard(tag)
+                self._stale.add(tag)
+            raise
+        finally:
+            db.close()
+        metrics.set_gauge("dedup_index_build_seconds", time.monotonic() - started, table=tag)
+        with self._lock:
+            self.indexes[tag] = index
+            self.built_at[tag] = time.monotonic()
+            self._building.discard(tag)
+            changed = list(self._changed_during_build[tag])
+        if changed:
+            self.reload_items(tag, changed)
+        return index
+
+    def reload_items(self, tag: str, item_ids: List[int]):
+        index = self.indexes.get(tag)
+        if index is None:
+            return
+        db = SessionLocal()
+        try:
+            rows = {row[0]: row for row in _rows(db, MODELS[tag], item_ids)}
+        finally:
+            db.close()
+        for item_id in item_ids:
+            if item_id in rows:
+                index.add(*rows[item_id])
+            else:
+                index.remove(item_id)
+
+    def on_invalidate(self, tags: Iterable[str]):
+        # Cache listener, called after the write committed
+        items: Dict[str, List[int]] = {}
+        bare = set()
+        for tag in tags:
+            kind, _, item_id = tag.partition(":")
+            if kind not in MODELS:
+                continue
+            if item_id:
+                items.setdefault(kind, []).append(int(item_id))
+            else:
+                bare.add(kind)
+
+        for kind in bare - set(items):
+            with self._lock:
+                self._stale.add(kind)
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._wake.set)
+        for kind, item_ids in items.items():
+            with self._lock:
+                if kind in self._building:
+                    self._changed_during_build[kind].update(item_ids)
+            try:
+                self.reload_items(kind, item_ids)
+            except Exception as e:
+                print(f"An error occurred while updating the {kind} duplicate index: {e}")
+                with self._lock:
+                    self._stale.add(kind)
+
+
+duplicate_indexes = DuplicateIndexes()
+cache.add_listener(duplicate_indexes.on_invalidate)
+
+
+def get_index(model) -> DuplicateIndex:
+    # For the ingest and harvest, which run outside the server too: built here when the background build hasn't been
+    index = duplicate_indexes.get(model)
+    if index is None:
+        index = duplicate_indexes.rebuild(model.__tablename__ + "s")
+    return index
+
+
+def index_media(model, item):
+    # Keep the index current within a bulk run (ingest, harvest), whose items are only announced at the end
+    index = duplicate_indexes.get(model)
+    if index is not None:
+        creator = item.author if model is Book else item.creator
+        index.add(item.id, item.title, creator, item.description)
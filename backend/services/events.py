@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import List
+
+from sqlalchemy import insert
+
+from db.database import SessionLocal
+from models.tables import ActivityEvent
+from services import metrics
+
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", 50_000))
+EVENT_FLUSH_INTERVAL_MS = int(os.getenv("EVENT_FLUSH_INTERVAL_MS", 500))
+EVENT_FLUSH_BATCH = int(os.getenv("EVENT_FLUSH_BATCH", 1_000))
+
+metrics.describe("activity_events_accepted_total", "Activity events accepted into the buffer")
+metrics.describe("activity_events_rejected_total", "Activity events rejected because the buffer was full")
+metrics.describe("activity_events_written_total", "Activity events written to activity_event")
+metrics.describe("activity_events_failed_total", "Activity events lost because a flush failed")
+metrics.describe("activity_event_flush_seconds", "Duration of the last activity_event flush")
+metrics.describe("activity_event_buffer_size", "Activity events waiting to be written")
+
+
+class BufferFull(Exception):
+    pass
+
+
+class EventBuffer:
+    """
+    Bounded in-memory buffer in front of activity_event.
+    Requests only append to it, a background task writes it out with multi-row inserts
+    every EVENT_FLUSH_INTERVAL_MS or as soon as EVENT_FLUSH_BATCH events are waiting.
+    When it is full add() raises BufferFull so clients back off instead of memory growing.
+    All methods run on the event loop, only the insert itself runs in a worker thread.
+    """
+
+    def __init__(self, capacity: int = EVENT_BUFFER_SIZE, flush_interval_ms: int = EVENT_FLUSH_INTERVAL_MS, flush_batch: int = EVENT_FLUSH_BATCH):
+        self.capacity = capacity
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_batch = flush_batch
+        self._events = deque()
+        self._wake = None
+        self._task = None
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, rows: List[dict]):
+        if len(self._events) + len(rows) > self.capacity:
+            metrics.inc("activity_events_rejected_total", len(rows))
+            raise BufferFull()
+        self._events.extend(rows)
+        metrics.inc("activity_events_accepted_total", len(rows))
+        if self._wake is not None and len(self._events) >= self.flush_batch:
+            self._wake.set()
+
+    def start(self):
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Called on shutdown: stop the loop, then write whatever is left
+        self._stopping = True
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._events:
+            count = min(self.flush_batch, len(self._events))
+            rows = [self._events.popleft() for _ in range(count)]
+            metrics.set_gauge("activity_event_buffer_size", len(self._events))
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, rows)
+                metrics.inc("activity_events_written_total", len(rows))
+            except Exception as e:
+                metrics.inc("activity_events_failed_total", len(rows))
+                print(f"An error occurred while writing {len(rows)} activity events: {e}")
+            metrics.set_gauge("activity_event_flush_seconds", time.perf_counter() - started)
+
+    @staticmethod
+    def _write(rows: List[dict]):
+        db = SessionLocal()
+        try:
+            # executemany, SQLAlchemy batches it into multi-row INSERT ... VALUES statements
+            db.execute(insert(ActivityEvent), rows)
+            db.commit()
+        finally:
+            db.close()
+
+
+event_buffer = EventBuffer()
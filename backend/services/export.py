@@ -0,0 +1,83 @@
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from db.database import SessionLocal
+from models.tables import Book, Video, Review, User, Role
+
+# Rows fetched per round trip from the server side cursor, also the size of each chunk sent
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Columns exported per table. hashed_password is never exported.
+EXPORT_COLUMNS = {
+    "books": [Book.id, Book.title, Book.author, Book.age_group, Book.category, Book.description, Book.link, Book.rating, Book.source],
+    "videos": [Video.id, Video.title, Video.creator, Video.age_group, Video.category, Video.description, Video.link, Video.rating, Video.source],
+    "reviews": [Review.id, Review.user_id, Review.reviewable_id, Review.review_type, Review.stars, Review.review, Review.created_at],
+    "users": [
+        User.id, User.username, User.first_name, User.last_name, User.email, Role.name.label("role"),
+        User.tier, User.country, User.gender, User.birthday, User.race, User.is_verified,
+        User.librarian_verified, User.primary_parent_id,
+    ],
+}
+
+
+def build_export_query(table: str):
+    query = select(*EXPORT_COLUMNS[table])
+    if table == "users":
+        query = query.join(Role, User.role_id == Role.id)
+    return query.order_by(EXPORT_COLUMNS[table][0])
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_chunk(keys, rows) -> str:
+    return "".join(json.dumps(dict(zip(keys, map(_plain, row)))) + "\n" for row in rows)
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+    return buffer.getvalue()
+
+
+def stream_export(table: str, export_format: str):
+    """
+    Generator yielding the table as NDJSON or CSV, one chunk per batch of rows.
+    Uses its own session with a server side cursor (stream_results + yield_per),
+    so memory stays flat no matter how big the table is.
+    """
+    keys = [column.key for column in EXPORT_COLUMNS[table]]
+
+    if export_format == "csv":
+        # header goes out straight away so the client gets its first byte before any query runs
+        yield _csv_chunk([keys])
+
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            build_export_query(table).execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+        )
+        for rows in result.partitions():
+            if export_format == "csv":
+                yield _csv_chunk(rows)
+            else:
+                yield _ndjson_chunk(keys, rows)
+    finally:
+        db.close()
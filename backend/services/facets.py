@@ -0,0 +1,88 @@
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Facets shown on the parents' search pages and the listing parameter that filters on each
+FACET_FILTERS = {"source": "source", "category": "category", "age_band": "age_band", "rating": "min_rating"}
+
+# An item is in every band its age range overlaps, eg. "4-8" counts under 3-5 and 6-8
+AGE_BANDS = {"0-2": (0, 2), "3-5": (3, 5), "6-8": (6, 8), "9-12": (9, 12), "13+": (13, 99)}
+
+# Rating values are cumulative like star filters, an item rated 4.5 counts under 4+ and every lower one
+RATING_LEVELS = {"4+": 4, "3+": 3, "2+": 2, "1+": 1}
+
+
+class FacetIndex:
+    """
+    A packed bitmap (one bit per read model row) for every facet value, built from the columns
+    and updated row by row on add / edit. Counting a facet under a filter is an AND of the filter's
+    bitmap with each value bitmap and a popcount, no GROUP BY per search.
+    """
+
+    def __init__(self, capacity: int):
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {facet: {} for facet in FACET_FILTERS}
+        self._bytes = (capacity + 7) // 8
+
+    def nbytes(self) -> int:
+        return sum(bitmap.nbytes for values in self.bitmaps.values() for bitmap in values.values())
+
+    def reserve(self, capacity: int):
+        size = (capacity + 7) // 8
+        if size <= self._bytes:
+            return
+        for values in self.bitmaps.values():
+            for value, bitmap in values.items():
+                grown = np.zeros(size, np.uint8)
+                grown[:len(bitmap)] = bitmap
+                values[value] = grown
+        self._bytes = size
+
+    def rebuild(self, store):
+        # From the column arrays in one vectorised pass per value
+        with store.lock:
+            members = {
+                "source": {value: store.source == code for code, value in enumerate(store.sources.values)},
+                "category": {value: store.category == code for code, value in enumerate(store.categories.values)},
+                "age_band": {band: (store.min_age <= high) & (store.max_age >= low) for band, (low, high) in AGE_BANDS.items()},
+                "rating": {level: store.rating >= minimum for level, minimum in RATING_LEVELS.items()},
+            }
+            for facet, values in members.items():
+                self.bitmaps[facet] = {}
+                for value, mask in values.items():
+                    bitmap = np.zeros(self._bytes, np.uint8)
+                    packed = np.packbits(mask)
+                    bitmap[:len(packed)] = packed
+                    self.bitmaps[facet][value] = bitmap
+
+    def update_row(self, position: int, values: Dict[str, Iterable[str]]):
+        """Sets the row's bit in the bitmaps of its values and clears it everywhere else."""
+        byte, bit = position >> 3, np.uint8(0x80 >> (position & 7))
+        for facet, row_values in values.items():
+            row_values = set(row_values)
+            bitmaps = self.bitmaps[facet]
+            for value in row_values - set(bitmaps):
+                bitmaps[value] = np.zeros(self._bytes, np.uint8)
+            for value, bitmap in bitmaps.items():
+                if value in row_values:
+                    bitmap[byte] |= bit
+                else:
+                    bitmap[byte] &= ~bit
+
+    def count(self, facet: str, mask: np.ndarray) -> Dict[str, int]:
+        # Items under mask per value of the facet, values without any left out
+        packed = np.packbits(mask)
+        counts = {}
+        for value, bitmap in self.bitmaps[facet].items():
+            count = int(np.bitwise_count(bitmap[:len(packed)] & packed).sum())
+            if count:
+                counts[value] = count
+        return counts
+
+
+def row_facet_values(source: Optional[str], category: Optional[str], min_age: int, max_age: int, rating: float) -> Dict[str, list]:
+    return {
+        "source": [source] if source is not None else [],
+        "category": [category] if category is not None else [],
+        "age_band": [band for band, (low, high) in AGE_BANDS.items() if min_age <= high and max_age >= low],
+        "rating": [level for level, minimum in RATING_LEVELS.items() if rating >= minimum],
+    }
@@ -0,0 +1,90 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists
+
+from auth.revocation import purge_old_revocations
+from auth.sessions import purge_expired_sessions
+from db.database import SessionLocal
+from models.tables import ActivityEvent, JobRun, Review, User
+from services.landing_page import warm_landing_page
+from services.link_check import run_link_check
+from services.reviews import REVIEWABLE, delete_item_reviews, rebuild_review_stats
+from services.rollups import aggregate_pending_events
+from services.scheduler import Scheduler
+from services.youtube import YOUTUBE_SEARCH_QUERIES, YouTubeClient, enrich_videos, harvest_videos
+
+# job_run rows are kept this long
+JOB_RUN_RETENTION_DAYS = int(os.getenv("JOB_RUN_RETENTION_DAYS", 30))
+
+
+def rebuild_all_review_stats():
+    # The write paths keep review_stats up to date, this corrects any drift once a night
+    db = SessionLocal()
+    try:
+        rebuild_review_stats(db)
+        db.commit()
+    finally:
+        db.close()
+
+def cleanup_orphans():
+    """
+    Deletes rows left pointing at deleted users or catalog items, for the tables without foreign
+    keys (activity events, reviews), and the job_run history past JOB_RUN_RETENTION_DAYS.
+    """
+    db = SessionLocal()
+    try:
+        db.query(ActivityEvent).filter(~exists().where(User.id == ActivityEvent.child_id)).delete(synchronize_session=False)
+        for review_type, model in REVIEWABLE.values():
+            missing = [item_id for (item_id,) in db.query(Review.reviewable_id).filter(
+                Review.review_type == review_type,
+                ~exists().where(model.id == Review.reviewable_id)
+            ).distinct()]
+            if missing:
+                delete_item_reviews(db, review_type, missing)
+        cutoff = datetime.utcnow() - timedelta(days=JOB_RUN_RETENTION_DAYS)
+        db.query(JobRun).filter(JobRun.started_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def warm_caches():
+    db = SessionLocal()
+    try:
+        warm_landing_page(db)
+    finally:
+        db.close()
+
+def enrich_stale_videos():
+    client = YouTubeClient()
+    db = SessionLocal()
+    try:
+        enrich_videos(db, client)
+    finally:
+        db.close()
+        client.close()
+
+def refresh_youtube_videos():
+    # Incremental per query, with a full pass every YOUTUBE_FULL_SYNC_DAYS
+    client = YouTubeClient()
+    db = SessionLocal()
+    try:
+        for query in YOUTUBE_SEARCH_QUERIES:
+            harvest_videos(db, client, query)
+    finally:
+        db.close()
+        client.close()
+
+
+def register_jobs(scheduler: Scheduler):
+    scheduler.add("activity-rollups", "* * * * *", aggregate_pending_events)
+    scheduler.add("review-stats", "30 3 * * *", rebuild_all_review_stats)
+    scheduler.add("purge-revocations", "0 * * * *", purge_old_revocations)
+    scheduler.add("purge-sessions", "15 * * * *", purge_expired_sessions)
+    scheduler.add("orphan-cleanup", "45 2 * * *", cleanup_orphans)
+    scheduler.add("link-check", "0 1 * * *", run_link_check)
+    # Inside the landing page TTL so visitors keep hitting a warm entry
+    scheduler.add("cache-warm", "*/4 * * * *", warm_caches)
+    if os.getenv("API_KEY"):
+        scheduler.add("youtube-refresh", "0 4 * * *", refresh_youtube_videos)
+        scheduler.add("video-enrichment", "30 4 * * *", enrich_stale_videos)
@@ -0,0 +1,19 @@
+from sqlalchemy.orm import Session
+
+from db.routing import on_primary
+from models.tables import LandingPage
+from schemas.landing_page import LandingPageResponse
+from services.cache import cache
+
+# Same content for every visitor and the admin editor, dropped from the cache on every edit
+LANDING_PAGE_TTL = 300
+
+
+def _load(db: Session):
+    return [LandingPageResponse.model_validate(item) for item in db.query(LandingPage).all()]
+
+def landing_page_content(db: Session):
+    return cache.get_or_set("landing_page", "all", on_primary(db, lambda: _load(db)), ttl=LANDING_PAGE_TTL)
+
+def warm_landing_page(db: Session):
+    cache.warm("landing_page", "all", lambda: _load(db), ttl=LANDING_PAGE_TTL)
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+from sqlalchemy import inspect, or_, text, update
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models.tables import Book, LinkStatus, Video
+from services import metrics
+from services.cache import cache
+
+# Open requests in total and per host, the per host limit keeps Amazon / YouTube from throttling us
+LINK_CHECK_CONCURRENCY = int(os.getenv("LINK_CHECK_CONCURRENCY", 200))
+LINK_CHECK_PER_HOST = int(os.getenv("LINK_CHECK_PER_HOST", 20))
+LINK_CHECK_TIMEOUT_SECONDS = float(os.getenv("LINK_CHECK_TIMEOUT_SECONDS", 10))
+
+# Links are checked again once their last check is this old
+LINK_CHECK_INTERVAL_HOURS = int(os.getenv("LINK_CHECK_INTERVAL_HOURS", 7 * 24))
+
+# Rows read per query and results written per UPDATE batch
+LINK_CHECK_BATCH_SIZE = 1000
+
+# A removed YouTube video still answers its watch page with 200, its oEmbed answers 404 (401 when private)
+YOUTUBE_OEMBED_URL = os.getenv("YOUTUBE_OEMBED_URL", "https://www.youtube.com/oembed")
+YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "youtu.be")
+
+# Longest a host is paused for after answering 429
+MAX_BACKOFF_SECONDS = 60
+
+USER_AGENT = "DD-bot link checker"
+
+CHECKED_MODELS = (Book, Video)
+
+metrics.describe("link_checks_total", "Catalog links checked, by table and outcome")
+metrics.describe("link_check_dead_items", "Catalog items hidden for a dead link after the last run")
+
+
+def probe_url(link: str) -> str:
+    # The URL that tells whether the link works, YouTube videos are asked through oEmbed
+    if urlsplit(link).hostname in YOUTUBE_HOSTS:
+        return f"{YOUTUBE_OEMBED_URL}?{urlencode({'url': link, 'format': 'json'})}"
+    return link
+
+def link_reset_fields() -> dict:
+    # Columns to reset when a librarian changes a link, the new one is checked on the next run
+    return {"link_status": LinkStatus.UNCHECKED, "link_checked_at": None, "link_failures": 0, "link_etag": None, "link_last_modified": None}
+
+def next_state(outcome: str, failures: int) -> Tuple[LinkStatus, int]:
+    """
+    Status and consecutive failures after a check with outcome "ok", "gone" or "error".
+    Only "gone" (404 / 410, or oEmbed 401) makes a link DEAD and hides its item. Errors (403, 429,
+    5xx, timeouts, which is also how bot blocking looks) only make it FAILING however many in a row.
+    """
+    if outcome == "ok":
+        return LinkStatus.OK, 0
+    if outcome == "gone":
+        return LinkStatus.DEAD, failures + 1
+    return LinkStatus.FAILING, failures + 1
+
+
+class HostLimiter:
+    """A semaphore per host, plus the time a host asked us (429) to wait until."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._paused_until: Dict[str, float] = {}
+
+    def semaphore(self, host: str) -> asyncio.Semaphore:
+        return self._semaphores[host]
+
+    async def wait(self, host: str):
+        delay = self._paused_until.get(host, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, host: str, retry_after: Optional[str]):
+        try:
+            seconds = min(float(retry_after), MAX_BACKOFF_SECONDS)
+        except (TypeError, ValueError):
+            seconds = 5
+        self._paused_until[host] = max(self._paused_until.get(host, 0), time.monotonic() + seconds)
+
+
+async def check_link(client: httpx.AsyncClient, limiter: HostLimiter, link: str, etag: Optional[str], last_modified: Optional[str]):
+    """
+    Returns (outcome, etag, last_modified) for one link. HEAD first, falling back to a GET whose
+    body is never read for servers that don't allow HEAD. The stored validators are sent so an
+    unchanged page answers 304 without a body.
+    """
+    try:
+        url = probe_url(link)
+        host = urlsplit(url).hostname or ""
+    except ValueError:
+        # Not a URL at all, eg. "http://[::1"
+        return "error", etag, last_modified
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    async with limiter.semaphore(host):
+        await limiter.wait(host)
+        try:
+            response = await client.head(url, headers=headers)
+            if response.status_code in (403, 405, 501):
+                async with client.stream("GET", url, headers=headers) as response:
+                    pass
+        except (httpx.HTTPError, httpx.InvalidURL, ValueError):
+            return "error", etag, last_modified
+
+    code = response.status_code
+    if code < 400:
+        return "ok", response.headers.get("etag", etag), response.headers.get("last-modified", last_modified)
+    if code in (404, 410) or (code == 401 and url != link):
+        return "gone", None, None
+    if code == 429:
+        limiter.pause(host, response.headers.get("retry-after"))
+    return "error", etag, last_modified
+
+
+def _due_rows(model, after_id: int, cutoff: datetime) -> List[tuple]:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(model.id, model.link, model.link_etag, model.link_last_modified, model.link_failures, model.link_status)
+            .filter(model.id > after_id, or_(model.link_checked_at.is_(None), model.link_checked_at < cutoff))
+            .order_by(model.id)
+            .limit(LINK_CHECK_BATCH_SIZE)
+            .all()
+        )
+    finally:
+        db.close()
+
+def _write_results(model, results: List[dict]):
+    # ORM bulk UPDATE by primary key, one executemany per batch
+    db = SessionLocal()
+    try:
+        db.execute(update(model), results)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def check_catalog_links(client: Optional[httpx.AsyncClient] = None) -> Dict[str, int]:
+    """
+    Checks every book and video link not checked within LINK_CHECK_INTERVAL_HOURS.
+    Rows are streamed in id order through a bounded queue to LINK_CHECK_CONCURRENCY workers and the
+    results written back in batches, so memory stays flat however big the catalog is.
+    Pass a client (eg. with a mock transport, or pointed at a stub server) to test it.
+    Returns the number of links per outcome.
+    """
+    owns_client = client is None
+    if owns_client:
+        client = httpx.AsyncClient(
+            timeout=LINK_CHECK_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=LINK_CHECK_CONCURRENCY, max_keepalive_connections=LINK_CHECK_CONCURRENCY)
+        )
+    limiter = HostLimiter(LINK_CHECK_PER_HOST)
+    cutoff = datetime.utcnow() - timedelta(hours=LINK_CHECK_INTERVAL_HOURS)
+    counts = defaultdict(int)
+    changed_tags = set()
+
+    try:
+        for model in CHECKED_MODELS:
+            queue: asyncio.Queue = asyncio.Queue(maxsize=LINK_CHECK_BATCH_SIZE * 2)
+            results: List[dict] = []
+            pending_writes: List[asyncio.Task] = []
+
+            async def flush():
+                batch = results[:]
+                results.clear()
+                if batch:
+                    pending_writes.append(asyncio.create_task(asyncio.to_thread(_write_results, model, batch)))
+
+            async def worker():
+                while True:
+                    row = await queue.get()
+                    if row is None:
+                        return
+                    item_id, link, etag, last_modified, failures, old_status = row
+                    outcome, etag, last_modified = await check_link(client, limiter, link, etag, last_modified)
+                    status, failures = next_state(outcome, failures)
+                    if (status == LinkStatus.DEAD) != (old_status == LinkStatus.DEAD):
+                        changed_tags.add(model.__tablename__ + "s")
+                    results.append({
+                        "id": item_id,
+                        "link_status": status,
+                        "link_failures": failures,
+                        "link_etag": etag,
+                        "link_last_modified": last_modified,
+                        "link_checked_at": datetime.utcnow(),
+                    })
+                    counts[outcome] += 1
+                    metrics.inc("link_checks_total", table=model.__tablename__, outcome=outcome)
+                    if len(results) >= LINK_CHECK_BATCH_SIZE:
+                        await flush()
+
+            workers = [asyncio.create_task(worker()) for _ in range(LINK_CHECK_CONCURRENCY)]
+            last_id = 0
+            while True:
+                rows = await asyncio.to_thread(_due_rows, model, last_id, cutoff)
+                if not rows:
+                    break
+                for row in rows:
+                    await queue.put(row)
+                last_id = rows[-1][0]
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            await flush()
+            await asyncio.gather(*pending_writes)
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    if changed_tags:
+        cache.invalidate(*changed_tags)
+    db = SessionLocal()
+    try:
+        for model in CHECKED_MODELS:
+            dead = db.query(model.id).filter(model.link_status == LinkStatus.DEAD).count()
+            metrics.set_gauge("link_check_dead_items", dead, table=model.__tablename__)
+    finally:
+        db.close()
+    return dict(counts)
+
+def run_link_check() -> Dict[str, int]:
+    # Scheduled job (services/jobs.py), runs in a worker thread with its own event loop
+    return asyncio.run(check_catalog_links())
+
+
+def add_link_check_columns(db: Session):
+    # create_all doesn't alter existing tables, so add the link checker columns on older databases
+    inspector = inspect(db.get_bind())
+    for table in ("book", "video"):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "link_status" not in columns:
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN link_status VARCHAR(20) NOT NULL DEFAULT 'UNCHECKED'"))
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN link_checked_at DATETIME NULL"))
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN link_failures INTEGER NOT NULL DEFAULT 0"))
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN link_etag VARCHAR(255) NULL"))
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN link_last_modified VARCHAR(64) NULL"))
+            db.execute(text(f"CREATE INDEX ix_{table}_link_status ON {table} (link_status)"))
+            print(f"Added the link checker columns to {table}")
+    db.commit()
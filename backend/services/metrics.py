@@ -0,0 +1,54 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# Small in-process metrics registry rendered in the Prometheus text format at /admin/metrics.
+# Counters only go up, gauges are set to the latest value. Labels are passed as keyword arguments.
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[Tuple, float]] = defaultdict(lambda: defaultdict(float))
+_gauges: Dict[str, Dict[Tuple, float]] = defaultdict(dict)
+_help: Dict[str, str] = {}
+
+
+def describe(name: str, help_text: str):
+    _help[name] = help_text
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _counters[name][key] += amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _gauges[name][key] = value
+
+
+def get(name: str, **labels) -> float:
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        if name in _gauges:
+            return _gauges[name].get(key, 0)
+        return _counters[name].get(key, 0) if name in _counters else 0
+
+
+def _format_labels(key: Tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for kind, series in (("counter", _counters), ("gauge", _gauges)):
+            for name in sorted(series):
+                if name in _help:
+                    lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in series[name].items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+    return "\n".join(lines) + "\n"
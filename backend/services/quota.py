@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from auth.auth_handler import decode_access_token, oauth2_scheme
+from models.tables import SubscriptionTier, User
+from services import metrics
+
+try:
+    import redis
+except ImportError:  # only needed for the shared store
+    redis = None
+
+# Limits per subscription tier as in the PRICING content, None is unlimited.
+# Override with env, eg. TIER_CHILD_LIMIT_PRO=10 or TIER_MEDIA_VIEWS_FREE=20.
+# The limits are per counter store: without QUOTA_STORAGE_URL every worker counts on its own,
+# so with N workers a family can get up to N times these limits.
+TIER_QUOTAS = {
+    SubscriptionTier.FREE: {
+        "children": int(os.getenv("TIER_CHILD_LIMIT_FREE", 1)),
+        "media_views": int(os.getenv("TIER_MEDIA_VIEWS_FREE", 10)),
+    },
+    SubscriptionTier.PRO: {
+        "children": int(os.getenv("TIER_CHILD_LIMIT_PRO", 5)),
+        "media_views": None,
+    },
+}
+
+# memory:// keeps counters per worker, redis://host:6379/2 shares them between workers.
+# With several workers use Redis, per worker counters let each of them grant the full limit.
+QUOTA_STORAGE_URL = os.getenv("QUOTA_STORAGE_URL", "memory://")
+
+# Child counters are seeded with a COUNT(*) and seeded again once they expire, which also
+# corrects any drift from a worker dying between its commit and the counter update
+CHILD_COUNTER_TTL_SECONDS = int(os.getenv("QUOTA_CHILD_COUNTER_TTL_SECONDS", 24 * 3600))
+
+# A day's view counter is kept a little past midnight, the next day uses a new key
+VIEW_COUNTER_TTL_SECONDS = 2 * 24 * 3600
+
+metrics.describe("quota_granted_total", "Quota units granted, by quota and tier")
+metrics.describe("quota_rejected_total", "Requests rejected for going over a tier quota")
+
+
+class MemoryStore:
+    def __init__(self):
+        self._counters = {}  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _current(self, key: str, now: float) -> Optional[int]:
+        entry = self._counters.get(key)
+        if entry is None or entry[1] <= now:
+            self._counters.pop(key, None)
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            return self._current(key, time.monotonic())
+
+    def seed(self, key: str, value: int, ttl: int):
+        with self._lock:
+            now = time.monotonic()
+            if self._current(key, now) is None:
+                self._counters[key] = (value, now + ttl)
+
+    def take(self, key: str, wanted: int, limit: Optional[int], ttl: int) -> int:
+        with self._lock:
+            now = time.monotonic()
+            current = self._current(key, now)
+            expires_at = now + ttl if current is None else self._counters[key][1]
+            current = current or 0
+            granted = wanted if limit is None else max(0, min(wanted, limit - current))
+            if granted:
+                self._counters[key] = (current + granted, expires_at)
+            return granted
+
+    def release(self, key: str, amount: int):
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is not None:
+                self._counters[key] = (max(0, entry[0] - amount), entry[1])
+
+    def delete(self, key: str):
+        with self._lock:
+            self._counters.pop(key, None)
+
+
+class RedisStore:
+    # Grants as much of `wanted` as fits under the limit (-1 for none) in one atomic step
+    _TAKE = """
+    local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+    local wanted = tonumber(ARGV[1])
+    local limit = tonumber(ARGV[2])
+    local granted = wanted
+    if limit >= 0 then
+        granted = math.max(0, math.min(wanted, limit - current))
+    end
+    if granted > 0 then
+        redis.call('INCRBY', KEYS[1], granted)
+        if redis.call('TTL', KEYS[1]) < 0 then
+            redis.call('EXPIRE', KEYS[1], ARGV[3])
+        end
+    end
+    return granted
+    """
+
+    _RELEASE = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        if redis.call('DECRBY', KEYS[1], ARGV[1]) < 0 then
+            redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+        end
+    end
+    """
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("The redis package is required for QUOTA_STORAGE_URL=redis://...")
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self._TAKE)
+        self._release = self._client.register_script(self._RELEASE)
+
+    def get(self, key: str) -> Optional[int]:
+        value = self._client.get(key)
+        return None if value is None else int(value)
+
+    def seed(self, key: str, value: int, ttl: int):
+        self._client.set(key, value, ex=ttl, nx=True)
+
+    def take(self, key: str, wanted: int, limit: Optional[int], ttl: int) -> int:
+        return int(self._take(keys=[key], args=[wanted, -1 if limit is None else limit, ttl]))
+
+    def release(self, key: str, amount: int):
+        self._release(keys=[key], args=[amount])
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+
+def make_store(url: str):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisStore(url)
+    # uvicorn and gunicorn take their default worker count from WEB_CONCURRENCY
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        print(f"QUOTA_STORAGE_URL is not set and {workers} workers are running, each of them grants the full tier quotas. Set QUOTA_STORAGE_URL=redis://... to share the counters.")
+    return MemoryStore()
+
+
+store = make_store(QUOTA_STORAGE_URL)
+
+
+# ------------------------------- TRANSACTION HOOKS ------------------------------- #
+# Counter changes that belong to a database write are queued on the session and applied
+# once it commits (deletions) or undone if it ends any other way (reservations): rolled back,
+# or closed without committing.
+def _on_commit(db: Session, callback: Callable[[], None]):
+    db.info.setdefault("quota_on_commit", []).append(callback)
+
+def _on_rollback(db: Session, callback: Callable[[], None]):
+    db.info.setdefault("quota_on_rollback", []).append(callback)
+
+def _run(callbacks):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"An error occurred while updating quota counters: {e}")
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    session.info.pop("quota_on_rollback", None)
+    _run(session.info.pop("quota_on_commit", []))
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop("quota_on_commit", None)
+        _run(session.info.pop("quota_on_rollback", []))
+
+
+# ------------------------------- CHILDREN ------------------------------- #
+def tier_of(user: User) -> SubscriptionTier:
+    # Parents created before tiers existed have no tier, they count as FREE
+    return user.tier or SubscriptionTier.FREE
+
+def child_limit(parent: User) -> int:
+    return TIER_QUOTAS[tier_of(parent)]["children"]
+
+def _children_key(parent_id: int) -> str:
+    return f"quota:children:{parent_id}"
+
+def children_count(db: Session, parent_id: int) -> int:
+    """The parent's child count from the counter store, seeded from the users table when missing."""
+    key = _children_key(parent_id)
+    count = store.get(key)
+    if count is None:
+        count = db.query(func.count(User.id)).filter(User.primary_parent_id == parent_id).scalar()
+        store.seed(key, count, CHILD_COUNTER_TTL_SECONDS)
+    return count
+
+def reserve_child_slots(db: Session, parent: User, wanted: int) -> int:
+    """
+    Takes up to `wanted` child slots from the parent's counter in one atomic step and returns how
+    many fit under the tier limit. Parallel requests each get their own slots without locking the
+    parent row. The slots are handed back if the session ends without committing.
+    """
+    children_count(db, parent.id)
+    # Begin the transaction now so its end comes through the hooks
+    db.connection()
+    tier = tier_of(parent)
+    granted = store.take(_children_key(parent.id), wanted, child_limit(parent), CHILD_COUNTER_TTL_SECONDS)
+    if granted:
+        _on_rollback(db, lambda: store.release(_children_key(parent.id), granted))
+        metrics.inc("quota_granted_total", granted, quota="children", tier=tier.value)
+    if granted < wanted:
+        metrics.inc("quota_rejected_total", quota="children", tier=tier.value)
+    return granted
+
+def release_child_slots(db: Session, parent_id: int, count: int = 1):
+    # Children deleted in this session free their slots once it commits
+    _on_commit(db, lambda: store.release(_children_key(parent_id), count))
+
+def forget_parent(db: Session, parent_id: int):
+    # Deleted parent, drop its counters once the deletion commits
+    _on_commit(db, lambda: store.delete(_children_key(parent_id)))
+
+def child_limit_exception(parent: User) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"The {tier_of(parent).value} plan allows up to {child_limit(parent)} child accounts."
+    )
+
+
+# ------------------------------- MEDIA VIEWS ------------------------------- #
+def _views_key(family_id: int) -> str:
+    return f"quota:views:{family_id}:{date.today().isoformat()}"
+
+def media_views_today(family_id: int) -> int:
+    return store.get(_views_key(family_id)) or 0
+
+def count_media_view(family_id: int, tier: SubscriptionTier):
+    """Counts one opened book or video against the family's daily quota, 403 once it is used up."""
+    limit = TIER_QUOTAS[tier]["media_views"]
+    if limit is None:
+        return
+    if not store.take(_views_key(family_id), 1, limit, VIEW_COUNTER_TTL_SECONDS):
+        metrics.inc("quota_rejected_total", quota="media_views", tier=tier.value)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"The {tier.value} plan allows {limit} books and videos a day. Upgrade to PRO for unlimited access."
+        )
+    metrics.inc("quota_granted_total", quota="media_views", tier=tier.value)
+
+def media_view_quota(token: str = Depends(oauth2_scheme)):
+    """
+    Dependency for the catalog item endpoints, which need a valid token so nobody gets around
+    the quota by leaving it out. Parents and children are counted against their family's quota
+    using the fam / tier claims of the token, no database lookup needed. Librarians and admins
+    are not counted.
+    """
+    payload = decode_access_token(token)
+    family_id, tier = payload.get("fam"), payload.get("tier")
+    if family_id is not None and tier is not None:
+        count_media_view(family_id, SubscriptionTier(tier))
@@ -0,0 +1,149 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from services import metrics
+
+try:
+    import redis
+except ImportError:  # only needed for the shared store
+    redis = None
+
+# Token bucket limits as "requests/seconds" per route and key type.
+# Override any of them with env, eg. RATE_LIMIT_LOGIN_USERNAME=10/60
+RATE_LIMITS = {
+    "login": {"ip": "20/60", "username": "5/60"},
+    "register": {"ip": "5/60", "username": "3/60"},
+    "register-librarian": {"ip": "5/60", "username": "3/60"},
+}
+
+# memory:// keeps buckets per worker, redis://host:6379/0 shares them between workers
+RATE_LIMIT_STORAGE_URL = os.getenv("RATE_LIMIT_STORAGE_URL", "memory://")
+
+# Only trust X-Forwarded-For when running behind a proxy that sets it
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+metrics.describe("rate_limit_allowed_total", "Requests let through by the rate limiter")
+metrics.describe("rate_limit_limited_total", "Requests rejected with 429 by the rate limiter")
+metrics.describe("rate_limit_store_errors_total", "Shared store failures, those requests were limited by the worker's own buckets")
+
+
+def parse_limit(limit: str) -> Tuple[float, float]:
+    # "5/60" -> capacity 5, refilled at 5/60 tokens per second
+    requests, seconds = limit.split("/")
+    capacity = float(requests)
+    return capacity, capacity / float(seconds)
+
+
+class MemoryStore:
+    """Token buckets in this process only, fine for a single worker."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            # Oldest buckets go first, they have had the most time to refill anyway
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class RedisStore:
+    """
+    Token buckets in Redis so every worker shares the same limits. While Redis can't be reached
+    the worker falls back to its own buckets, so logins keep working with per worker limits.
+    """
+
+    _SCRIPT = """
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("The redis package is required for RATE_LIMIT_STORAGE_URL=redis://...")
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self._SCRIPT)
+        self._fallback = MemoryStore()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        try:
+            allowed, tokens = self._take(keys=[f"ratelimit:{key}"], args=[capacity, rate, now])
+        except redis.RedisError as e:
+            print(f"Rate limit store failed, using this worker's buckets: {e}")
+            metrics.inc("rate_limit_store_errors_total")
+            return self._fallback.take(key, capacity, rate, now)
+        allowed = bool(int(allowed))
+        return allowed, 0.0 if allowed else (1 - float(tokens)) / rate
+
+
+def make_store(url: str):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisStore(url)
+    return MemoryStore()
+
+
+store = make_store(RATE_LIMIT_STORAGE_URL)
+
+
+def get_limit(route: str, key_type: str) -> Tuple[float, float]:
+    env_name = f"RATE_LIMIT_{route.upper().replace('-', '_')}_{key_type.upper()}"
+    return parse_limit(os.getenv(env_name, RATE_LIMITS[route][key_type]))
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def check_rate_limit(route: str, request: Request, username: Optional[str] = None):
+    """
+    Call first thing in an endpoint, before any hashing or DB work.
+    Raises 429 with Retry-After once the IP or the username runs out of tokens.
+    """
+    now = time.time()
+    keys = [("ip", client_ip(request))]
+    if username:
+        keys.append(("username", username.lower()))
+
+    for key_type, value in keys:
+        capacity, rate = get_limit(route, key_type)
+        allowed, retry_after = store.take(f"{route}:{key_type}:{value}", capacity, rate, now)
+        if not allowed:
+            metrics.inc("rate_limit_limited_total", route=route, key=key_type)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+    metrics.inc("rate_limit_allowed_total", route=route)
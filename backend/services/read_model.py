@@ -0,0 +1,467 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from db.database import SessionLocal
+from models.tables import Book, LinkStatus, Video
+from services import metrics
+from services.age_range import age_filter
+from services.cache import cache
+from services.facets import AGE_BANDS, FACET_FILTERS, RATING_LEVELS, FacetIndex, row_facet_values
+
+READ_MODEL_ENABLED = os.getenv("READ_MODEL_ENABLED", "true").lower() == "true"
+
+# How often the refresher looks for tables to rebuild after bulk writes (jobs, ingest scripts, other workers)
+READ_MODEL_REFRESH_SECONDS = float(os.getenv("READ_MODEL_REFRESH_SECONDS", 2))
+
+# Tables are rebuilt at least this often, which also picks up writes nobody announced and compacts them
+READ_MODEL_MAX_AGE_SECONDS = int(os.getenv("READ_MODEL_MAX_AGE_SECONDS", 3600))
+
+# Rows fetched per round trip while building
+LOAD_BATCH_SIZE = 10_000
+
+# NULL ages never match an age filter, as in SQL
+NO_MIN_AGE = np.iinfo(np.int16).max
+NO_MAX_AGE = -1
+
+# Cache tag of each table, writes invalidate "books" and name the item with "books:<id>" when there is one
+MODELS = {"books": Book, "videos": Video}
+
+metrics.describe("read_model_items", "Items held by the catalog read model, by table")
+metrics.describe("read_model_bytes", "Memory used by the catalog read model arrays, by table")
+metrics.describe("read_model_build_seconds", "Duration of the last catalog read model build, by table")
+
+
+def _columns(model) -> List[Tuple[str, type]]:
+    columns = [
+        ("id", np.int32), ("category", np.int16), ("source", np.int16),
+        ("min_age", np.int16), ("max_age", np.int16), ("rating", np.float32),
+        ("dead", np.bool_), ("alive", np.bool_), ("title_start", np.uint32), ("title_end", np.uint32),
+    ]
+    if model is Video:
+        columns.append(("duration", np.int32))
+    return columns
+
+def _row_query(db, model):
+    columns = [model.id, model.title, model.category, model.source, model.min_age, model.max_age, model.rating, model.link_status]
+    if model is Video:
+        columns.append(model.duration_seconds)
+    return db.query(*columns)
+
+
+class Interner:
+    # Repeated strings (category, source) -> small integer codes, -1 for NULL
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class CatalogColumns:
+    """
+    Read optimised copy of one catalog table: a NumPy array per column with the rows in id order,
+    category and source interned to int16 codes and the lowercased titles in one buffer addressed
+    by offsets. About 26 bytes per item plus its title, no ORM objects.
+    Deleted rows are only marked and edited titles appended, the next rebuild drops both.
+    """
+
+    def __init__(self, model, capacity: int = 1024):
+        self.model = model
+        self.size = 0
+        self.arrays = {name: np.zeros(capacity, dtype) for name, dtype in _columns(model)}
+        self.titles = bytearray()
+        self.categories = Interner()
+        self.sources = Interner()
+        self.lock = threading.RLock()
+        self.facets = FacetIndex(capacity)
+        self._title_index = None
+
+    def __getattr__(self, name):
+        # store.rating etc. -> the used part of the column
+        arrays = self.__dict__.get("arrays")
+        if arrays is None or name not in arrays:
+            raise AttributeError(name)
+        return arrays[name][:self.size]
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values()) + len(self.titles) + self.facets.nbytes()
+
+    def _reserve(self, extra: int):
+        capacity = len(self.arrays["id"])
+        if self.size + extra <= capacity:
+            return
+        capacity = max(capacity * 2, self.size + extra)
+        for name, array in self.arrays.items():
+            grown = np.zeros(capacity, array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+        self.facets.reserve(capacity)
+
+    def _write(self, positions, rows: List[tuple]):
+        values = list(zip(*rows))
+        arrays = self.arrays
+        arrays["id"][positions] = values[0]
+        titles = [(title or "").lower().encode() for title in values[1]]
+        ends = len(self.titles) + np.cumsum([len(title) for title in titles])
+        arrays["title_end"][positions] = ends
+        arrays["title_start"][positions] = ends - [len(title) for title in titles]
+        self.titles += b"".join(titles)
+        arrays["category"][positions] = [self.categories.code(value) for value in values[2]]
+        arrays["source"][positions] = [self.sources.code(value) for value in values[3]]
+        arrays["min_age"][positions] = [NO_MIN_AGE if value is None else value for value in values[4]]
+        arrays["max_age"][positions] = [NO_MAX_AGE if value is None else value for value in values[5]]
+        arrays["rating"][positions] = [value or 0 for value in values[6]]
+        arrays["dead"][positions] = [status == LinkStatus.DEAD for status in values[7]]
+        arrays["alive"][positions] = True
+        if "duration" in arrays:
+            arrays["duration"][positions] = [-1 if value is None else value for value in values[8]]
+        self._title_index = None
+
+    def append(self, rows: List[tuple]):
+        # rows in id order, after every id already held. Call facets.rebuild once done appending
+        with self.lock:
+            self._reserve(len(rows))
+            self._write(slice(self.size, self.size + len(rows)), rows)
+            self.size += len(rows)
+
+    def _position(self, item_id: int) -> int:
+        position = int(np.searchsorted(self.id, item_id))
+        return position if position < self.size and self.arrays["id"][position] == item_id else -1
+
+    def upsert(self, row: tuple):
+        with self.lock:
+            position = self._position(row[0])
+            if position < 0:
+                position = int(np.searchsorted(self.id, row[0]))
+                self._reserve(1)
+                shifted = position < self.size
+                if shifted:
+                    # Older id than the newest held (a concurrent insert seen late), shift the tail along
+                    for array in self.arrays.values():
+                        array[position + 1:self.size + 1] = array[position:self.size]
+                self.size += 1
+                self._write([position], [row])
+                if shifted:
+                    self.facets.rebuild(self)
+                    return
+            else:
+                self._write([position], [row])
+            arrays = self.arrays
+            self.facets.update_row(position, row_facet_values(
+                self.sources.values[arrays["source"][position]] if arrays["source"][position] >= 0 else None,
+                self.categories.values[arrays["category"][position]] if arrays["category"][position] >= 0 else None,
+                arrays["min_age"][position], arrays["max_age"][position], arrays["rating"][position]
+            ))
+
+    def remove(self, item_id: int):
+        with self.lock:
+            position = self._position(item_id)
+            if position >= 0:
+                self.arrays["alive"][position] = False
+
+    def count(self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+    # ------------------------------- QUERIES ------------------------------- #
+    def title_mask(self, search: str) -> np.ndarray:
+        # Case insensitive substring match over the title buffer, hits are mapped back to rows by offset
+        needle = np.frombuffer(search.lower().encode(), np.uint8)
+        # A view of the buffer, dropped before anything can append to it (callers hold the lock)
+        text = np.frombuffer(self.titles, np.uint8)
+        # Offsets matching the first byte, narrowed one byte of the needle at a time, so a short
+        # search matching most titles costs a few array passes instead of a find() per hit
+        hits = np.flatnonzero(text[:max(len(text) - len(needle) + 1, 0)] == needle[0])
+        for offset in range(1, len(needle)):
+            hits = hits[text[hits + offset] == needle[offset]]
+        del text
+        mask = np.zeros(self.size, np.bool_)
+        if not len(hits):
+            return mask
+        if self._title_index is None:
+            order = np.lexsort((self.title_end, self.title_start))
+            self._title_index = (order, self.title_start[order])
+        order, starts = self._title_index
+        rows = order[np.searchsorted(starts, hits, side="right") - 1]
+        # Hits in text left behind by an edit or running across two titles fall past the row's end
+        mask[rows[hits + len(needle) <= self.title_end[rows]]] = True
+        return mask
+
+    def _base_mask(self, include_dead: bool = False, search: Optional[str] = None, age: Optional[int] = None,
+                   max_duration: Optional[int] = None) -> np.ndarray:
+        mask = self.alive.copy()
+        if not include_dead:
+            mask &= ~self.dead
+        if age is not None:
+            mask &= (self.min_age <= age) & (self.max_age >= age)
+        if max_duration is not None:
+            mask &= (self.duration >= 0) & (self.duration <= max_duration)
+        if search:
+            mask &= self.title_mask(search)
+        return mask
+
+    def _facet_masks(self, source: Optional[str] = None, category: Optional[str] = None,
+                     age_band: Optional[str] = None, min_rating: Optional[str] = None) -> Dict[str, np.ndarray]:
+        # One mask per facet filter in use, keyed by facet
+        # Empty values are no filter, as in sql_listing (the librarian pages send source="")
+        masks = {}
+        if source:
+            masks["source"] = self.source == self.sources.codes.get(source, -2)
+        if category:
+            masks["category"] = self.category == self.categories.codes.get(category, -2)
+        if age_band:
+            low, high = AGE_BANDS[age_band]
+            masks["age_band"] = (self.min_age <= high) & (self.max_age >= low)
+        if min_rating:
+            masks["rating"] = self.rating >= RATING_LEVELS[min_rating]
+        return masks
+
+    def mask(self, include_dead: bool = False, search: Optional[str] = None, age: Optional[int] = None,
+             max_duration: Optional[int] = None, **facet_filters) -> np.ndarray:
+        """Rows matching the filters of the listing endpoints, as a boolean array."""
+        with self.lock:
+            mask = self._base_mask(include_dead, search, age, max_duration)
+            for facet_mask in self._facet_masks(**facet_filters).values():
+                mask &= facet_mask
+            return mask
+
+    def facet_counts(self, include_dead: bool = False, search: Optional[str] = None, age: Optional[int] = None,
+                     max_duration: Optional[int] = None, **facet_filters) -> Dict[str, Dict[str, int]]:
+        """
+        Items per value of every facet under the current filters. A facet's own filter is left out
+        of its counts, so the other values of a facet in use still show how many items they'd give.
+        """
+        with self.lock:
+            base = self._base_mask(include_dead, search, age, max_duration)
+            facet_masks = self._facet_masks(**facet_filters)
+            counts = {}
+            for facet in FACET_FILTERS:
+                mask = base.copy()
+                for other, facet_mask in facet_masks.items():
+                    if other != facet:
+                        mask &= facet_mask
+                counts[facet] = self.facets.count(facet, mask)
+            return counts
+
+    def listing(self, offset: int, limit: int, **filters) -> Tuple[int, List[int]]:
+        """Total and the ids of one page of the matching items, newest first like the SQL listing."""
+        with self.lock:
+            ids = self.id[self.mask(**filters)][::-1]
+        return len(ids), ids[offset:offset + limit].tolist()
+
+    def top_rated(self, limit: int, exclude_ids: Iterable[int] = (), **filters) -> List[int]:
+        """Candidate ids among the matching items, highest rating first, then newest."""
+        with self.lock:
+            ids = self.id
+            mask = self.mask(**filters) & ~np.isin(ids, np.fromiter(exclude_ids, np.int64))
+            rows = np.flatnonzero(mask)
+            ratings = self.rating[rows]
+            if len(rows) > limit:
+                # Ratings tied with the lowest one kept all stay in, so newer items win the ties below
+                cutoff = np.partition(ratings, len(rows) - limit)[len(rows) - limit]
+                keep = ratings >= cutoff
+                rows, ratings = rows[keep], ratings[keep]
+            order = np.lexsort((-ids[rows].astype(np.int64), -ratings))[:limit]
+            return ids[rows[order]].tolist()
+
+
+def build_columns(model) -> CatalogColumns:
+    start = time.monotonic()
+    db = SessionLocal()
+    try:
+        store = CatalogColumns(model, capacity=max(1024, db.query(model.id).count()))
+        batch = []
+        for row in _row_query(db, model).order_by(model.id).yield_per(LOAD_BATCH_SIZE):
+            batch.append(tuple(row))
+            if len(batch) >= LOAD_BATCH_SIZE:
+                store.append(batch)
+                batch = []
+        if batch:
+            store.append(batch)
+        store.facets.rebuild(store)
+    finally:
+        db.close()
+    tag = model.__tablename__ + "s"
+    metrics.set_gauge("read_model_items", store.count(), table=model.__tablename__)
+    metrics.set_gauge("read_model_bytes", store.nbytes(), table=model.__tablename__)
+    metrics.set_gauge("read_model_build_seconds", round(time.monotonic() - start, 3), table=model.__tablename__)
+    print(f"Catalog read model: {store.count()} {tag} in {store.nbytes() / 1e6:.1f} MB")
+    return store
+
+
+class CatalogReadModel:
+    """
+    Per worker columnar copies of book and video for the listing and recommendation endpoints.
+    Built in the background at startup, until then get() returns None and callers use SQL.
+    Kept current from the catalog cache invalidations, local or broadcast by other workers:
+    "books:<id>" tags reload that one row, a bare "books" (bulk writes) has the refresher
+    rebuild the table and swap it in. Readers keep using the old copy during a rebuild.
+    """
+
+    def __init__(self):
+        self.stores: Dict[str, CatalogColumns] = {}
+        self.built_at: Dict[str, float] = {}
+        self._stale = set(MODELS)
+        # Items changed while their table was being built, reloaded once it is swapped in
+        self._changed_during_build: Dict[str, set] = {tag: set() for tag in MODELS}
+        self._building = set()
+        self._lock = threading.Lock()
+        self._task = None
+        self._wake = None
+        self._loop = None
+
+    def get(self, model) -> Optional[CatalogColumns]:
+        if not READ_MODEL_ENABLED:
+            return None
+        return self.stores.get(model.__tablename__ + "s")
+
+    def start(self):
+        if READ_MODEL_ENABLED:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            for tag in MODELS:
+                if tag in self._stale or now - self.built_at.get(tag, 0) > READ_MODEL_MAX_AGE_SECONDS:
+                    try:
+                        await asyncio.to_thread(self.rebuild, tag)
+                    except Exception as e:
+                        print(f"An error occurred while building the {tag} read model: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=READ_MODEL_REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def rebuild(self, tag: str):
+        with self._lock:
+            self._stale.discard(tag)
+            self._building.add(tag)
+            self._changed_during_build[tag].clear()
+        try:
+            store = build_columns(MODELS[tag])
+        except Exception:
+            with self._lock:
+                self._building.discard(tag)
+                self._stale.add(tag)
+            raise
+        with self._lock:
+            self.stores[tag] = store
+            self.built_at[tag] = time.monotonic()
+            self._building.discard(tag)
+            changed = list(self._changed_during_build[tag])
+        if changed:
+            self.reload_items(tag, changed)
+
+    def reload_items(self, tag: str, item_ids: List[int]):
+        store = self.stores.get(tag)
+        if store is None:
+            return
+        model = MODELS[tag]
+        db = SessionLocal()
+        try:
+            rows = {row[0]: tuple(row) for row in _row_query(db, model).filter(model.id.in_(item_ids))}
+        finally:
+            db.close()
+        for item_id in item_ids:
+            if item_id in rows:
+                store.upsert(rows[item_id])
+            else:
+                store.remove(item_id)
+
+    def on_invalidate(self, tags: Iterable[str]):
+        # Cache listener, called after the write committed
+        items: Dict[str, List[int]] = {}
+        bare = set()
+        for tag in tags:
+            kind, _, item_id = tag.partition(":")
+            if kind not in MODELS:
+                continue
+            if item_id:
+                items.setdefault(kind, []).append(int(item_id))
+            else:
+                bare.add(kind)
+
+        for kind in bare - set(items):
+            with self._lock:
+                self._stale.add(kind)
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._wake.set)
+        for kind, item_ids in items.items():
+            with self._lock:
+                if kind in self._building:
+                    self._changed_during_build[kind].update(item_ids)
+            try:
+                self.reload_items(kind, item_ids)
+            except Exception as e:
+                print(f"An error occurred while updating the {kind} read model: {e}")
+                with self._lock:
+                    self._stale.add(kind)
+
+
+read_model = CatalogReadModel()
+
+
+def sql_listing(db, model, offset: int, limit: int, include_dead: bool = False, search: Optional[str] = None,
+                age: Optional[int] = None, max_duration: Optional[int] = None, source: Optional[str] = None,
+                category: Optional[str] = None, age_band: Optional[str] = None, min_rating: Optional[str] = None) -> Tuple[int, List[int]]:
+    """CatalogColumns.listing in SQL, for the listings until the read model is built. Same filters and order."""
+    query = db.query(model.id)
+    if not include_dead:
+        query = query.filter(model.link_status != LinkStatus.DEAD)
+    if search:
+        query = query.filter(model.title.contains(search))
+    if age is not None:
+        query = query.filter(*age_filter(model, age))
+    if max_duration is not None:
+        query = query.filter(model.duration_seconds <= max_duration)
+    if source:
+        query = query.filter(model.source == source)
+    if category:
+        query = query.filter(model.category == category)
+    if age_band:
+        low, high = AGE_BANDS[age_band]
+        query = query.filter(model.min_age <= high, model.max_age >= low)
+    if min_rating:
+        query = query.filter(model.rating >= RATING_LEVELS[min_rating])
+    total = query.count()
+    ids = [item_id for (item_id,) in query.order_by(model.id.desc()).offset(offset).limit(limit)]
+    return total, ids
+
+def candidate_ids(db, model, limit: int, age: Optional[int] = None, exclude_ids: Iterable[int] = ()) -> List[int]:
+    """Recommendation candidates: live items suited to age, best rated first, from the read model or SQL until it is built."""
+    exclude_ids = list(exclude_ids)
+    store = read_model.get(model)
+    if store is not None:
+        return store.top_rated(limit, exclude_ids, age=age)
+
+    query = db.query(model.id).filter(model.link_status != LinkStatus.DEAD)
+    if age is not None:
+        query = query.filter(model.min_age <= age, model.max_age >= age)
+    if exclude_ids:
+        query = query.filter(model.id.notin_(exclude_ids))
+    return [item_id for (item_id,) in query.order_by(model.rating.desc(), model.id.desc()).limit(limit)]
+cache.add_listener(read_model.on_invalidate)
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import threading
+from typing import Dict, Iterable, List
+
+from db.database import SessionLocal
+from models.tables import Interest, Role
+
+
+class ReferenceData:
+    """
+    Roles and interests, loaded once at startup (see main.py) instead of queried per request.
+    Both tables only change through the seeding in db/database.py, so a restart picks up new rows;
+    call load() again after changing them by hand.
+    Accessing it before load() loads it on demand, so scripts can use it too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._role_ids: Dict[str, int] = {}
+        self._role_names: Dict[int, str] = {}
+        self._interest_ids: Dict[str, int] = {}
+        self.interests: List[dict] = []
+        self.interests_etag = ""
+
+    def load(self):
+        db = SessionLocal()
+        try:
+            roles = db.query(Role.id, Role.name).all()
+            interests = db.query(Interest.id, Interest.name).order_by(Interest.id).all()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._role_ids = {name.value: role_id for role_id, name in roles}
+            self._role_names = {role_id: name.value for role_id, name in roles}
+            self._interest_ids = {name.value: interest_id for interest_id, name in interests}
+            self.interests = [{"name": name.value} for _, name in interests]
+            self.interests_etag = '"' + hashlib.sha1(json.dumps(self.interests).encode()).hexdigest()[:16] + '"'
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def role_id(self, name: str) -> int:
+        self._ensure_loaded()
+        return self._role_ids[name]
+
+    def role_name(self, role_id: int) -> str:
+        self._ensure_loaded()
+        return self._role_names[role_id]
+
+    def interest_ids(self, names: Iterable[str]) -> List[int]:
+        # Ids of the known names, unknown names are left out
+        self._ensure_loaded()
+        return sorted({self._interest_ids[name] for name in names if name in self._interest_ids})
+
+
+reference_data = ReferenceData()
@@ -0,0 +1,227 @@
+import base64
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, inspect, or_, select, text
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.tables import Book, Review, ReviewStats, ReviewType, User, Video
+
+# URL segment -> review type and catalog model
+REVIEWABLE = {
+    "books": (ReviewType.BOOK, Book),
+    "videos": (ReviewType.VIDEO, Video),
+}
+STAR_COLUMNS = {stars: f"stars_{stars}" for stars in range(1, 6)}
+
+
+# ------------------------------- HISTOGRAM ------------------------------- #
+def _add_to_stats(db: Session, review_type: ReviewType, reviewable_id: int, stars: int):
+    # INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT on sqlite) so the first reviews of an item can't race
+    table = ReviewStats.__table__
+    star_column = STAR_COLUMNS[stars]
+    values = {"review_type": review_type, "reviewable_id": reviewable_id, "review_count": 1, "stars_total": stars,
+              **{column: int(column == star_column) for column in STAR_COLUMNS.values()}}
+    increments = {
+        "review_count": table.c.review_count + 1,
+        "stars_total": table.c.stars_total + stars,
+        star_column: table.c[star_column] + 1,
+    }
+    if db.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(table).values(**values).on_duplicate_key_update(**increments)
+    else:
+        statement = sqlite.insert(table).values(**values).on_conflict_do_update(
+            index_elements=["review_type", "reviewable_id"], set_=increments
+        )
+    db.execute(statement)
+
+def _remove_from_stats(db: Session, review_type: ReviewType, reviewable_id: int, stars: int):
+    star_column = STAR_COLUMNS[stars]
+    db.query(ReviewStats).filter(
+        ReviewStats.review_type == review_type,
+        ReviewStats.reviewable_id == reviewable_id
+    ).update({
+        ReviewStats.review_count: ReviewStats.review_count - 1,
+        ReviewStats.stars_total: ReviewStats.stars_total - stars,
+        getattr(ReviewStats, star_column): getattr(ReviewStats, star_column) - 1,
+    }, synchronize_session=False)
+
+def review_summary(db: Session, review_type: ReviewType, reviewable_id: int) -> dict:
+    stats = db.get(ReviewStats, (review_type, reviewable_id))
+    count = stats.review_count if stats else 0
+    return {
+        "review_count": count,
+        "average_stars": round(stats.stars_total / count, 2) if count else None,
+        "histogram": {stars: getattr(stats, column) if stats else 0 for stars, column in STAR_COLUMNS.items()},
+    }
+
+def rebuild_review_stats(db: Session, review_type: Optional[ReviewType] = None, reviewable_ids: Optional[List[int]] = None) -> int:
+    """
+    Recomputes review_stats from review, for everything or only the given items.
+    Used by the migration and after merges, day to day the counters are kept up by the write paths.
+    Caller commits.
+    """
+    stale = db.query(ReviewStats)
+    counts = db.query(Review.review_type, Review.reviewable_id, Review.stars, func.count()).group_by(
+        Review.review_type, Review.reviewable_id, Review.stars
+    )
+    if review_type is not None:
+        stale = stale.filter(ReviewStats.review_type == review_type)
+        counts = counts.filter(Review.review_type == review_type)
+    if reviewable_ids is not None:
+        stale = stale.filter(ReviewStats.reviewable_id.in_(reviewable_ids))
+        counts = counts.filter(Review.reviewable_id.in_(reviewable_ids))
+    stale.delete(synchronize_session=False)
+
+    stats = {}
+    for item_type, item_id, stars, count in counts:
+        row = stats.setdefault((item_type, item_id), ReviewStats(
+            review_type=item_type, reviewable_id=item_id, review_count=0, stars_total=0,
+            **{column: 0 for column in STAR_COLUMNS.values()}
+        ))
+        row.review_count += count
+        row.stars_total += stars * count
+        setattr(row, STAR_COLUMNS[stars], count)
+    db.add_all(stats.values())
+    db.flush()
+    return len(stats)
+
+
+# ------------------------------- WRITES ------------------------------- #
+def upsert_review(db: Session, user_id: int, review_type: ReviewType, reviewable_id: int, review: str, stars: int) -> Tuple[Review, bool]:
+    """
+    Creates the user's review of an item or replaces the existing one, keeping review_stats in step.
+    The unique index on (review_type, reviewable_id, user_id) decides if two requests race.
+    Returns the review and whether it was created. Commits.
+    """
+    for attempt in range(2):
+        existing = db.query(Review).filter(
+            Review.review_type == review_type,
+            Review.reviewable_id == reviewable_id,
+            Review.user_id == user_id
+        ).with_for_update().first()
+
+        try:
+            if existing:
+                if existing.stars != stars:
+                    _remove_from_stats(db, review_type, reviewable_id, existing.stars)
+                    _add_to_stats(db, review_type, reviewable_id, stars)
+                existing.review = review
+                existing.stars = stars
+                db.commit()
+                db.refresh(existing)
+                return existing, False
+
+            new_review = Review(user_id=user_id, review=review, stars=stars, review_type=review_type, reviewable_id=reviewable_id)
+            db.add(new_review)
+            db.flush()
+            _add_to_stats(db, review_type, reviewable_id, stars)
+            db.commit()
+            db.refresh(new_review)
+            return new_review, True
+        except IntegrityError:
+            # Another request inserted this user's review first, update that one instead
+            db.rollback()
+            if attempt:
+                raise
+
+def delete_review(db: Session, review: Review):
+    # Caller commits
+    _remove_from_stats(db, review.review_type, review.reviewable_id, review.stars)
+    db.delete(review)
+
+def delete_user_reviews(db: Session, user_ids: Iterable[int]):
+    # Before deleting users: their reviews would go with them, take them out of the histograms first
+    for review in db.query(Review).filter(Review.user_id.in_(list(user_ids))):
+        _remove_from_stats(db, review.review_type, review.reviewable_id, review.stars)
+
+def delete_item_reviews(db: Session, review_type: ReviewType, reviewable_ids: Iterable[int]):
+    reviewable_ids = list(reviewable_ids)
+    db.query(Review).filter(Review.review_type == review_type, Review.reviewable_id.in_(reviewable_ids)).delete(synchronize_session=False)
+    db.query(ReviewStats).filter(ReviewStats.review_type == review_type, ReviewStats.reviewable_id.in_(reviewable_ids)).delete(synchronize_session=False)
+
+def merge_item_reviews(db: Session, review_type: ReviewType, keep_id: int, duplicate_ids: List[int]):
+    """
+    Moves the reviews of duplicate_ids onto keep_id. Where a user reviewed more than one of them
+    only their newest review is kept, as a user can review an item once. Caller commits.
+    """
+    item_ids = [keep_id, *duplicate_ids]
+    reviews = db.query(Review.id, Review.user_id).filter(
+        Review.review_type == review_type,
+        Review.reviewable_id.in_(item_ids)
+    ).order_by(Review.created_at.desc(), Review.id.desc()).all()
+
+    seen, superseded = set(), []
+    for review_id, user_id in reviews:
+        if user_id in seen:
+            superseded.append(review_id)
+        seen.add(user_id)
+    if superseded:
+        db.query(Review).filter(Review.id.in_(superseded)).delete(synchronize_session=False)
+
+    db.query(Review).filter(
+        Review.review_type == review_type,
+        Review.reviewable_id.in_(duplicate_ids)
+    ).update({Review.reviewable_id: keep_id}, synchronize_session=False)
+    db.flush()
+    rebuild_review_stats(db, review_type, item_ids)
+
+
+# ------------------------------- READS ------------------------------- #
+def encode_cursor(created_at: datetime, review_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{review_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, review_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(review_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+def review_page(db: Session, review_type: ReviewType, reviewable_id: int, cursor: Optional[str], size: int):
+    """
+    One page of an item's reviews, newest first, seeking past (created_at, id) of the cursor
+    on ix_review_item_created instead of OFFSET. Returns (rows, next_cursor).
+    """
+    query = db.query(Review, User.username).join(User, User.id == Review.user_id).filter(
+        Review.review_type == review_type,
+        Review.reviewable_id == reviewable_id
+    )
+    if cursor:
+        created_at, review_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Review.created_at < created_at,
+            and_(Review.created_at == created_at, Review.id < review_id)
+        ))
+    rows = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(size + 1).all()
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+# ------------------------------- MIGRATION ------------------------------- #
+def add_review_indexes(db: Session):
+    """
+    create_all doesn't touch existing tables: drops duplicate reviews (keeping each user's newest
+    per item) and adds the unique and pagination indexes on older databases.
+    """
+    inspector = inspect(db.get_bind())
+    indexes = {index["name"] for index in inspector.get_indexes("review")}
+    indexes |= {constraint["name"] for constraint in inspector.get_unique_constraints("review")}
+    if "uq_review_user_item" not in indexes:
+        # Derived table, MySQL won't delete from a table it also selects from directly
+        newest = db.query(func.max(Review.id).label("id")).group_by(Review.review_type, Review.reviewable_id, Review.user_id).subquery()
+        removed = db.query(Review).filter(Review.id.notin_(select(newest.c.id))).delete(synchronize_session=False)
+        db.execute(text("CREATE UNIQUE INDEX uq_review_user_item ON review (review_type, reviewable_id, user_id)"))
+        print(f"Added uq_review_user_item, {removed} duplicate reviews removed")
+    if "ix_review_item_created" not in indexes:
+        db.execute(text("CREATE INDEX ix_review_item_created ON review (review_type, reviewable_id, created_at, id)"))
+        print("Added ix_review_item_created")
+    db.commit()
@@ -0,0 +1,221 @@
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models.tables import ActivityEvent, ActivityEventType, Book, ChildActivityDaily, MediaType, RollupWatermark, Video
+from services import metrics
+
+ROLLUP_NAME = "child_activity_daily"
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", 50_000))
+
+# Events received more recently than this are left for the next pass, so an insert that
+# commits after a higher id from another worker is not skipped by the watermark
+ROLLUP_SETTLE_SECONDS = 5
+
+UNCATEGORISED = "Uncategorised"
+COUNTERS = ("events", "books_opened", "videos_played", "completed", "seconds_reading", "seconds_watching")
+
+metrics.describe("rollup_events_processed_total", "Activity events folded into child_activity_daily")
+metrics.describe("rollup_lag_events", "Activity events not yet folded into child_activity_daily")
+
+
+def _aggregate(db: Session, *criteria):
+    # One row per (child, day, category) with the counters for the matching events
+    is_book = ActivityEvent.media_type == MediaType.BOOK
+    is_video = ActivityEvent.media_type == MediaType.VIDEO
+    duration = func.coalesce(ActivityEvent.duration_seconds, 0)
+    day = func.date(ActivityEvent.occurred_at).label("day")
+    category = func.coalesce(case((is_book, Book.category), else_=Video.category), UNCATEGORISED).label("category")
+
+    return (
+        db.query(
+            ActivityEvent.child_id,
+            day,
+            category,
+            func.count().label("events"),
+            func.sum(case((and_(is_book, ActivityEvent.event_type == ActivityEventType.VIEW), 1), else_=0)).label("books_opened"),
+            func.sum(case((and_(is_video, ActivityEvent.event_type == ActivityEventType.PLAY), 1), else_=0)).label("videos_played"),
+            func.sum(case((ActivityEvent.event_type == ActivityEventType.COMPLETE, 1), else_=0)).label("completed"),
+            func.sum(case((is_book, duration), else_=0)).label("seconds_reading"),
+            func.sum(case((is_video, duration), else_=0)).label("seconds_watching"),
+        )
+        .outerjoin(Book, and_(is_book, Book.id == ActivityEvent.media_id))
+        .outerjoin(Video, and_(is_video, Video.id == ActivityEvent.media_id))
+        .filter(*criteria)
+        .group_by(ActivityEvent.child_id, day, category)
+        .all()
+    )
+
+def _as_date(value) -> date:
+    # func.date() comes back as a date on MySQL and as a string on sqlite
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def _lock_watermark(db: Session) -> RollupWatermark:
+    # FOR UPDATE on the watermark row serialises aggregators running in different workers
+    watermark = db.query(RollupWatermark).filter(RollupWatermark.name == ROLLUP_NAME).with_for_update().first()
+    if not watermark:
+        watermark = RollupWatermark(name=ROLLUP_NAME, last_event_id=0)
+        db.add(watermark)
+        db.flush()
+    return watermark
+
+def _apply(db: Session, rows):
+    # Add aggregated counters onto the existing rollup rows, creating the missing ones
+    if not rows:
+        return
+    keys = {(row.child_id, _as_date(row.day), row.category): row for row in rows}
+    existing = {
+        (rollup.child_id, rollup.day, rollup.category): rollup
+        for rollup in db.query(ChildActivityDaily).filter(
+            ChildActivityDaily.child_id.in_({key[0] for key in keys}),
+            ChildActivityDaily.day.in_({key[1] for key in keys}),
+            ChildActivityDaily.category.in_({key[2] for key in keys}),
+        )
+    }
+    for key, row in keys.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = ChildActivityDaily(child_id=key[0], day=key[1], category=key[2], **{name: 0 for name in COUNTERS})
+            db.add(rollup)
+        for name in COUNTERS:
+            setattr(rollup, name, getattr(rollup, name) + int(getattr(row, name) or 0))
+
+def _settled_max_id(db: Session, after_id: int) -> int:
+    cutoff = datetime.utcnow() - timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+    return db.query(func.max(ActivityEvent.id)).filter(
+        ActivityEvent.id > after_id,
+        ActivityEvent.received_at <= cutoff
+    ).scalar() or after_id
+
+def aggregate_new_events(db: Session) -> int:
+    """
+    Folds events past the watermark into child_activity_daily, at most ROLLUP_BATCH_SIZE ids per call.
+    The counters and the watermark are committed together, so a failed pass is simply retried.
+    Returns the number of events processed.
+    """
+    watermark = _lock_watermark(db)
+    low = watermark.last_event_id
+    high = min(_settled_max_id(db, low), low + ROLLUP_BATCH_SIZE)
+    if high <= low:
+        db.commit()
+        metrics.set_gauge("rollup_lag_events", 0)
+        return 0
+
+    rows = _aggregate(db, ActivityEvent.id > low, ActivityEvent.id <= high)
+    _apply(db, rows)
+    processed = sum(row.events for row in rows)
+    watermark.last_event_id = high
+
+    pending = db.query(func.count(ActivityEvent.id)).filter(ActivityEvent.id > high).scalar()
+    db.commit()
+
+    metrics.inc("rollup_events_processed_total", processed)
+    metrics.set_gauge("rollup_lag_events", pending)
+    return processed
+
+def rebuild_rollups(db: Session, since: Optional[date] = None) -> int:
+    """
+    Recomputes child_activity_daily from the raw events, for every day or only from `since` onwards.
+    Rebuilt days are replaced rather than added to, so running it again gives the same result.
+    Pending events for earlier days are folded in first so nothing is skipped when the watermark moves.
+    Returns the number of rollup rows written.
+    """
+    watermark = _lock_watermark(db)
+    high = db.query(func.max(ActivityEvent.id)).scalar() or 0
+
+    if since is not None:
+        _apply(db, _aggregate(
+            db,
+            ActivityEvent.id > watermark.last_event_id,
+            ActivityEvent.id <= high,
+            ActivityEvent.occurred_at < since
+        ))
+
+    stale = db.query(ChildActivityDaily)
+    if since is not None:
+        stale = stale.filter(ChildActivityDaily.day >= since)
+    stale.delete(synchronize_session=False)
+
+    criteria = [ActivityEvent.id <= high]
+    if since is not None:
+        criteria.append(ActivityEvent.occurred_at >= since)
+    rows = _aggregate(db, *criteria)
+    db.add_all([
+        ChildActivityDaily(
+            child_id=row.child_id,
+            day=_as_date(row.day),
+            category=row.category,
+            **{name: int(getattr(row, name) or 0) for name in COUNTERS}
+        )
+        for row in rows
+    ])
+
+    watermark.last_event_id = high
+    db.commit()
+    return len(rows)
+
+def _totals(counters) -> dict:
+    return {
+        "events": counters["events"],
+        "books_opened": counters["books_opened"],
+        "videos_played": counters["videos_played"],
+        "completed": counters["completed"],
+        "minutes_reading": round(counters["seconds_reading"] / 60, 1),
+        "minutes_watching": round(counters["seconds_watching"] / 60, 1),
+    }
+
+def summarize_activity(rollups, granularity: str = "day") -> dict:
+    """
+    Groups rollup rows into per child periods (a day, or a week starting on Monday) with
+    totals and minutes per category, keyed by child id.
+    """
+    children = defaultdict(lambda: {"totals": defaultdict(int), "periods": {}})
+    for rollup in rollups:
+        child = children[rollup.child_id]
+        start = rollup.day if granularity == "day" else rollup.day - timedelta(days=rollup.day.weekday())
+        period = child["periods"].setdefault(start, {"totals": defaultdict(int), "categories": defaultdict(int)})
+        for name in COUNTERS:
+            value = getattr(rollup, name)
+            child["totals"][name] += value
+            period["totals"][name] += value
+        period["categories"][rollup.category] += rollup.seconds_reading + rollup.seconds_watching
+
+    return {
+        child_id: {
+            "totals": _totals(child["totals"]),
+            "periods": [
+                {
+                    "start": start,
+                    "totals": _totals(period["totals"]),
+                    "categories": [
+                        {"category": category, "minutes": round(seconds / 60, 1)}
+                        for category, seconds in sorted(period["categories"].items(), key=lambda item: -item[1])
+                    ],
+                }
+                for start, period in sorted(child["periods"].items())
+            ],
+        }
+        for child_id, child in children.items()
+    }
+
+
+def aggregate_pending_events() -> int:
+    """
+    Scheduled job (services/jobs.py): runs aggregate_new_events until the backlog is folded in.
+    Returns the number of events processed.
+    """
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            processed = aggregate_new_events(db)
+            total += processed
+            if processed < ROLLUP_BATCH_SIZE:
+                return total
+    finally:
+        db.close()
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import socket
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from db.database import SessionLocal
+from models.tables import JobRun, JobRunStatus
+from services import metrics
+
+# How often every worker tries to become leader and the leader looks for due jobs
+SCHEDULER_TICK_SECONDS = int(os.getenv("SCHEDULER_TICK_SECONDS", 10))
+SCHEDULER_DISABLED = os.getenv("SCHEDULER_DISABLED", "false").lower() == "true"
+
+# Name of the advisory lock the leader holds, change it to run two clusters on one database
+SCHEDULER_LOCK_NAME = os.getenv("SCHEDULER_LOCK_NAME", "dd_bot_scheduler")
+
+# Running jobs get this long to finish when the worker shuts down
+SCHEDULER_SHUTDOWN_SECONDS = 30
+
+WORKER_NAME = f"{socket.gethostname()}:{os.getpid()}"[:100]
+
+metrics.describe("scheduler_leader", "1 if this worker holds the scheduler lock")
+metrics.describe("scheduler_job_runs_total", "Scheduled job runs, by job and status")
+metrics.describe("scheduler_job_duration_seconds", "Duration of the last run of a scheduled job")
+
+
+class CronSchedule:
+    """
+    Five field cron expression: minute hour day-of-month month day-of-week (0 or 7 is Sunday),
+    each field *, a number, a range a-b, a list a,b and an optional /step. Server local time.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.FIELDS)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        # As in cron, with both day fields restricted a day matching either one runs
+        self._any_day, self._any_weekday = fields[2] == "*", fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            part, _, step = part.partition("/")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-"))
+            else:
+                start = end = int(part)
+                if step:
+                    end = high
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step or 1)))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        # Skips whole months / days / hours that can't match instead of testing every minute
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+class Job:
+    def __init__(self, name: str, schedule: str, func: Callable[[], object]):
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.func = func
+        self.next_run = self.schedule.next_after(datetime.now())
+        self.running = False
+
+
+class LeaderLock:
+    """
+    Advisory lock (GET_LOCK on MySQL, pg_try_advisory_lock on PostgreSQL) held on a connection of
+    its own, so only one worker in the cluster runs jobs. The lock goes with the connection:
+    if the leader dies or loses its connection another worker takes over on its next tick.
+    Other databases (sqlite in development) have no advisory locks and every worker leads.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._key = zlib.crc32(name.encode())
+        self._connection: Optional[Connection] = None
+
+    def _query(self, sql: str):
+        return self._connection.execute(text(sql), {"name": self.name, "key": self._key}).scalar()
+
+    def acquire(self, engine: Engine) -> bool:
+        """Returns whether this worker is the leader, taking the lock when it is free."""
+        dialect = engine.dialect.name
+        if dialect not in ("mysql", "postgresql"):
+            return True
+
+        if self._connection is not None:
+            try:
+                if dialect == "mysql":
+                    held = self._query("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()")
+                else:
+                    held = self._query("SELECT 1")
+                if held:
+                    return True
+            except Exception as e:
+                print(f"Scheduler lock connection lost: {e}")
+            self._close()
+
+        try:
+            self._connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            if dialect == "mysql":
+                acquired = self._query("SELECT GET_LOCK(:name, 0)") == 1
+            else:
+                acquired = bool(self._query("SELECT pg_try_advisory_lock(:key)"))
+        except Exception as e:
+            print(f"An error occurred while taking the scheduler lock: {e}")
+            acquired = False
+        if not acquired:
+            self._close()
+        return acquired
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            if self._connection.dialect.name == "mysql":
+                self._query("SELECT RELEASE_LOCK(:name)")
+            else:
+                self._query("SELECT pg_advisory_unlock(:key)")
+        except Exception:
+            pass
+        self._close()
+
+    def _close(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+
+class Scheduler:
+    """
+    Runs maintenance jobs on cron schedules, from the lifespan of every worker. Only the worker
+    holding the LeaderLock runs them, each job in a worker thread so the event loop stays free,
+    and a job still running when it is due again is skipped. Every run is recorded in job_run.
+    Schedules can be changed with env, eg. SCHEDULE_REVIEW_STATS="0 4 * * *" or "off".
+    """
+
+    def __init__(self, lock_name: str = SCHEDULER_LOCK_NAME):
+        self.jobs: Dict[str, Job] = {}
+        self.lock = LeaderLock(lock_name)
+        self.is_leader = False
+        self._task = None
+        self._running: List[asyncio.Task] = []
+
+    def add(self, name: str, schedule: str, func: Callable[[], object]):
+        schedule = os.getenv(f"SCHEDULE_{name.upper().replace('-', '_')}", schedule)
+        if schedule.strip().lower() == "off":
+            return
+        self.jobs[name] = Job(name, schedule, func)
+
+    def start(self, engine: Engine):
+        if not SCHEDULER_DISABLED:
+            self._task = asyncio.create_task(self._run(engine))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.wait(self._running, timeout=SCHEDULER_SHUTDOWN_SECONDS)
+        await asyncio.to_thread(self.lock.release)
+        self.is_leader = False
+
+    async def _run(self, engine: Engine):
+        while True:
+            self.is_leader = await asyncio.to_thread(self.lock.acquire, engine)
+            metrics.set_gauge("scheduler_leader", int(self.is_leader))
+
+            now = datetime.now()
+            for job in self.jobs.values():
+                if job.next_run > now:
+                    continue
+                # Followers move their schedules along too, so a new leader doesn't run a backlog
+                job.next_run = job.schedule.next_after(now)
+                if self.is_leader and not job.running:
+                    job.running = True
+                    task = asyncio.create_task(self._execute(job))
+                    self._running.append(task)
+                    task.add_done_callback(self._running.remove)
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+    async def _execute(self, job: Job):
+        started_at = datetime.utcnow()
+        start = time.monotonic()
+        error = None
+        try:
+            await asyncio.to_thread(job.func)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Scheduled job {job.name} failed: {error}")
+        finally:
+            job.running = False
+
+        duration = time.monotonic() - start
+        status = JobRunStatus.FAILED if error else JobRunStatus.SUCCEEDED
+        metrics.inc("scheduler_job_runs_total", job=job.name, status=status.value)
+        metrics.set_gauge("scheduler_job_duration_seconds", round(duration, 3), job=job.name)
+        try:
+            await asyncio.to_thread(record_run, job.name, status, started_at, duration, error)
+        except Exception as e:
+            print(f"An error occurred while recording the run of {job.name}: {e}")
+
+
+def record_run(job_name: str, status: JobRunStatus, started_at: datetime, duration: float, error: Optional[str]):
+    db = SessionLocal()
+    try:
+        db.add(JobRun(
+            job_name=job_name,
+            status=status,
+            started_at=started_at,
+            finished_at=started_at + timedelta(seconds=duration),
+            duration_ms=int(duration * 1000),
+            error=error,
+            worker=WORKER_NAME
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+scheduler = Scheduler()
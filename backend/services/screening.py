@@ -0,0 +1,118 @@
+import os
+import re
+from collections import deque
+from typing import Iterable, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCKLIST_FILE = os.getenv("SCREENING_BLOCKLIST", os.path.join(BASE_DIR, "screening_blocklist.txt"))
+ALLOWLIST_FILE = os.getenv("SCREENING_ALLOWLIST", os.path.join(BASE_DIR, "screening_allowlist.txt"))
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    # Lowercase, collapse punctuation to single spaces and pad, so " term " only matches whole words
+    return " " + _NON_WORD.sub(" ", text.lower()).strip() + " "
+
+
+def load_terms(path: str) -> List[str]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+class AhoCorasick:
+    """
+    Multi pattern matcher. Built once, then every search is a single pass over the text,
+    so the cost stays linear in the text length no matter how many terms there are.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = next_node
+            self._out[node].append(pattern)
+
+        # Breadth first pass to set the failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def search(self, text: str):
+        """Yields (start, end, pattern) for every match, end is exclusive."""
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern in out[node]:
+                yield index + 1 - len(pattern), index + 1, pattern
+
+
+class ContentScreener:
+    """
+    Flags text that contains a blocklisted term. Allowlisted phrases (eg. "root beer")
+    cover the blocked terms inside them, so those don't count.
+    """
+
+    def __init__(self, blocklist: Iterable[str], allowlist: Iterable[str] = ()):
+        self._blocked = {normalize(term) for term in blocklist if normalize(term).strip()}
+        self._allowed = {normalize(term) for term in allowlist if normalize(term).strip()}
+        self._matcher = AhoCorasick(self._blocked | self._allowed)
+
+    def screen(self, *texts: Optional[str]) -> List[str]:
+        """Returns the blocked terms found in the texts, an empty list means the content is clean."""
+        found = []
+        for text in texts:
+            if not text:
+                continue
+            blocked_matches = []
+            allowed_spans = []
+            for start, end, pattern in self._matcher.search(normalize(text)):
+                if pattern in self._allowed:
+                    allowed_spans.append((start, end))
+                if pattern in self._blocked:
+                    blocked_matches.append((start, end, pattern))
+
+            for start, end, pattern in blocked_matches:
+                covered = any(a_start <= start and end <= a_end for a_start, a_end in allowed_spans)
+                term = pattern.strip()
+                if not covered and term not in found:
+                    found.append(term)
+        return found
+
+
+_default_screener = None
+
+
+def get_screener() -> ContentScreener:
+    # Built on first use and shared, building the automaton is the expensive part
+    global _default_screener
+    if _default_screener is None:
+        _default_screener = ContentScreener(load_terms(BLOCKLIST_FILE), load_terms(ALLOWLIST_FILE))
+    return _default_screener
+
+
+def screen_media(title: Optional[str], description: Optional[str]) -> List[str]:
+    return get_screener().screen(title, description)
@@ -0,0 +1,151 @@
+import enum
+import json
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import Integer, String, TEXT, FLOAT, Boolean, DateTime, DATE, Enum
+
+from db.database import engine
+from services.export import EXPORT_COLUMNS, EXPORT_BATCH_SIZE, build_export_query
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+except ImportError:  # only needed when a snapshot is written
+    pa = None
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_FORMATS = ("parquet", "arrow")
+SNAPSHOT_TABLES = ("books", "videos", "reviews", "users")
+
+
+def _arrow_type(column):
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, FLOAT):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, DATE):
+        return pa.date32()
+    if isinstance(column_type, (Enum, String, TEXT)):
+        return pa.string()
+    raise TypeError(f"No arrow type for column {column.key} ({column_type})")
+
+
+def arrow_schema(table: str):
+    return pa.schema([pa.field(column.key, _arrow_type(column)) for column in EXPORT_COLUMNS[table]])
+
+
+def _arrow_value(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def _partition_dir(table: str, row) -> str:
+    # Reviews are split by type and month so analysis jobs only open the files they need
+    if table != "reviews":
+        return ""
+    created = row.created_at.strftime("%Y-%m") if row.created_at else "unknown"
+    return os.path.join(f"review_type={_arrow_value(row.review_type)}", f"created_month={created}")
+
+
+class _PartitionWriter:
+    def __init__(self, path: str, schema, file_format: str, compression: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if file_format == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression=compression)
+        else:
+            options = ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+            self._writer = ipc.new_file(path, schema, options=options)
+        self.rows = 0
+
+    def write(self, batch):
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self._writer.close()
+
+
+# Columns stored in the folder names (hive style) instead of inside the files
+PARTITION_COLUMNS = {"reviews": ["review_type"]}
+
+
+def _write_table(conn, table: str, table_dir: str, file_format: str, compression: str) -> dict:
+    schema = arrow_schema(table)
+    for name in PARTITION_COLUMNS.get(table, []):
+        schema = schema.remove(schema.get_field_index(name))
+    keys = schema.names
+    extension = "parquet" if file_format == "parquet" else "arrow"
+    writers = {}
+
+    result = conn.execute(build_export_query(table).execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    try:
+        for rows in result.partitions():
+            grouped = defaultdict(list)
+            for row in rows:
+                grouped[_partition_dir(table, row)].append(row)
+
+            for partition, partition_rows in grouped.items():
+                writer = writers.get(partition)
+                if writer is None:
+                    path = os.path.join(table_dir, partition, f"part-0.{extension}")
+                    writer = writers[partition] = _PartitionWriter(path, schema, file_format, compression)
+                columns = {key: [_arrow_value(getattr(row, key)) for row in partition_rows] for key in keys}
+                writer.write(pa.RecordBatch.from_pydict(columns, schema=schema))
+        if not writers:
+            # Empty table, still write a file so readers always find the schema
+            path = os.path.join(table_dir, f"part-0.{extension}")
+            writers[""] = _PartitionWriter(path, schema, file_format, compression)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return {partition or ".": writer.rows for partition, writer in writers.items()}
+
+
+def write_snapshot(out_dir: str = SNAPSHOT_DIR, file_format: str = "parquet", compression: str = "zstd") -> str:
+    """
+    Write books, videos, reviews and users to columnar files under out_dir/<snapshot id>/.
+    All tables are read inside one REPEATABLE READ transaction so they agree with each other.
+    Rows are read in batches of EXPORT_BATCH_SIZE, the tables are never loaded whole.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for snapshots, install it with: pip install pyarrow")
+    if file_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format '{file_format}', expected one of {SNAPSHOT_FORMATS}")
+
+    # Microseconds plus a random suffix, so snapshots started together (two admins, a worker and the CLI)
+    # never share a directory. Ids still sort by start time.
+    snapshot_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}-{uuid.uuid4().hex[:6]}"
+    final_dir = os.path.join(out_dir, snapshot_id)
+    tmp_dir = final_dir + ".tmp"
+    manifest = {"snapshot_id": snapshot_id, "format": file_format, "compression": compression, "tables": {}}
+
+    conn = engine.connect()
+    if engine.dialect.name == "mysql":
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+    try:
+        with conn.begin():
+            for table in SNAPSHOT_TABLES:
+                manifest["tables"][table] = _write_table(conn, table, os.path.join(tmp_dir, table), file_format, compression)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+
+    with open(os.path.join(tmp_dir, "_manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Readers only ever see complete snapshots
+    os.rename(tmp_dir, final_dir)
+    print(f"Snapshot written to {final_dir}")
+    return final_dir
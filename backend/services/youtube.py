@@ -0,0 +1,323 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from sqlalchemy import inspect, or_, text, update
+from sqlalchemy.orm import Session
+
+from models.tables import FlaggedMedia, HarvestWatermark, MediaType, Video
+from services.age_range import age_range_fields
+from services.dedup import get_index, index_media
+from services.screening import screen_media
+from services import metrics
+from services.cache import cache
+
+# Point YOUTUBE_API_URL at a local fake to run without the real API
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3")
+YOUTUBE_TIMEOUT_SECONDS = 15
+
+# videos.list takes at most 50 ids per call (1 quota unit each call)
+DETAILS_BATCH_SIZE = 50
+
+# Video details are re-fetched once they are this old, view counts keep moving
+ENRICH_STALE_DAYS = int(os.getenv("VIDEO_ENRICH_STALE_DAYS", 7))
+
+# Details fetched within this long are served from memory, eg. when a run is retried
+DETAILS_CACHE_TTL_SECONDS = 6 * 3600
+DETAILS_CACHE_MAX_ENTRIES = 50_000
+
+# Video rows read and written per batch while enriching
+ENRICH_BATCH_SIZE = 500
+
+# Search queries harvested by the youtube-refresh job, comma separated
+YOUTUBE_SEARCH_QUERIES = [query.strip() for query in os.getenv("YOUTUBE_SEARCH_QUERIES", "educational kids videos").split(",") if query.strip()]
+
+# Every query is walked in full this often to pick up what the incremental runs can't see
+# (older videos newly ranking for the query), otherwise only videos newer than the watermark
+YOUTUBE_FULL_SYNC_DAYS = int(os.getenv("YOUTUBE_FULL_SYNC_DAYS", 30))
+
+# publishedAfter is set this far before the watermark, videos can show up in search a while after publishing
+WATERMARK_OVERLAP = timedelta(hours=6)
+
+VIDEO_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+DURATION_PATTERN = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+metrics.describe("youtube_api_calls_total", "Calls made to the YouTube Data API, by endpoint")
+metrics.describe("video_enrichment_total", "Videos updated by the enrichment, by outcome")
+metrics.describe("youtube_harvest_videos_total", "Search results seen by the YouTube refresh, by outcome")
+
+
+def video_id_from_link(link: str) -> Optional[str]:
+    # watch?v=, youtu.be/, /shorts/ and /embed/ links -> the 11 character video id
+    parts = urlsplit(link)
+    host = (parts.hostname or "").lower()
+    candidate = None
+    if host == "youtu.be":
+        candidate = parts.path.strip("/").split("/")[0]
+    elif host.endswith("youtube.com"):
+        if parts.path == "/watch":
+            candidate = parse_qs(parts.query).get("v", [None])[0]
+        elif parts.path.startswith(("/shorts/", "/embed/", "/live/")):
+            candidate = parts.path.split("/")[2]
+    return candidate if candidate and VIDEO_ID_PATTERN.match(candidate) else None
+
+def parse_duration(value: Optional[str]) -> Optional[int]:
+    # ISO 8601 durations as returned by contentDetails, eg. PT1H2M3S -> 3723
+    match = DURATION_PATTERN.match(value or "")
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    # "2024-05-01T12:00:00Z" -> naive UTC, like the other DateTime columns
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+def _thumbnail(thumbnails: dict) -> Optional[str]:
+    for size in ("high", "medium", "default"):
+        if size in thumbnails:
+            return thumbnails[size]["url"]
+    return None
+
+
+class YouTubeClient:
+    """
+    Small YouTube Data API client on one pooled httpx.Client. Pass a transport
+    (eg. httpx.MockTransport) or a base_url to run it against a fake.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = YOUTUBE_API_URL, transport: Optional[httpx.BaseTransport] = None):
+        self.api_key = api_key or os.getenv("API_KEY")
+        self._client = httpx.Client(base_url=base_url, timeout=YOUTUBE_TIMEOUT_SECONDS, transport=transport)
+        self._details = OrderedDict()  # video id -> (expires_at, item or None)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._client.close()
+
+    def get(self, endpoint: str, **params) -> dict:
+        metrics.inc("youtube_api_calls_total", endpoint=endpoint)
+        response = self._client.get(f"/{endpoint}", params={**params, "key": self.api_key})
+        response.raise_for_status()
+        return response.json()
+
+    def video_details(self, video_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """
+        videos.list for the given ids, DETAILS_BATCH_SIZE per call. Ids the API doesn't return
+        (removed or private videos) map to None.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for video_id in video_ids:
+                entry = self._details.get(video_id)
+                if entry and entry[0] > now:
+                    found[video_id] = entry[1]
+                else:
+                    missing.append(video_id)
+
+        for start in range(0, len(missing), DETAILS_BATCH_SIZE):
+            batch = missing[start:start + DETAILS_BATCH_SIZE]
+            items = self.get("videos", part="contentDetails,statistics,snippet", id=",".join(batch), maxResults=DETAILS_BATCH_SIZE).get("items", [])
+            fetched = {item["id"]: item for item in items}
+            with self._lock:
+                for video_id in batch:
+                    found[video_id] = fetched.get(video_id)
+                    self._details[video_id] = (now + DETAILS_CACHE_TTL_SECONDS, found[video_id])
+                    self._details.move_to_end(video_id)
+                while len(self._details) > DETAILS_CACHE_MAX_ENTRIES:
+                    self._details.popitem(last=False)
+        return found
+
+
+def details_to_columns(item: dict) -> dict:
+    snippet = item.get("snippet", {})
+    statistics = item.get("statistics", {})
+    return {
+        "duration_seconds": parse_duration(item.get("contentDetails", {}).get("duration")),
+        "view_count": int(statistics["viewCount"]) if "viewCount" in statistics else None,
+        "like_count": int(statistics["likeCount"]) if "likeCount" in statistics else None,
+        "thumbnail_url": _thumbnail(snippet.get("thumbnails", {})),
+        "published_at": parse_timestamp(snippet.get("publishedAt")),
+    }
+
+def enrich_videos(db: Session, client: YouTubeClient, stale_days: int = ENRICH_STALE_DAYS) -> Dict[str, int]:
+    """
+    Fills duration / statistics / thumbnail for videos never enriched or enriched more than
+    stale_days ago. Rows are read in id order ENRICH_BATCH_SIZE at a time, looked up
+    DETAILS_BATCH_SIZE ids per API call and written back with one bulk UPDATE per batch.
+    Videos the API no longer returns keep their old values and are only stamped, the link
+    checker takes care of hiding them. Returns the number of videos per outcome.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=stale_days)
+    counts = {"enriched": 0, "not_found": 0, "not_youtube": 0}
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Video.id, Video.link)
+            .filter(Video.id > last_id, or_(Video.enriched_at.is_(None), Video.enriched_at < cutoff))
+            .order_by(Video.id)
+            .limit(ENRICH_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        ids = {row.id: video_id_from_link(row.link) for row in rows}
+        details = client.video_details(video_id for video_id in ids.values() if video_id)
+        now = datetime.utcnow()
+        updates = []
+        for row_id, video_id in ids.items():
+            item = details.get(video_id) if video_id else None
+            if item:
+                outcome = "enriched"
+                updates.append({"id": row_id, "enriched_at": now, **details_to_columns(item)})
+            else:
+                outcome = "not_found" if video_id else "not_youtube"
+                updates.append({"id": row_id, "enriched_at": now})
+            counts[outcome] += 1
+            metrics.inc("video_enrichment_total", outcome=outcome)
+
+        db.execute(update(Video), updates)
+        db.commit()
+    if counts["enriched"]:
+        # Durations feed the max_minutes filter of the listings
+        cache.invalidate("videos")
+    return counts
+
+
+# ------------------------------- HARVEST ------------------------------- #
+def watch_link(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def _known_links(db: Session, links: List[str]) -> set:
+    # Already in the catalog or waiting in the screening queue, one IN query each per page
+    known = {link for (link,) in db.query(Video.link).filter(Video.link.in_(links))}
+    known |= {link for (link,) in db.query(FlaggedMedia.link).filter(FlaggedMedia.link.in_(links))}
+    return known
+
+def _add_video(db: Session, item: dict) -> str:
+    snippet = item["snippet"]
+    video = {
+        "title": snippet["title"],
+        "creator": snippet["channelTitle"],
+        **age_range_fields("5-12"),
+        "category": "Educational",
+        "description": snippet.get("description", ""),
+        "link": watch_link(item["id"]["videoId"]),
+        "rating": 0,
+        "source": "YouTube",
+    }
+
+    # Anything matching the blocklist or looking like a video we already have waits for an admin
+    matched_terms = screen_media(video["title"], video["description"])
+    if not matched_terms:
+        matched_terms = [
+            f"possible duplicate of video #{video_id}"
+            for video_id, score in get_index(Video).find(video["title"], video["creator"], video["description"])[:3]
+        ]
+    if matched_terms:
+        db.add(FlaggedMedia(
+            media_type=MediaType.VIDEO,
+            title=video["title"],
+            link=video["link"],
+            matched_terms=", ".join(matched_terms)[:500],
+            payload=json.dumps(video)
+        ))
+        return "flagged"
+
+    new_video = Video(**video, published_at=parse_timestamp(snippet.get("publishedAt")))
+    db.add(new_video)
+    db.flush()
+    index_media(Video, new_video)
+    return "added"
+
+def harvest_videos(db: Session, client: YouTubeClient, query: str, full: Optional[bool] = None) -> Dict[str, int]:
+    """
+    Adds the search results for query that aren't in the catalog yet, each page committed as it goes.
+    Incremental runs ask for videos published after the query's watermark, newest first, and stop
+    at the first page without anything new, so they cost about one page per run. A full run (when
+    forced, or every YOUTUBE_FULL_SYNC_DAYS) walks every page like the original script did.
+    Returns the number of results per outcome.
+    """
+    watermark = db.get(HarvestWatermark, query)
+    if watermark is None:
+        watermark = HarvestWatermark(query=query)
+        db.add(watermark)
+    now = datetime.utcnow()
+    if full is None:
+        full = (
+            watermark.newest_published_at is None
+            or watermark.last_full_sync_at is None
+            or watermark.last_full_sync_at < now - timedelta(days=YOUTUBE_FULL_SYNC_DAYS)
+        )
+
+    params = {"part": "snippet", "q": query, "type": "video", "maxResults": 50}
+    if not full:
+        published_after = watermark.newest_published_at - WATERMARK_OVERLAP
+        params.update(order="date", publishedAfter=published_after.strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+    counts = {"added": 0, "flagged": 0, "known": 0, "pages": 0}
+    newest = watermark.newest_published_at
+    page_token = None
+    while True:
+        response = client.get("search", **params, **({"pageToken": page_token} if page_token else {}))
+        items = [item for item in response.get("items", []) if item.get("id", {}).get("videoId")]
+        counts["pages"] += 1
+        if not items:
+            break
+
+        known = _known_links(db, [watch_link(item["id"]["videoId"]) for item in items])
+        new_items = 0
+        for item in items:
+            published_at = parse_timestamp(item["snippet"].get("publishedAt"))
+            if published_at and (newest is None or published_at > newest):
+                newest = published_at
+            if watch_link(item["id"]["videoId"]) in known:
+                outcome = "known"
+            else:
+                outcome = _add_video(db, item)
+                known.add(watch_link(item["id"]["videoId"]))
+                new_items += 1
+            counts[outcome] += 1
+            metrics.inc("youtube_harvest_videos_total", outcome=outcome)
+        db.commit()
+
+        page_token = response.get("nextPageToken")
+        if not page_token or (not full and not new_items):
+            break
+
+    # Only moved once every page is in, a run failing partway starts from the old watermark next time
+    watermark.newest_published_at = newest
+    if full:
+        watermark.last_full_sync_at = now
+    db.commit()
+    if counts["added"]:
+        cache.invalidate("videos")
+    return counts
+
+
+def add_enrichment_columns(db: Session):
+    # create_all doesn't alter existing tables, so add the enrichment columns on older databases
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns("video")}
+    if "duration_seconds" not in columns:
+        db.execute(text("ALTER TABLE video ADD COLUMN duration_seconds INTEGER NULL"))
+        db.execute(text("ALTER TABLE video ADD COLUMN view_count BIGINT NULL"))
+        db.execute(text("ALTER TABLE video ADD COLUMN like_count BIGINT NULL"))
+        db.execute(text("ALTER TABLE video ADD COLUMN thumbnail_url VARCHAR(500) NULL"))
+        db.execute(text("ALTER TABLE video ADD COLUMN published_at DATETIME NULL"))
+        db.execute(text("ALTER TABLE video ADD COLUMN enriched_at DATETIME NULL"))
+        db.execute(text("CREATE INDEX ix_video_duration ON video (duration_seconds)"))
+        print("Added the enrichment columns to video")
+    db.commit()
@@ -26,4 +26,37 @@ api.interceptors.request.use(
     }
 );
 
-export default api;
+// Response interceptor: when the access token has expired, swap the refresh token
+// for a new pair once and retry the request instead of sending the user back to login
+let refreshRequest = null;
+
+api.interceptors.response.use(
+    (response) => response,
+    async (error) => {
+        const original = error.config;
+        const refreshToken = localStorage.getItem('refreshToken');
+
+        if (error.response?.status !== 401 || !refreshToken || original._retried || original.url === '/auth/refresh') {
+            return Promise.reject(error);
+        }
+        original._retried = true;
+
+        try {
+            // Several requests can fail together, they all wait on the same refresh
+            refreshRequest = refreshRequest || api.post('/auth/refresh', { refresh_token: refreshToken });
+            const { data } = await refreshRequest;
+            localStorage.setItem('accessToken', data.access_token);
+            localStorage.setItem('refreshToken', data.refresh_token);
+        } catch (refreshError) {
+            localStorage.removeItem('refreshToken');
+            return Promise.reject(error);
+        } finally {
+            refreshRequest = null;
+        }
+
+        original.headers.Authorization = `Bearer ${localStorage.getItem('accessToken')}`;
+        return api(original);
+    }
+);
+
+export default api;
\ No newline at end of file
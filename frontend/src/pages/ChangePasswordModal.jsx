@@ -27,6 +27,11 @@ function ChangePasswordModal({ userId, username, onClose }) {
 
         try {
             const response = await api.patch(`/users/change-password/${userId}`, passwordData);
+            // Changing the password revokes old tokens, keep this session going with the new one
+            if (response.data.access_token) {
+                localStorage.setItem('accessToken', response.data.access_token);
+                localStorage.setItem('refreshToken', response.data.refresh_token);
+            }
             setSuccess(response.data.message || 'Password updated successfully!');
             setTimeout(() => {
                 onClose();
@@ -14,22 +14,28 @@ function AddBookModal({ onClose, onBookAdded }) {
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
     const [isSubmitting, setIsSubmitting] = useState(false);
+    // Set when the server took the item for a near duplicate, the librarian can still add it
+    const [isDuplicate, setIsDuplicate] = useState(false);
 
     const handleChange = (e) => {
         setFormData({ ...formData, [e.target.name]: e.target.value });
         setError('');
         setSuccess('');
+        setIsDuplicate(false);
     };
 
-    const handleSubmit = async (e) => {
-        e.preventDefault();
+    const submit = async (force) => {
         setError('');
         setSuccess('');
+        setIsDuplicate(false);
         setIsSubmitting(true);
 
         try {
-            await api.post('/librarian/add-book', formData);
-            setSuccess(`'${formData.title}' has been added successfully.`);
+            const response = await api.post('/librarian/add-book', formData, { params: force ? { force: true } : {} });
+            // 202 means the item was held back for admin review by the content screening
+            setSuccess(response.status === 202
+                ? response.data.message
+                : `'${formData.title}' has been added successfully.`);
             onBookAdded();
             setFormData({
                 title: '', author: '', link: '', age_group: '',
@@ -39,11 +45,17 @@ function AddBookModal({ onClose, onBookAdded }) {
         } catch (err) {
             const detail = err.response?.data?.detail || 'Failed to add book. Please check the fields.';
             setError(detail);
+            setIsDuplicate(err.response?.status === 409);
         } finally {
             setIsSubmitting(false);
         }
     };
 
+    const handleSubmit = (e) => {
+        e.preventDefault();
+        submit(false);
+    };
+
     return (
         <div className="modal-overlay">
             <div className="add-book-modal">
@@ -85,6 +97,9 @@ function AddBookModal({ onClose, onBookAdded }) {
                     
                     <div className="modal-actions">
                         <button type="button" className="btn-cancel" onClick={onClose} disabled={isSubmitting}>Close</button>
+                        {isDuplicate && (
+                            <button type="button" className="btn-cancel" onClick={() => submit(true)} disabled={isSubmitting}>Add Anyway</button>
+                        )}
                         <button type="submit" className="btn-save" disabled={isSubmitting}>
                             {isSubmitting ? 'Adding...' : 'Add Book'}
                         </button>
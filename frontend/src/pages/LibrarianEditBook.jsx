@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import api from '../api/axiosConfig';
 import '../styles/LibrarianEditMedia.css'; // shared CSS file
 
@@ -12,7 +12,17 @@ function EditBookModal({ book, onClose, onUpdate, onDelete }) {
         description: book.description || '',
     });
     const [error, setError] = useState('');
-    const [isSaving, setIsSaving] = useState(false);
+    // Saving stays disabled until the description has loaded so it can't be overwritten with ''
+    const [isSaving, setIsSaving] = useState(book.description === undefined);
+
+    // List pages don't load the description, fetch the full record before editing
+    useEffect(() => {
+        if (book.description !== undefined) return;
+        api.get(`/librarian/books/${book.id}`)
+            .then((response) => setFormData((prev) => ({ ...prev, description: response.data.description || '' })))
+            .catch(() => setError('Failed to load description.'))
+            .finally(() => setIsSaving(false));
+    }, [book]);
 
     const handleChange = (e) => {
         setFormData({ ...formData, [e.target.name]: e.target.value });
@@ -24,7 +34,12 @@ function EditBookModal({ book, onClose, onUpdate, onDelete }) {
         setError('');
         try {
             const response = await api.patch(`/librarian/edit-book/${book.id}`, formData);
-            onUpdate(response.data);
+            if (response.status === 202) {
+                // The edit failed content screening, the book stays as it was until an admin reviews the changes
+                window.alert(response.data.message);
+            } else {
+                onUpdate(response.data);
+            }
             onClose();
         } catch (err) {
             setError(err.response?.data?.detail || 'Failed to save changes.');
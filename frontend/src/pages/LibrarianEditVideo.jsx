@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import api from '../api/axiosConfig';
 import '../styles/LibrarianEditMedia.css'; 
 
@@ -12,7 +12,17 @@ function EditVideoModal({ video, onClose, onUpdate, onDelete }) {
         description: video.description || '',
     });
     const [error, setError] = useState('');
-    const [isSaving, setIsSaving] = useState(false);
+    // Saving stays disabled until the description has loaded so it can't be overwritten with ''
+    const [isSaving, setIsSaving] = useState(video.description === undefined);
+
+    // List pages don't load the description, fetch the full record before editing
+    useEffect(() => {
+        if (video.description !== undefined) return;
+        api.get(`/librarian/videos/${video.id}`)
+            .then((response) => setFormData((prev) => ({ ...prev, description: response.data.description || '' })))
+            .catch(() => setError('Failed to load description.'))
+            .finally(() => setIsSaving(false));
+    }, [video]);
 
     const handleChange = (e) => {
         setFormData({ ...formData, [e.target.name]: e.target.value });
@@ -24,7 +34,12 @@ function EditVideoModal({ video, onClose, onUpdate, onDelete }) {
         setError('');
         try {
             const response = await api.patch(`/librarian/edit-video/${video.id}`, formData);
-            onUpdate(response.data);
+            if (response.status === 202) {
+                // The edit failed content screening, the video stays as it was until an admin reviews the changes
+                window.alert(response.data.message);
+            } else {
+                onUpdate(response.data);
+            }
             onClose();
         } catch (err) {
             setError(err.response?.data?.detail || 'Failed to save changes.');
@@ -47,6 +47,7 @@ function ViewAllBooks() {
                 size: 10,
                 search: debouncedSearchTerm,
                 source: sourceFilter,
+                include_dead: true, // librarians still see items with a dead link so they can fix them
             };
             const response = await api.get('/librarian/view-all-books', { params });
             setBooks(response.data.items || []);
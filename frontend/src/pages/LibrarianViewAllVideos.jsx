@@ -51,6 +51,7 @@ function ViewAllVideos() {
                 size: 10,
                 search: debouncedSearchTerm,
                 source: sourceFilter, // Add source to API params
+                include_dead: true, // librarians still see items with a dead link so they can fix them
             };
             const response = await api.get('/librarian/view-all-videos', { params });
             setVideos(response.data.items || []);
@@ -36,6 +36,7 @@ function Login() {
             setError("Login successful, but failed to load profile.");
             // Clear token if the profile fetch fails (security measure)
             localStorage.removeItem('accessToken'); 
+            localStorage.removeItem('refreshToken');
             localStorage.removeItem('tokenType');
             localStorage.removeItem('userRole');
         }
@@ -59,10 +60,11 @@ function Login() {
                 }
             });
 
-            const { access_token, token_type, user_role } = tokenResponse.data;
+            const { access_token, token_type, user_role, refresh_token } = tokenResponse.data;
             
             // 2. Store minimal token info
             localStorage.setItem('accessToken', access_token);
+            localStorage.setItem('refreshToken', refresh_token); // Used to renew the access token without logging in again
             localStorage.setItem('tokenType', token_type);
             localStorage.setItem('userRole', user_role); // Store role for immediate routing
             
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback } from 'react';
 import api from '../api/axiosConfig';
 import '../styles/ParentSearchMedia.css'; 
 import ParentViewBookModal from './ParentViewBookModal';
+import SearchFacets from './SearchFacets';
 
 // A debounce hook to prevent API calls on every keystroke
 const useDebounce = (value, delay) => {
@@ -21,6 +22,8 @@ function ParentSearchBooks() {
     const [currentPage, setCurrentPage] = useState(1);
     const [totalPages, setTotalPages] = useState(0);
     const debouncedSearchTerm = useDebounce(searchTerm, 500);
+    const [filters, setFilters] = useState({});
+    const [facets, setFacets] = useState(null);
     const [viewingBook, setViewingBook] = useState(null);
 
     const fetchBooks = useCallback(async () => {
@@ -30,18 +33,24 @@ function ParentSearchBooks() {
                 page: currentPage,
                 size: 10,
                 search: debouncedSearchTerm,
+                source: filters.source,
+                category: filters.category,
+                age_band: filters.age_band,
+                min_rating: filters.rating,
+                facets: true,
             };
             const response = await api.get('/librarian/view-all-books', { params });
             setBooks(response.data.items || []);
+            setFacets(response.data.facets || null);
             setTotalPages(Math.ceil(response.data.total / params.size));
         } catch (err) {
             setError('Could not load books.');
         } finally {
             setLoading(false);
         }
-    }, [currentPage, debouncedSearchTerm]);
+    }, [currentPage, debouncedSearchTerm, filters]);
 
-    useEffect(() => { setCurrentPage(1); }, [debouncedSearchTerm]);
+    useEffect(() => { setCurrentPage(1); }, [debouncedSearchTerm, filters]);
     useEffect(() => { fetchBooks(); }, [fetchBooks]);
 
     return (
@@ -55,6 +64,11 @@ function ParentSearchBooks() {
                     onChange={(e) => setSearchTerm(e.target.value)}
                 />
             </div>
+            <SearchFacets
+                facets={facets}
+                filters={filters}
+                onChange={(key, value) => setFilters(current => ({ ...current, [key]: value }))}
+            />
 
             {loading ? (
                 <div className="loading-state">Loading books...</div>
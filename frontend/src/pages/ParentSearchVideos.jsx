@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback } from 'react';
 import api from '../api/axiosConfig';
 import '../styles/ParentSearchMedia.css';
 import ParentViewVideoModal from './ParentViewVideoModal';
+import SearchFacets from './SearchFacets';
 
 const useDebounce = (value, delay) => {
     const [debouncedValue, setDebouncedValue] = useState(value);
@@ -20,6 +21,8 @@ function ParentSearchVideos() {
     const [currentPage, setCurrentPage] = useState(1);
     const [totalPages, setTotalPages] = useState(0);
     const debouncedSearchTerm = useDebounce(searchTerm, 500);
+    const [filters, setFilters] = useState({});
+    const [facets, setFacets] = useState(null);
 
     const [viewingVideo, setViewingVideo] = useState(null);
 
@@ -30,18 +33,24 @@ function ParentSearchVideos() {
                 page: currentPage,
                 size: 10,
                 search: debouncedSearchTerm,
+                source: filters.source,
+                category: filters.category,
+                age_band: filters.age_band,
+                min_rating: filters.rating,
+                facets: true,
             };
             const response = await api.get('/librarian/view-all-videos', { params });
             setVideos(response.data.items || []);
+            setFacets(response.data.facets || null);
             setTotalPages(Math.ceil(response.data.total / params.size));
         } catch (err) {
             setError('Could not load videos.');
         } finally {
             setLoading(false);
         }
-    }, [currentPage, debouncedSearchTerm]);
+    }, [currentPage, debouncedSearchTerm, filters]);
 
-    useEffect(() => { setCurrentPage(1); }, [debouncedSearchTerm]);
+    useEffect(() => { setCurrentPage(1); }, [debouncedSearchTerm, filters]);
     useEffect(() => { fetchVideos(); }, [fetchVideos]);
 
     return (
@@ -55,6 +64,11 @@ function ParentSearchVideos() {
                     onChange={(e) => setSearchTerm(e.target.value)}
                 />
             </div>
+            <SearchFacets
+                facets={facets}
+                filters={filters}
+                onChange={(key, value) => setFilters(current => ({ ...current, [key]: value }))}
+            />
 
             {loading ? ( <div className="loading-state">Loading videos...</div> ) : 
              error ? ( <div className="error-state">{error}</div> ) : (
@@ -1,7 +1,18 @@
-import React from 'react';
+import React, { useState, useEffect } from 'react';
+import api from '../api/axiosConfig';
 import '../styles/ParentViewBookModal.css'; // We will create this CSS file next
 
 function ParentViewBookModal({ book, onClose }) {
+    // List pages don't load the description, fetch the full record when the modal opens
+    const [description, setDescription] = useState(book.description);
+
+    useEffect(() => {
+        if (book.description !== undefined) return;
+        api.get(`/librarian/books/${book.id}`)
+            .then((response) => setDescription(response.data.description))
+            .catch(() => setDescription(null));
+    }, [book]);
+
     return (
         <div className="modal-overlay">
             <div className="view-book-modal">
@@ -24,7 +35,7 @@ function ParentViewBookModal({ book, onClose }) {
                     </div>
                     <div className="detail-item">
                         <label>Description</label>
-                        <p>{book.description || 'No description available.'}</p>
+                        <p>{description === undefined ? 'Loading...' : (description || 'No description available.')}</p>
                     </div>
                 </div>
                 <div className="modal-footer">
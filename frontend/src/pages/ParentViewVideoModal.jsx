@@ -1,7 +1,18 @@
-import React from 'react';
+import React, { useState, useEffect } from 'react';
+import api from '../api/axiosConfig';
 import '../styles/ParentViewVideoModal.css'; // We will create this CSS file next
 
 function ParentViewVideoModal({ video, onClose }) {
+    // List pages don't load the description, fetch the full record when the modal opens
+    const [description, setDescription] = useState(video.description);
+
+    useEffect(() => {
+        if (video.description !== undefined) return;
+        api.get(`/librarian/videos/${video.id}`)
+            .then((response) => setDescription(response.data.description))
+            .catch(() => setDescription(null));
+    }, [video]);
+
     // Helper to create a clean embeddable YouTube URL
     const getEmbedUrl = (url) => {
         try {
@@ -50,7 +61,7 @@ function ParentViewVideoModal({ video, onClose }) {
                     </div>
                     <div className="detail-item">
                         <label>Description</label>
-                        <p>{video.description || 'No description available.'}</p>
+                        <p>{description === undefined ? 'Loading...' : (description || 'No description available.')}</p>
                     </div>
                 </div>
             </div>
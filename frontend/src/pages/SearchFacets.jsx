@@ -0,0 +1,51 @@
+import React from 'react';
+
+// Facet dropdowns for the parent search pages, each option shows how many items it would leave.
+// `facets` is the facets object of the listing response, `filters` the selected value per facet.
+const FACETS = [
+    { key: 'source', label: 'Source' },
+    { key: 'category', label: 'Category' },
+    { key: 'age_band', label: 'Ages' },
+    { key: 'rating', label: 'Rating' },
+];
+
+const AGE_BAND_ORDER = ['0-2', '3-5', '6-8', '9-12', '13+'];
+const RATING_ORDER = ['4+', '3+', '2+', '1+'];
+
+const sortedValues = (key, counts) => {
+    const values = Object.keys(counts);
+    if (key === 'age_band') return AGE_BAND_ORDER.filter(value => value in counts);
+    if (key === 'rating') return RATING_ORDER.filter(value => value in counts);
+    return values.sort();
+};
+
+function SearchFacets({ facets, filters, onChange }) {
+    if (!facets) return null;
+
+    return (
+        <div className="facet-bar">
+            {FACETS.map(({ key, label }) => {
+                const counts = facets[key] || {};
+                const selected = filters[key] || '';
+                return (
+                    <label key={key} className="facet">
+                        <span>{label}</span>
+                        <select value={selected} onChange={(e) => onChange(key, e.target.value || null)}>
+                            <option value="">All</option>
+                            {sortedValues(key, counts).map(value => (
+                                <option key={value} value={value}>
+                                    {key === 'rating' ? `${value} stars` : value} ({counts[value]})
+                                </option>
+                            ))}
+                            {selected && !(selected in counts) && (
+                                <option value={selected}>{selected} (0)</option>
+                            )}
+                        </select>
+                    </label>
+                );
+            })}
+        </div>
+    );
+}
+
+export default SearchFacets;